@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark for near-duplicate clustering.
+Builds mailboxes where a share of the mail comes from a few automated
+templates (with changing order numbers and dates) and the rest is unrelated,
+then times the clustering at each size and checks that each template comes
+out as one cluster. Time per message should stay roughly flat as the size grows.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import string
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_agent.duplicates import near_duplicate_clusters
+from email_agent.message import Message
+
+TEMPLATES = (
+    ("Shop <orders@shop.example>", "Your order {} has shipped",
+     "Hi, your order {} has shipped and will arrive on {}. Track it in your account."),
+    ("Digest <digest@news.example>", "Weekly digest #{}",
+     "This week: {} new posts, {} top stories and more from the community."),
+    ("Accounts <no-reply@accounts.example>", "Security alert",
+     "A new sign-in from device {} was detected on {}. If this was you, ignore this email."),
+)
+# Share of the mailbox, in tenths, that comes from the templates above.
+TEMPLATE_TENTHS = 3
+VOCABULARY_SIZE = 20000
+
+
+def make_mailbox(count, seed=0):
+    """Builds ``count`` messages: template mail mixed with unrelated Zipf-distributed text."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=7)) for _ in range(VOCABULARY_SIZE)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    messages = []
+    for number in range(count):
+        if number % 10 < TEMPLATE_TENTHS:
+            sender, subject, snippet = TEMPLATES[number % 10 % len(TEMPLATES)]
+            values = [rng.randint(1, 999999) for _ in range(2)]
+            subject, snippet = subject.format(number), snippet.format(number, *values)
+        else:
+            sender = f"Sender {number % 500} <sender{number % 500}@example.com>"
+            subject = " ".join(rng.choices(words, cum_weights=cumulative, k=5))
+            snippet = " ".join(rng.choices(words, cum_weights=cumulative, k=30))
+        messages.append(
+            Message(f"{number:016x}", None, 1700000000000 - number * 60000, ("INBOX",),
+                    sender, "me@example.com", subject, snippet)
+        )
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,50000,100000", help="comma-separated mailbox sizes")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        messages = make_mailbox(size)
+        start = time.perf_counter()
+        clusters = near_duplicate_clusters(messages, min_size=3)
+        elapsed = time.perf_counter() - start
+        template_mail = sum(1 for number in range(size) if number % 10 < TEMPLATE_TENTHS)
+        results.append({
+            "mailbox_size": size,
+            "seconds": elapsed,
+            "us_per_message": elapsed / size * 1e6,
+            "clusters": len(clusters),
+            "largest": [len(cluster) for cluster in clusters[:5]],
+            "clustered": sum(len(cluster) for cluster in clusters),
+            "template_mail": template_mail,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("🧹 Near-duplicate clustering")
+    print("=" * 78)
+    print(f"{'size':>8}  {'seconds':>8}  {'µs/msg':>7}  {'clusters':>8}  {'clustered':>9}  {'template mail':>13}")
+    for result in results:
+        print(
+            f"{result['mailbox_size']:>8}  {result['seconds']:>8.2f}  {result['us_per_message']:>7.1f}  "
+            f"{result['clusters']:>8}  {result['clustered']:>9}  {result['template_mail']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Throughput of the mailbox export against a fake Gmail backend.
+Exports the same synthetic mailbox with different numbers of workers and
+reports messages per second, so the scaling with workers, and where the quota
+limit stops it, can be checked.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root and this directory to the Python path
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCHMARK_DIR))
+sys.path.append(BENCHMARK_DIR)
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from email_agent import agent, export
+from email_agent.accounts import Account
+from email_agent.quota import QuotaScheduler
+from fake_gmail import FakeGmailHttp, FakeMailbox
+
+
+def run(workers, args, workdir):
+    """Exports a fresh fake mailbox once and returns the throughput."""
+    mailbox = FakeMailbox(args.size, body_size=args.body_size, seed=args.seed)
+    http = FakeGmailHttp(mailbox, latency=args.latency, seed=args.seed)
+    # The agent's own quota limits unless --quota is given; 0 lifts them.
+    scheduler = QuotaScheduler(
+        units_per_second=1e9 if args.quota == 0 else args.quota,
+        retry_delay=0.01,
+        max_retry_delay=0.1,
+    )
+    mirror_path = os.path.join(workdir, f"mirror-{workers}-{time.time_ns()}.sqlite3")
+    account = Account("default", None, mirror_path, scheduler=scheduler)
+    account.gmail_service = build_from_document(get_static_doc("gmail", "v1"), http=http)
+    agent.default_account = account
+
+    result = export.export_mailbox(
+        os.path.join(workdir, f"export-{workers}-{time.time_ns()}"),
+        workers=workers,
+        part_size=args.part_size,
+        bodies=args.bodies,
+    )
+    return {
+        "workers": workers,
+        "messages": result["written"],
+        "seconds": result["seconds"],
+        "messages_per_second": result["written"] / result["seconds"],
+        "http_requests": http.stats()["http_requests"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2000, help="messages in the mailbox")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--latency", type=float, default=0.25, help="seconds per HTTP round trip")
+    parser.add_argument(
+        "--quota", type=float, help="quota units per second (default: the agent's limit, 0 = unlimited)"
+    )
+    parser.add_argument("--part-size", type=int, default=200, help="messages per part file")
+    parser.add_argument("--bodies", action="store_true", help="fetch raw messages with their bodies")
+    parser.add_argument("--body-size", type=int, default=2000, help="characters per message body")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the mailbox")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run(int(workers), args, workdir) for workers in args.workers.split(",")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print("📦 Mailbox export against a fake Gmail backend")
+    print("=" * 60)
+    print(f"{'workers':>8} {'messages':>9} {'seconds':>8} {'msg/s':>8} {'http':>6}")
+    for entry in results:
+        print(
+            f"{entry['workers']:>8} {entry['messages']:>9} {entry['seconds']:8.2f} "
+            f"{entry['messages_per_second']:8.1f} {entry['http_requests']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+"""
+An in-process fake of the Gmail REST API for benchmarks.
+
+FakeGmailHttp stands in for the httplib2.Http object under a googleapiclient
+service, so the agent's real request building, batching, partial-response
+projections and retries all run unchanged. It serves a synthetic mailbox,
+can add latency and inject errors, and counts every call and byte.
+"""
+
+import base64
+import email
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+
+from email_agent.message import Message
+from email_agent.search_index import SearchIndex, parse_query
+
+API_PREFIX = "/gmail/v1/users/me/"
+UPLOAD_PREFIX = "/upload/gmail/v1/users/me/"
+BATCH_PATHS = ("/batch", "/batch/gmail/v1")
+SYSTEM_LABELS = ("INBOX", "UNREAD", "STARRED", "IMPORTANT", "SENT", "DRAFT", "SPAM", "TRASH")
+LABEL_SETS = (
+    ("INBOX", "UNREAD", "CATEGORY_PERSONAL"),
+    ("INBOX", "CATEGORY_UPDATES"),
+    ("INBOX", "IMPORTANT", "CATEGORY_PERSONAL"),
+    ("CATEGORY_PROMOTIONS", "UNREAD"),
+    ("SENT",),
+)
+SUBJECTS = ("Weekly report", "Meeting notes", "Budget review", "Lunch plans", "Invoice")
+WORDS = ("the", "project", "update", "budget", "team", "review", "meeting", "deadline",
+         "client", "report", "numbers", "schedule", "thanks", "please", "attached")
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def parse_fields(fields):
+    """Parses a partial-response ``fields`` value into a tree of kept keys.
+
+    ``"messages/id,nextPageToken"`` becomes ``{"messages": {"id": None},
+    "nextPageToken": None}``, where None keeps the whole value.
+    """
+    return _parse_field_list(fields, 0)[0]
+
+
+def _read_name(text, position):
+    end = position
+    while end < len(text) and text[end] not in ",/()":
+        end += 1
+    return text[position:end].strip(), end
+
+
+def _parse_field_list(text, position):
+    tree = {}
+    while position < len(text):
+        name, position = _read_name(text, position)
+        subtree, position = _parse_field_suffix(text, position)
+        tree[name] = _merge(tree[name], subtree) if name in tree else subtree
+        if position < len(text) and text[position] == ",":
+            position += 1
+            continue
+        break
+    return tree, position
+
+
+def _parse_field_suffix(text, position):
+    if position < len(text) and text[position] == "/":
+        name, position = _read_name(text, position + 1)
+        subtree, position = _parse_field_suffix(text, position)
+        return {name: subtree}, position
+    if position < len(text) and text[position] == "(":
+        tree, position = _parse_field_list(text, position + 1)
+        return tree, position + 1  # skip the closing parenthesis
+    return None, position
+
+
+def _merge(existing, subtree):
+    if existing is None or subtree is None:
+        return None
+    merged = dict(existing)
+    for key, value in subtree.items():
+        merged[key] = _merge(merged[key], value) if key in merged else value
+    return merged
+
+
+def project(value, tree):
+    """Keeps only the parts of a response selected by a ``parse_fields`` tree."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def raw_message(payload):
+    """Rebuilds the RFC 2822 source of a message from its ``format=full`` payload."""
+    lines = [f"{header['name']}: {header['value']}" for header in payload["headers"]]
+    boundary = "fake_alternative_boundary"
+    lines += ["MIME-Version: 1.0", f'Content-Type: {payload["mimeType"]}; boundary="{boundary}"', ""]
+    for part in payload["parts"]:
+        data = part["body"]["data"]
+        content = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode()
+        lines += [f"--{boundary}", f"Content-Type: {part['mimeType']}; charset=utf-8", "", content]
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines).encode()
+
+
+class FakeMailbox:
+    """A synthetic mailbox with history, as seen through the Gmail API."""
+
+    def __init__(self, size, body_size=2000, senders=200, seed=0):
+        self.messages = {}
+        self.history = []
+        self.history_id = 1000
+        # History older than this ID has expired, as Gmail drops it after about a week.
+        self.history_start = 0
+        self.labels = [{"id": label, "name": label, "type": "system"} for label in SYSTEM_LABELS]
+        self.labels.append({"id": "Label_1", "name": "Receipts", "type": "user"})
+        self._next_id = 0
+        self._index = None
+        rng = random.Random(seed)
+        now = int(time.time() * 1000)
+        for number in range(size):
+            sender = number % senders
+            self.add_message(
+                sender=f"Sender {sender} <sender{sender}@example.com>",
+                to="me@example.com",
+                subject=f"{SUBJECTS[number % len(SUBJECTS)]} #{number}",
+                body=" ".join(rng.choices(WORDS, k=body_size // 6))[:body_size],
+                labels=LABEL_SETS[number % len(LABEL_SETS)],
+                internal_date=now - number * 600000,
+                record=False,
+            )
+
+    def add_message(
+        self, sender, to, subject, body, labels, internal_date=None, record=True, thread_id=None
+    ):
+        """Adds a message and returns its resource in ``format=full`` form.
+
+        The message starts a thread of its own unless ``thread_id`` names one.
+        """
+        self._next_id += 1
+        message_id = f"{self._next_id:016x}"
+        resource = {
+            "id": message_id,
+            "threadId": thread_id or message_id,
+            "labelIds": list(labels),
+            "snippet": body[:100],
+            "sizeEstimate": len(body) + 500,
+            "historyId": str(self.history_id),
+            "internalDate": str(internal_date or int(time.time() * 1000)),
+            "payload": {
+                "partId": "",
+                "mimeType": "multipart/alternative",
+                "filename": "",
+                "headers": [
+                    {"name": "Delivered-To", "value": to},
+                    {"name": "Received", "value": "from mail.example.com by mx.google.com"},
+                    {"name": "From", "value": sender},
+                    {"name": "To", "value": to},
+                    {"name": "Subject", "value": subject},
+                    {"name": "Date", "value": email.utils.formatdate()},
+                    {"name": "Message-ID", "value": f"<{message_id}@example.com>"},
+                ],
+                "body": {"size": 0},
+                "parts": [
+                    {
+                        "partId": "0",
+                        "mimeType": "text/plain",
+                        "filename": "",
+                        "headers": [{"name": "Content-Type", "value": "text/plain"}],
+                        "body": {"size": len(body), "data": encode(body.encode())},
+                    },
+                    {
+                        "partId": "1",
+                        "mimeType": "text/html",
+                        "filename": "",
+                        "headers": [{"name": "Content-Type", "value": "text/html"}],
+                        "body": {"size": len(body) + 13, "data": encode(f"<p>{body}</p>".encode())},
+                    },
+                ],
+            },
+        }
+        self.messages[message_id] = resource
+        self._index = None
+        if record:
+            self._record({"messagesAdded": [{"message": {"id": message_id}}]})
+        return resource
+
+    def delete_messages(self, message_ids):
+        for message_id in message_ids:
+            if self.messages.pop(message_id, None) is not None:
+                self._record({"messagesDeleted": [{"message": {"id": message_id}}]})
+        self._index = None
+
+    def modify_labels(self, message_ids, added=(), removed=()):
+        for message_id in message_ids:
+            resource = self.messages.get(message_id)
+            if resource is None:
+                continue
+            labels = [label for label in resource["labelIds"] if label not in removed]
+            labels.extend(label for label in added if label not in labels)
+            resource["labelIds"] = labels
+            if added:
+                self._record({"labelsAdded": [{"message": {"id": message_id}, "labelIds": list(added)}]})
+            if removed:
+                self._record({"labelsRemoved": [{"message": {"id": message_id}, "labelIds": list(removed)}]})
+        self._index = None
+
+    def expire_history(self):
+        """Drops the history recorded so far; reading from before now then fails with 404."""
+        self.history = []
+        self.history_start = self.history_id
+
+    def _record(self, change):
+        self.history_id += 1
+        self.history.append(dict(change, id=str(self.history_id)))
+
+    def search(self, query, limit, include_spam_trash=False):
+        """Returns message IDs matching a query, newest first.
+
+        Uses the agent's own local query parser; queries it cannot parse match
+        every message, which is enough to exercise paging. Spam and Trash are
+        left out unless the query or ``include_spam_trash`` asks for them.
+        """
+        if self._index is None:
+            self._index = SearchIndex()
+            for resource in self.messages.values():
+                self._index.add(Message.from_resource(resource))
+        parsed = parse_query(query, approximate=True) or parse_query("")
+        parsed.include_hidden = parsed.include_hidden or include_spam_trash
+        return self._index.search(parsed, limit)
+
+
+class FakeGmailHttp:
+    """An httplib2.Http replacement that answers Gmail API calls from a FakeMailbox.
+
+    Args:
+        mailbox (FakeMailbox): The mailbox to serve.
+        latency (float): Seconds added to every HTTP round trip.
+        error_rate (float): Probability that an API call fails with 503.
+        seed (int): Seed for error injection, so runs are repeatable.
+    """
+
+    def __init__(self, mailbox, latency=0.0, error_rate=0.0, seed=0):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Resumable upload sessions by ID: target path, declared size and bytes received.
+        self._uploads = {}
+        # The next this many upload chunks lose their connection before arriving.
+        self.drop_upload_chunks = 0
+        # The RFC 2822 source of every uploaded message, by message ID.
+        self.uploaded = {}
+        # Statuses the next calls of a method fail with, by method name, e.g.
+        # {"messages.batchModify": [None, 400]} fails the second call. None
+        # lets a call through.
+        self.planned_errors = {}
+        # Message IDs whose messages.get fails with 404, like mail deleted after it was listed.
+        self.unavailable = set()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.http_requests = 0
+        self.api_calls = 0
+        self.calls_by_method = {}
+        self.errors_injected = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def stats(self):
+        """Returns call, error and byte counters since the last ``reset_stats``."""
+        return {
+            "http_requests": self.http_requests,
+            "api_calls": self.api_calls,
+            "calls_by_method": dict(self.calls_by_method),
+            "errors_injected": self.errors_injected,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        """Serves one HTTP request, like ``httplib2.Http.request``."""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        elif hasattr(body, "read"):
+            # Resumable upload chunks arrive as a slice of the message file.
+            body = body.read()
+        body = body or b""
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(uri)
+        with self._lock:
+            self.http_requests += 1
+            self.bytes_sent += len(uri) + len(body)
+            if parts.path in BATCH_PATHS:
+                status, response_headers, content = self._batch(headers or {}, body)
+            elif parts.path.startswith(UPLOAD_PREFIX):
+                status, response_headers, content = self._upload(method, parts, headers or {}, body)
+            else:
+                status, content = self._call(method, parts.path, parts.query, body)
+                response_headers = {"content-type": "application/json; charset=UTF-8"}
+            self.bytes_received += len(content)
+        response = httplib2.Response(dict(response_headers, status=str(status)))
+        return response, content
+
+    def _batch(self, headers, body):
+        content_type = next(value for key, value in headers.items() if key.lower() == "content-type")
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = "batch_fake_boundary"
+        chunks = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, target, _ = request_line.split(" ", 2)
+            part_body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else ""
+            path, _, query = target.partition("?")
+            status, content = self._call(method, path, query, part_body.encode())
+            reason = "OK" if status < 300 else "Error"
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{content.decode()}\r\n"
+            )
+        chunks.append(f"--{boundary}--")
+        return 200, {"content-type": f"multipart/mixed; boundary={boundary}"}, "".join(chunks).encode()
+
+    def _upload(self, method, parts, headers, body):
+        headers = {key.lower(): value for key, value in headers.items()}
+        params = parse_qs(parts.query)
+        upload_type = params.get("uploadType", ["media"])[0]
+        resource = parts.path[len(UPLOAD_PREFIX):]
+        json_headers = {"content-type": "application/json; charset=UTF-8"}
+        if upload_type == "media":
+            status, content = self._call_upload(resource, body)
+            return status, json_headers, content
+        if "upload_id" not in params:
+            upload_id = str(len(self._uploads) + 1)
+            self._uploads[upload_id] = {
+                "resource": resource,
+                "size": int(headers["x-upload-content-length"]),
+                "data": bytearray(),
+            }
+            location = f"https://gmail.googleapis.com{parts.path}?uploadType=resumable&upload_id={upload_id}"
+            return 200, {"location": location}, b""
+
+        session = self._uploads[params["upload_id"][0]]
+        content_range = headers["content-range"]
+        if not content_range.startswith("bytes */"):
+            if self.drop_upload_chunks:
+                self.drop_upload_chunks -= 1
+                raise ConnectionResetError("Connection reset by peer")
+            start = int(content_range.split()[1].split("-")[0])
+            del session["data"][start:]
+            session["data"] += body
+        if len(session["data"]) == session["size"]:
+            status, content = self._call_upload(session["resource"], bytes(session["data"]))
+            return status, json_headers, content
+        response_headers = {}
+        if session["data"]:
+            response_headers["range"] = f"bytes=0-{len(session['data']) - 1}"
+        return 308, response_headers, b""
+
+    def _call_upload(self, resource, raw):
+        # An uploaded message is the same call as one sent as base64 in a JSON body.
+        if resource == "drafts":
+            body = {"message": {"raw": encode(raw)}}
+        else:
+            body = {"raw": encode(raw)}
+        return self._call("POST", API_PREFIX + resource, "", json.dumps(body).encode())
+
+    def _call(self, method, path, query, body):
+        if path.startswith("https://"):
+            path = urlsplit(path).path
+        resource = path[len(API_PREFIX):] if path.startswith(API_PREFIX) else path
+        params = {key: values for key, values in parse_qs(query).items()}
+        name, handler = self._route(method, resource.split("/"))
+        self.api_calls += 1
+        self.calls_by_method[name] = self.calls_by_method.get(name, 0) + 1
+        planned = self.planned_errors.get(name)
+        if planned:
+            status = planned.pop(0)
+            if status is not None:
+                self.errors_injected += 1
+                return status, json.dumps({"error": {"code": status, "message": "Planned Error"}}).encode()
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors_injected += 1
+            return 503, json.dumps({"error": {"code": 503, "message": "Backend Error"}}).encode()
+        status, result = handler(params, json.loads(body) if body.strip() else {})
+        if result is None:
+            return status, b""
+        if "fields" in params:
+            result = project(result, parse_fields(params["fields"][0]))
+        return status, json.dumps(result).encode()
+
+    def _route(self, method, segments):
+        routes = {
+            ("GET", "profile"): ("getProfile", self._profile),
+            ("GET", "labels"): ("labels.list", self._labels),
+            ("GET", "history"): ("history.list", self._history),
+            ("GET", "messages"): ("messages.list", self._list),
+            ("POST", "messages/send"): ("messages.send", self._send),
+            ("POST", "messages/batchDelete"): ("messages.batchDelete", self._batch_delete),
+            ("POST", "messages/batchModify"): ("messages.batchModify", self._batch_modify),
+            ("POST", "drafts"): ("drafts.create", self._draft),
+        }
+        key = (method, "/".join(segments))
+        if key in routes:
+            return routes[key]
+        if segments[0] == "threads" and len(segments) == 2 and method == "GET":
+            return "threads.get", lambda params, body: self._thread(segments[1], params)
+        if segments[0] == "messages" and len(segments) == 2:
+            if method == "GET":
+                return "messages.get", lambda params, body: self._get(segments[1], params)
+            if method == "DELETE":
+                return "messages.delete", lambda params, body: self._delete(segments[1])
+        return "unknown", lambda params, body: (404, {"error": {"code": 404, "message": "Not Found"}})
+
+    def _profile(self, params, body):
+        return 200, {
+            "emailAddress": "me@example.com",
+            "messagesTotal": len(self.mailbox.messages),
+            "historyId": str(self.mailbox.history_id),
+        }
+
+    def _labels(self, params, body):
+        return 200, {"labels": self.mailbox.labels}
+
+    def _history(self, params, body):
+        start = int(params["startHistoryId"][0])
+        if start < self.mailbox.history_start:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        records = [record for record in self.mailbox.history if int(record["id"]) > start]
+        return 200, {"history": records, "historyId": str(self.mailbox.history_id)}
+
+    def _list(self, params, body):
+        limit = int(params.get("maxResults", ["100"])[0])
+        offset = int(params.get("pageToken", ["0"])[0])
+        query = params.get("q", [""])[0]
+        include_spam_trash = params.get("includeSpamTrash", ["false"])[0] == "true"
+        matches = self.mailbox.search(query, offset + limit + 1, include_spam_trash)
+        page = matches[offset:offset + limit]
+        result = {"messages": [{"id": i, "threadId": i} for i in page], "resultSizeEstimate": len(page)}
+        if len(matches) > offset + limit:
+            result["nextPageToken"] = str(offset + limit)
+        return 200, result
+
+    def _get(self, message_id, params):
+        resource = self.mailbox.messages.get(message_id)
+        if resource is None or message_id in self.unavailable:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        message_format = params.get("format", ["full"])[0]
+        if message_format == "full":
+            return 200, resource
+        result = {key: value for key, value in resource.items() if key != "payload"}
+        if message_format == "raw":
+            result["raw"] = encode(raw_message(resource["payload"]))
+        if message_format == "metadata":
+            wanted = {name.lower() for name in params.get("metadataHeaders", [])}
+            headers = resource["payload"]["headers"]
+            result["payload"] = {
+                "headers": [h for h in headers if not wanted or h["name"].lower() in wanted]
+            }
+        return 200, result
+
+    def _thread(self, thread_id, params):
+        message_ids = [
+            message_id
+            for message_id, resource in self.mailbox.messages.items()
+            if resource["threadId"] == thread_id
+        ]
+        if not message_ids:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        messages = [self._get(message_id, params)[1] for message_id in message_ids]
+        return 200, {"id": thread_id, "messages": messages}
+
+    def _delete(self, message_id):
+        if message_id not in self.mailbox.messages:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        self.mailbox.delete_messages([message_id])
+        return 204, None
+
+    def _add_raw(self, raw, label):
+        parsed = email.message_from_bytes(raw)
+        text = next(part for part in parsed.walk() if part.get_content_type() == "text/plain")
+        resource = self.mailbox.add_message(
+            sender="me@example.com",
+            to=parsed["to"] or "",
+            subject=parsed["subject"] or "",
+            body=text.get_payload(decode=True).decode("utf-8", errors="replace"),
+            labels=(label,),
+        )
+        self.uploaded[resource["id"]] = raw
+        return resource
+
+    def _send(self, params, body):
+        resource = self._add_raw(base64.urlsafe_b64decode(body["raw"]), "SENT")
+        return 200, {"id": resource["id"], "threadId": resource["threadId"], "labelIds": ["SENT"]}
+
+    def _draft(self, params, body):
+        resource = self._add_raw(base64.urlsafe_b64decode(body["message"]["raw"]), "DRAFT")
+        draft = {"id": f"r{resource['id']}", "message": {"id": resource["id"], "threadId": resource["threadId"]}}
+        return 200, draft
+
+    def _batch_delete(self, params, body):
+        self.mailbox.delete_messages(body.get("ids", []))
+        return 204, None
+
+    def _batch_modify(self, params, body):
+        self.mailbox.modify_labels(
+            body.get("ids", []), body.get("addLabelIds", []), body.get("removeLabelIds", [])
+        )
+        return 204, None
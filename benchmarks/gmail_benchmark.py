@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the email tools against a fake Gmail backend.
+Runs read_emails, read_thread, send_email, create_draft and delete_email on
+synthetic mailboxes of several sizes and records wall time, API calls, HTTP
+round trips, bytes transferred and peak memory for each operation. Results can be written
+as JSON and compared against a saved baseline to catch regressions.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the project root and this directory to the Python path
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCHMARK_DIR))
+sys.path.append(BENCHMARK_DIR)
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from email_agent import agent
+from email_agent.accounts import Account
+from email_agent.quota import QuotaScheduler
+from fake_gmail import FakeGmailHttp, FakeMailbox
+
+# Metrics compared against a baseline, and whether they may grow within the tolerance.
+GATED_METRICS = {
+    "api_calls": False,
+    "bytes_received": True,
+    "wall_ms": True,
+    "peak_kib": True,
+}
+# Growth always allowed on top of the tolerance, so operations that take a few
+# milliseconds or a few hundred KiB are not failed by timer and allocator noise.
+ABSOLUTE_SLACK = {"wall_ms": 25.0, "peak_kib": 256.0}
+
+
+# Messages in the conversation read by the read_thread operation.
+THREAD_LENGTH = 8
+
+
+def scenario(state):
+    """Yields (operation name, callable) pairs, in the order they are run."""
+
+    def read_cold():
+        # Hold back the background full sync, so it is measured on its own below.
+        agent.default_account.last_sync = time.monotonic()
+        return agent.read_emails("in:inbox", 10)
+
+    yield "read_emails cold (mirror not ready)", read_cold
+    def full_sync():
+        agent.start_full_sync().join()
+        if agent.default_account.store.get_state("history_id") is None:
+            return "An error occurred: the full sync did not finish"
+        return "synced"
+
+    yield "full sync (background thread)", full_sync
+    yield "read_emails repeated (cache)", lambda: agent.read_emails("in:inbox", 10)
+    yield "read_emails local query", lambda: agent.read_emails("from:sender3", 10)
+    yield "read_emails API query", lambda: agent.read_emails("has:attachment", 10)
+    yield "read_emails with bodies", lambda: agent.read_emails("in:inbox", 5, include_body=True)
+    yield "read_thread", lambda: agent.read_thread(state["thread_id"], include_body=True)
+    yield "search_emails (local topic index)", lambda: agent.search_emails("budget review numbers", 10)
+    yield "send_email", lambda: agent.send_email("friend@example.com", "Hello", "Benchmark body")
+    yield "create_draft", lambda: agent.create_draft("friend@example.com", "Draft", "Benchmark body")
+    yield "delete_email", lambda: agent.delete_email(state["delete_id"])
+
+    def read_after_changes():
+        agent.default_account.last_sync = 0.0
+        return agent.read_emails("in:inbox", 10)
+
+    yield "read_emails after changes (incremental sync)", read_after_changes
+
+
+def install_fake(size, args, workdir):
+    """Points the agent at a fresh fake mailbox and empty local caches."""
+    mailbox = FakeMailbox(size, body_size=args.body_size, seed=args.seed)
+    http = FakeGmailHttp(mailbox, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    # The agent's own quota limits unless --quota is given; 0 lifts them.
+    scheduler = QuotaScheduler(
+        units_per_second=1e9 if args.quota == 0 else args.quota,
+        retry_delay=0.01,
+        max_retry_delay=0.1,
+    )
+    mirror_path = os.path.join(workdir, f"mirror-{size}-{time.time_ns()}.sqlite3")
+    account = Account("default", None, mirror_path, scheduler=scheduler)
+    account.gmail_service = build_from_document(get_static_doc("gmail", "v1"), http=http)
+    agent.default_account = account
+    # Delete an older message, one the first reads did not show.
+    delete_id = mailbox.search("", 20)[-1]
+    # A conversation of replies, each quoting the one before it.
+    thread_id = None
+    quoted = ""
+    for number in range(THREAD_LENGTH):
+        body = f"Reply {number} to the plan."
+        if quoted:
+            body += f"\n\nOn Monday, someone wrote:\n{quoted}"
+        resource = mailbox.add_message(
+            f"Sender {number % 2} <sender{number % 2}@example.com>", "me@example.com",
+            "Plan", body, ("INBOX",), record=False, thread_id=thread_id,
+        )
+        thread_id = resource["threadId"]
+        quoted = "\n".join("> " + line for line in body.splitlines())
+    return http, {"delete_id": delete_id, "thread_id": thread_id}
+
+
+def run(size, args, workdir, trace_memory):
+    """Runs the scenario once on a fresh mailbox and returns one result per operation."""
+    http, state = install_fake(size, args, workdir)
+    results = []
+    for name, operation in scenario(state):
+        http.reset_stats()
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        output = operation()
+        elapsed = time.perf_counter() - start
+        result = {"mailbox_size": size, "operation": name, "wall_ms": elapsed * 1000}
+        if trace_memory:
+            result["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        result.update(http.stats())
+        result["ok"] = not str(output).startswith("An error occurred")
+        results.append(result)
+    return results
+
+
+def benchmark(args):
+    """Runs every mailbox size, timing one pass and measuring memory in another.
+
+    Memory is traced in a separate, identical pass because tracemalloc slows
+    Python down enough to distort the timings.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            timed = run(size, args, workdir, trace_memory=False)
+            traced = run(size, args, workdir, trace_memory=True)
+            for timing, memory in zip(timed, traced):
+                timing["peak_kib"] = memory["peak_kib"]
+                results.append(timing)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a description of every metric that regressed against the baseline."""
+    previous = {
+        (entry["mailbox_size"], entry["operation"]): entry for entry in baseline["results"]
+    }
+    regressions = []
+    for entry in results:
+        if not entry["ok"]:
+            regressions.append(f"{entry['operation']} @ {entry['mailbox_size']}: failed")
+        before = previous.get((entry["mailbox_size"], entry["operation"]))
+        if before is None:
+            continue
+        for metric, tolerant in GATED_METRICS.items():
+            if metric not in before:
+                continue
+            limit = before[metric]
+            if tolerant:
+                limit = limit * (1 + tolerance) + ABSOLUTE_SLACK.get(metric, 0)
+            if entry[metric] > limit:
+                regressions.append(
+                    f"{entry['operation']} @ {entry['mailbox_size']}: {metric} "
+                    f"{entry[metric]:.1f} > {before[metric]:.1f}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,5000", help="comma-separated mailbox sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per HTTP round trip")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API calls failing with 503")
+    parser.add_argument(
+        "--quota", type=float, help="quota units per second (default: the agent's limit, 0 = unlimited)"
+    )
+    parser.add_argument("--body-size", type=int, default=2000, help="characters per message body")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the mailbox and error injection")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth of time, bytes and memory")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = benchmark(args)
+    report = {
+        "config": {
+            "sizes": args.sizes,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "quota": QuotaScheduler().units_per_second if args.quota is None else args.quota,
+            "body_size": args.body_size,
+            "sync_limit": agent.MAILBOX_SYNC_LIMIT,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("📬 Email tools against a fake Gmail backend")
+        print("=" * 100)
+        print(f"{'size':>6}  {'operation':<46} {'ms':>8} {'calls':>6} {'http':>5} {'KiB in':>8} {'peak KiB':>9}")
+        for entry in results:
+            status = "" if entry["ok"] else "  ❌"
+            print(
+                f"{entry['mailbox_size']:>6}  {entry['operation']:<46} {entry['wall_ms']:8.1f} "
+                f"{entry['api_calls']:>6} {entry['http_requests']:>5} "
+                f"{entry['bytes_received'] / 1024:8.1f} {entry['peak_kib']:9.1f}{status}"
+            )
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        if regressions:
+            print("\n⚠️ Regressions against the baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  - {line}", file=sys.stderr)
+            sys.exit(1)
+        print("\n🎉 No regressions against the baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the email agent package.
+Runs `python -X importtime -c "import email_agent"` in a fresh interpreter and
+prints the total cold-start cost plus the slowest modules.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_imports(module="email_agent"):
+    """Imports a module in a fresh interpreter and returns per-module timings.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        list: (cumulative_us, self_us, module_name) tuples in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative_us), int(self_us), name.strip()))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="email_agent")
+    parser.add_argument("--top", type=int, default=15, help="number of modules to list")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="exit with status 1 if the total import time exceeds this many milliseconds",
+    )
+    args = parser.parse_args()
+
+    timings = measure_imports(args.module)
+    total_ms = next(c for c, _, name in timings if name == args.module) / 1000
+    slowest = sorted(timings, key=lambda t: t[1], reverse=True)[: args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "total_ms": total_ms,
+            "slowest": [
+                {"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                for c, s, name in slowest
+            ],
+        }, indent=2))
+    else:
+        print(f"⏱️  import {args.module}: {total_ms:.1f} ms")
+        print(f"{'self ms':>10} {'cumulative ms':>14}  module")
+        for cumulative_us, self_us, name in slowest:
+            print(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>14.1f}  {name}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"❌ Import time {total_ms:.1f} ms exceeds the {args.max_ms:.1f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the Message record.
+Holds N synthetic messages as raw Gmail resources, as plain dict rows and as
+Message records, and reports the bytes each representation keeps alive.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_agent.message import Message
+
+LABEL_SETS = (
+    ["INBOX", "UNREAD", "CATEGORY_PERSONAL"],
+    ["INBOX", "CATEGORY_UPDATES"],
+    ["INBOX", "IMPORTANT", "CATEGORY_PERSONAL"],
+    ["CATEGORY_PROMOTIONS", "UNREAD"],
+    ["SENT"],
+)
+
+
+def make_resource(index, senders=500):
+    """Builds a message resource shaped like a ``format=metadata`` response."""
+    return {
+        "id": f"{index:016x}",
+        "threadId": f"{index // 3:016x}",
+        "labelIds": list(LABEL_SETS[index % len(LABEL_SETS)]),
+        "snippet": f"Hi team, here is the update for item {index}. Let me know if "
+        f"anything needs to change before Friday.",
+        "internalDate": str(1700000000000 + index * 60000),
+        "payload": {
+            "headers": [
+                {"name": "Subject", "value": f"Weekly report #{index}"},
+                {"name": "From", "value": f"Sender {index % senders} <sender{index % senders}@example.com>"},
+                {"name": "To", "value": "me@example.com"},
+            ]
+        },
+    }
+
+
+def as_row(resource):
+    """The dict-per-message form the tools and the mirror passed around before."""
+    headers = {h["name"].lower(): h["value"] for h in resource["payload"]["headers"]}
+    return {
+        "id": resource["id"],
+        "thread_id": resource["threadId"],
+        "internal_date": int(resource["internalDate"]),
+        "label_ids": resource["labelIds"],
+        "sender": headers["from"],
+        "recipient": headers["to"],
+        "subject": headers["subject"],
+        "snippet": resource["snippet"],
+    }
+
+
+REPRESENTATIONS = {
+    "resource": lambda resource: resource,
+    "dict_row": as_row,
+    "message": Message.from_resource,
+}
+
+
+def measure(convert, count):
+    """Returns the bytes kept alive by ``count`` converted messages."""
+    gc.collect()
+    tracemalloc.start()
+    held = [convert(make_resource(index)) for index in range(count)]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000, help="messages to hold")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {name: measure(convert, args.count) for name, convert in REPRESENTATIONS.items()}
+    per_message = {name: size / args.count for name, size in results.items()}
+
+    if args.json:
+        print(json.dumps({"count": args.count, "bytes_per_message": per_message}, indent=2))
+        return
+
+    print(f"🧠 Memory held by {args.count:,} messages")
+    print("=" * 60)
+    print(f"{'':<10} {'total':>13}  {'per message':>12}  {'vs resource':>11}")
+    for name, size in results.items():
+        ratio = results["resource"] / size
+        print(f"{name:<10} {size / 2**20:9.1f} MiB  {per_message[name]:10.0f} B  {ratio:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
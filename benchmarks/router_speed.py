@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the keyword intent router.
+Measures how long analyze_intent takes per request, in microseconds.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_agent.router import analyze_intent
+
+SAMPLE_REQUESTS = [
+    "show me my recent emails",
+    "send an email to sarah@company.com",
+    "delete all spam emails from my inbox",
+    "create a draft for the quarterly report email",
+    "schedule a meeting with John tomorrow at 2 PM",
+    "reschedule the meeting to 3 PM",
+    "share this file with john@example.com",
+    "find PDF files in my drive",
+    "what can you do?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000, help="calls per request")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for request in SAMPLE_REQUESTS:
+        seconds = min(
+            timeit.repeat(lambda: analyze_intent(request), number=args.number, repeat=3)
+        )
+        results[request] = seconds / args.number * 1e6
+
+    mean_us = sum(results.values()) / len(results)
+    if args.json:
+        print(json.dumps({"mean_us": mean_us, "per_request_us": results}, indent=2))
+        return
+
+    print("⚡ Intent classification cost")
+    print("=" * 60)
+    for request, micros in results.items():
+        print(f"{micros:8.2f} µs  {analyze_intent(request):<16} '{request}'")
+    print(f"\n📊 Mean: {mean_us:.2f} µs per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the local search index.
+Indexes N synthetic messages and measures how long common Gmail queries take
+to answer locally, in microseconds.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_agent.message import Message
+from email_agent.search_index import SearchIndex, parse_query
+
+SAMPLE_QUERIES = [
+    "in:inbox",
+    "is:unread",
+    "from:sender7@example.com",
+    "from:sender7 subject:report",
+    "subject:meeting after:2024/01/01 before:2024/06/01",
+    "subject:budget -is:unread",
+    "category:promotions",
+]
+SUBJECTS = ("Weekly report", "Meeting notes", "Budget review", "Lunch plans", "Invoice")
+LABEL_SETS = (
+    ["INBOX", "UNREAD", "CATEGORY_PERSONAL"],
+    ["INBOX", "CATEGORY_UPDATES"],
+    ["CATEGORY_PROMOTIONS", "UNREAD"],
+    ["SENT"],
+)
+
+
+def build_index(count):
+    """Indexes ``count`` synthetic messages spread over the last two years."""
+    index = SearchIndex()
+    now = int(time.time() * 1000)
+    for number in range(count):
+        index.add(
+            Message(
+                f"{number:016x}",
+                None,
+                now - number * 600000,
+                LABEL_SETS[number % len(LABEL_SETS)],
+                f"Sender {number % 200} <sender{number % 200}@example.com>",
+                "me@example.com",
+                f"{SUBJECTS[number % len(SUBJECTS)]} #{number}",
+                f"Notes on the budget and the plan for item {number}",
+            )
+        )
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000, help="messages to index")
+    parser.add_argument("--limit", type=int, default=5, help="results per query")
+    parser.add_argument("--number", type=int, default=2000, help="calls per query")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    index = build_index(args.messages)
+    results = {}
+    for query in SAMPLE_QUERIES:
+        seconds = min(
+            timeit.repeat(
+                lambda: index.search(parse_query(query), args.limit),
+                number=args.number,
+                repeat=3,
+            )
+        )
+        results[query] = seconds / args.number * 1e6
+
+    mean_us = sum(results.values()) / len(results)
+    if args.json:
+        print(json.dumps({"messages": args.messages, "mean_us": mean_us, "per_query_us": results}, indent=2))
+        return
+
+    print(f"🔎 Local search cost over {args.messages:,} messages")
+    print("=" * 60)
+    for query, micros in results.items():
+        print(f"{micros:10.1f} µs  '{query}'")
+    print(f"\n📊 Mean: {mean_us:.1f} µs per query")
+
+
+if __name__ == "__main__":
+    main()
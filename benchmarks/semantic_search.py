@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the topic index behind search_emails.
+Indexes N synthetic messages with a Zipf-like vocabulary, then measures the
+build, the cost of appending newly synced mail and the latency of top-k
+searches, in milliseconds.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_agent.message import Message
+from email_agent.semantic_index import SemanticIndex
+
+SAMPLE_QUERIES = [
+    "the email about the budget overrun",
+    "invoice from the supplier",
+    "meeting notes from the planning session",
+    "word7 word120 word3000",
+    "word1",
+]
+VOCABULARY_SIZE = 20000
+
+
+def make_messages(count, seed=0):
+    """Builds ``count`` messages whose words follow a Zipf-like distribution, like real mail."""
+    rng = random.Random(seed)
+    words = [f"word{number}" for number in range(VOCABULARY_SIZE)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    messages = []
+    for number in range(count):
+        subject = " ".join(rng.choices(words, cum_weights=cumulative, k=5))
+        snippet = " ".join(rng.choices(words, cum_weights=cumulative, k=30))
+        messages.append(
+            Message(
+                f"{number:016x}",
+                None,
+                1700000000000 + number * 60000,
+                ("INBOX",),
+                f"Sender {number % 200} <sender{number % 200}@example.com>",
+                "me@example.com",
+                subject,
+                snippet,
+            )
+        )
+    return messages
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100000, help="messages to index")
+    parser.add_argument("--limit", type=int, default=10, help="results per search")
+    parser.add_argument("--number", type=int, default=50, help="searches per query")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    index = SemanticIndex()
+    start = time.perf_counter()
+    index.add(messages)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # What an incremental sync adds: a few messages at a time.
+    arrivals = make_messages(500, seed=1)
+    for number, message in enumerate(arrivals):
+        message.id = f"new{number}"
+    start = time.perf_counter()
+    for offset in range(0, len(arrivals), 5):
+        index.add(arrivals[offset:offset + 5])
+    append_ms = (time.perf_counter() - start) * 1000 / (len(arrivals) / 5)
+
+    results = {}
+    for query in SAMPLE_QUERIES:
+        timings = []
+        for _ in range(args.number):
+            start = time.perf_counter()
+            index.search(query, args.limit)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[query] = {"median_ms": percentile(timings, 0.5), "p95_ms": percentile(timings, 0.95)}
+
+    if args.json:
+        print(json.dumps(
+            {
+                "messages": args.messages,
+                "build_ms": build_ms,
+                "append_ms": append_ms,
+                "per_query": results,
+            },
+            indent=2,
+        ))
+        return
+
+    print(f"🔎 Topic search over {args.messages:,} messages")
+    print("=" * 60)
+    print(f"Build: {build_ms:,.0f} ms; appending 5 synced messages: {append_ms:.2f} ms")
+    for query, timing in results.items():
+        print(f"{timing['median_ms']:8.2f} ms median {timing['p95_ms']:8.2f} ms p95  '{query}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .async_gmail import AsyncGmailClient
+from .attachments import AttachmentDownloader
+from .credentials import SCOPES, CredentialManager
+from .mailbox_store import MailboxStore
+from .quota import QuotaScheduler
+from .result_cache import ResultCache
+from .service_pool import GmailServiceProvider
+from .single_flight import SingleFlight
+from .tool_output import ContinuationStore
+
+# SQLite file holding the registered accounts and their OAuth tokens.
+ACCOUNTS_DB = os.getenv("ACCOUNTS_DB", "accounts.sqlite3")
+# Directory holding one mailbox mirror per registered account.
+ACCOUNT_DATA_DIR = os.getenv("ACCOUNT_DATA_DIR", "accounts")
+# Most accounts kept warm at once; the least recently used is closed beyond that.
+ACCOUNT_POOL_SIZE = int(os.getenv("ACCOUNT_POOL_SIZE", "64"))
+
+# Account names double as file names for their mirror.
+ACCOUNT_NAME_PATTERN = re.compile(r"[A-Za-z0-9_+@-][A-Za-z0-9._+@-]{0,127}")
+
+
+class AccountError(Exception):
+    """Raised for an account that is not registered or cannot be authorized."""
+
+
+def check_account_name(name):
+    """Raises AccountError unless ``name`` is usable as an account name."""
+    if not ACCOUNT_NAME_PATTERN.fullmatch(name):
+        raise AccountError(
+            f"Invalid account name '{name}': use letters, digits and . _ + @ - only."
+        )
+
+
+class AccountRegistry:
+    """The accounts one process can serve, with their OAuth tokens, in SQLite.
+
+    Tokens are stored as the JSON that ``Credentials.to_json`` produces and are
+    replaced in place when a refresh issues a new access token.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or ACCOUNTS_DB
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self):
+        # Opened on first use so that importing the agent stays cheap.
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            with connection:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS accounts (
+                        name TEXT PRIMARY KEY,
+                        token TEXT NOT NULL,
+                        updated INTEGER
+                    )
+                    """
+                )
+            self._connection = connection
+        return self._connection
+
+    def add(self, name, token):
+        """Registers an account, or replaces the token of a registered one.
+
+        Args:
+            name (str): The account name tools are called with.
+            token (str): The authorized user token, as JSON.
+        """
+        check_account_name(name)
+        self.save_token(name, token)
+
+    def save_token(self, name, token):
+        """Stores the current token of an account."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?)",
+                (name, token, int(time.time())),
+            )
+
+    def get_token(self, name):
+        """Returns the stored token of an account, or None if it is not registered."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token FROM accounts WHERE name = ?", (name,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def remove(self, name):
+        """Unregisters an account. Returns whether it was registered."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM accounts WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+    def names(self):
+        """Returns the names of every registered account, sorted."""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM accounts ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+
+class StoredCredentialManager(CredentialManager):
+    """Keeps the credentials of one registered account fresh.
+
+    Works like ``CredentialManager`` but reads and writes the token in the
+    account registry. There is no browser flow: an account whose token can no
+    longer be refreshed has to be registered again.
+    """
+
+    def __init__(self, registry, name, scopes=SCOPES, refresh_margin=None):
+        super().__init__(token_path=None, scopes=scopes, refresh_margin=refresh_margin)
+        self.registry = registry
+        self.name = name
+
+    def _token_lock(self):
+        # Refreshes of one account are serialized by the per-manager lock, and
+        # each token write is a single SQLite transaction.
+        return self._lock
+
+    def _read_token(self):
+        from google.oauth2.credentials import Credentials
+
+        token = self.registry.get_token(self.name)
+        if token is None:
+            return None
+        return Credentials.from_authorized_user_info(json.loads(token), self.scopes)
+
+    def _write_token(self, creds):
+        self.registry.save_token(self.name, creds.to_json())
+
+    def _authorize(self):
+        raise AccountError(
+            f"Account '{self.name}' has no usable token; register it again with "
+            f"'python -m email_agent.accounts add {self.name}'."
+        )
+
+
+class Account:
+    """Everything the tools keep for one mailbox.
+
+    Each account has its own credentials, Gmail clients, quota scheduler,
+    local mirror, result cache and sync state, so nothing one mailbox reads or
+    caches can answer for another.
+    """
+
+    def __init__(self, name, credential_manager, mirror_path=None, scheduler=None):
+        self.name = name
+        self.credential_manager = credential_manager
+        # Assigning ``gmail_service`` overrides the per-thread services with one shared service.
+        self.gmail_service = None
+        self.service_provider = GmailServiceProvider(self.get_credentials)
+        # Gmail quota is per user, so each mailbox is metered on its own.
+        self.scheduler = scheduler or QuotaScheduler()
+        # Concurrent identical reads of this mailbox share one Gmail call.
+        self.reads = SingleFlight()
+        self.async_gmail = AsyncGmailClient(
+            self.get_credentials, scheduler=self.scheduler, single_flight=self.reads
+        )
+        self.attachment_downloader = AttachmentDownloader(
+            self.get_credentials, scheduler=self.scheduler
+        )
+        self.store = MailboxStore(mirror_path)
+        self.result_cache = ResultCache()
+        self.continuations = ContinuationStore()
+        self.sync_lock = threading.Lock()
+        self.last_sync = 0.0
+        self.full_sync_lock = threading.Lock()
+        self.full_sync_thread = None
+
+    def get_credentials(self):
+        return self.credential_manager.get()
+
+    def gmail(self):
+        """Returns the Gmail service for the calling thread, building it on first use."""
+        if self.gmail_service is not None:
+            return self.gmail_service
+        return self.service_provider.get()
+
+    def close(self):
+        """Stops the token refresh and releases the connections of this account."""
+        self.credential_manager.stop()
+        self.async_gmail.close_soon()
+        self.store.close()
+
+
+class AccountPool:
+    """Keeps the most recently used accounts warm, up to a fixed number.
+
+    Building an account costs a token load and, on first use, new Gmail
+    clients and a mirror connection. The pool keeps up to ``max_size`` of them
+    and closes the least recently used one when another is needed.
+    """
+
+    def __init__(self, registry, max_size=None, data_dir=None):
+        self.registry = registry
+        self.max_size = max_size or ACCOUNT_POOL_SIZE
+        self.data_dir = data_dir or ACCOUNT_DATA_DIR
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, name):
+        """Returns the warm account for ``name``, building it if needed.
+
+        Raises:
+            AccountError: If no account of that name is registered.
+        """
+        with self._lock:
+            account = self._accounts.get(name)
+            if account is not None:
+                self._accounts.move_to_end(name)
+                self._hits += 1
+                return account
+            check_account_name(name)
+            if self.registry.get_token(name) is None:
+                raise AccountError(f"No account named '{name}' is registered.")
+            self._misses += 1
+            os.makedirs(self.data_dir, exist_ok=True)
+            account = Account(
+                name,
+                StoredCredentialManager(self.registry, name),
+                os.path.join(self.data_dir, f"{name}.sqlite3"),
+            )
+            self._accounts[name] = account
+            evicted = []
+            while len(self._accounts) > self.max_size:
+                evicted.append(self._accounts.popitem(last=False)[1])
+                self._evictions += 1
+        for old in evicted:
+            old.close()
+        return account
+
+    def discard(self, name):
+        """Closes and forgets the warm account for ``name``, if there is one."""
+        with self._lock:
+            account = self._accounts.pop(name, None)
+        if account is not None:
+            account.close()
+
+    def stats(self):
+        """Reports how the pool is being used.
+
+        Returns:
+            dict: Warm accounts, lookups served warm, accounts built and accounts evicted.
+        """
+        with self._lock:
+            return {
+                "warm": len(self._accounts),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the Gmail accounts the agent can serve.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="register an account, authorizing it in the browser")
+    add.add_argument("name")
+    add.add_argument("--token", help="import an existing token.json instead of authorizing")
+    add.add_argument("--client-secrets", default="credentials.json", help="OAuth client file")
+    remove = commands.add_parser("remove", help="unregister an account")
+    remove.add_argument("name")
+    commands.add_parser("list", help="list registered accounts")
+    args = parser.parse_args()
+
+    registry = AccountRegistry()
+    if args.command == "add":
+        if args.token:
+            with open(args.token) as handle:
+                token = handle.read()
+        else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
+            flow = InstalledAppFlow.from_client_secrets_file(args.client_secrets, SCOPES)
+            token = flow.run_local_server(port=0).to_json()
+        registry.add(args.name, token)
+        print(f"Registered account '{args.name}'.")
+    elif args.command == "remove":
+        found = registry.remove(args.name)
+        print(f"Removed account '{args.name}'." if found else f"No account named '{args.name}'.")
+    else:
+        for name in registry.names():
+            print(name)
+
+
+if __name__ == "__main__":
+    main()
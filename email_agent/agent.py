@@ -1,35 +1,1005 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.adk.agent import Agent
 from google.adk.agent import UserMessage
+import asyncio
 import os
 import base64
-from email.mime.text import MIMEText
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+
+from .accounts import Account, AccountError, AccountPool, AccountRegistry
+from .async_gmail import AsyncGmailError
+from .attachments import (
+    AttachmentError,
+    AttachmentStore,
+    find_text_part,
+    walk_parts,
+)
+from .compose import build_message, media_upload
+from .credentials import CredentialManager
+from .duplicates import near_duplicate_clusters
+from .message import Message
+from .metrics import instrument_tool, span, start_metrics_server
+from .quota import QUOTA_UNITS, api_method
+from .router import EMAIL_INTENTS, analyze_intent, classify
+from .search_index import parse_query
+from .threads import collapse_quoted, collapse_quoted_snippet, group_by_thread
+from .tool_output import (
+    OUTPUT_TOKEN_BUDGET,
+    cluster_record,
+    dump_record,
+    estimate_tokens,
+    fit_messages,
+    fit_thread,
+)
+
+logger = logging.getLogger(__name__)
+
+# Gmail services and their credentials are created on first use, so importing
+# the agent never reads token.json, starts an OAuth flow or loads the discovery
+# document. The credential manager then keeps the token fresh in the background.
+# This is the mailbox of token.json, used when a tool names no account.
+default_account = Account("default", CredentialManager())
+
+# Further mailboxes, registered with "python -m email_agent.accounts add", and
+# the most recently used of them kept warm with their clients and mirror
+account_registry = AccountRegistry()
+account_pool = AccountPool(account_registry)
+
+# The account the running tool call or turn works on
+_current_account = contextvars.ContextVar("current_account", default=None)
+
+
+def get_account(name=""):
+    """Returns the account of that name; an empty name means the default account.
+
+    Raises:
+        AccountError: If no account of that name is registered.
+    """
+    if not name or name == default_account.name:
+        return default_account
+    return account_pool.get(name)
+
+
+def current_account():
+    """Returns the account the running tool call works on."""
+    return _current_account.get() or default_account
 
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
+@contextlib.contextmanager
+def use_account(name=""):
+    """Runs the enclosed code, and every tool call it makes, on the named account.
+
+    Raises:
+        AccountError: If no account of that name is registered.
+    """
+    token = _current_account.set(get_account(name))
+    try:
+        yield
+    finally:
+        _current_account.reset(token)
+
+
+def get_credentials():
+    return current_account().get_credentials()
+
 
 def get_gmail_service():
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+    """Returns the current account's Gmail service for the calling thread."""
+    return current_account().gmail()
+
+
+def account_tool(function):
+    """Runs a tool on the mailbox named by its ``account`` argument.
+
+    Within a turn already bound to an account by ``route_email_request``, a
+    tool may not name a different one, so one user's conversation cannot reach
+    another user's mailbox.
+    """
+    signature = inspect.signature(function)
+
+    def resolve(args, kwargs):
+        name = signature.bind(*args, **kwargs).arguments.get("account", "")
+        bound = _current_account.get()
+        if bound is None:
+            return get_account(name)
+        if name and name != bound.name:
+            raise AccountError(f"This conversation can only use the account '{bound.name}'.")
+        return bound
+
+    if asyncio.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            try:
+                account = resolve(args, kwargs)
+            except AccountError as error:
+                return f"An error occurred: {error}"
+            token = _current_account.set(account)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                _current_account.reset(token)
+
+    else:
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                account = resolve(args, kwargs)
+            except AccountError as error:
+                return f"An error occurred: {error}"
+            token = _current_account.set(account)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _current_account.reset(token)
+
+    return wrapper
+
+
+# Optional local endpoint serving /metrics for Prometheus and /traces as JSON
+METRICS_PORT = os.getenv("METRICS_PORT")
+metrics_server = start_metrics_server(int(METRICS_PORT)) if METRICS_PORT else None
+
+# Large bodies and attachments are streamed to disk, deduplicated by content hash
+attachment_store = AttachmentStore()
+
+
+# Gmail accepts up to 100 calls per batch request, but Google recommends
+# staying at or below 50 to avoid tripping per-user rate limits.
+BATCH_SIZE = 50
+
+
+def execute_read(request):
+    """Executes a Gmail read, sharing the call with an identical read already in flight.
+
+    Args:
+        request (googleapiclient.http.HttpRequest): A list or get request.
+
+    Returns:
+        dict: The API response, which may be shared with other callers and
+        must not be modified.
+    """
+    mailbox = current_account()
+    return mailbox.reads.do(
+        (request.method, request.uri),
+        api_method(request),
+        lambda: mailbox.scheduler.execute(request),
+    )
+
+
+def fetch_messages(message_ids, **get_kwargs):
+    """Fetches several messages using Gmail batch requests.
+
+    A message that another caller is already fetching the same way is not
+    requested again; its resource is taken from that fetch instead.
+
+    Args:
+        message_ids (list): The IDs of the messages to fetch.
+        **get_kwargs: Extra arguments passed to ``messages().get``.
+
+    Returns:
+        tuple: A list of message resources in the same order as ``message_ids``,
+        and a list of the IDs that could not be fetched.
+    """
+    mailbox = current_account()
+    results = [None] * len(message_ids)
+    service = mailbox.gmail()
+    variant = repr(sorted(get_kwargs.items()))
+    led, joined = [], []
+    for index, message_id in enumerate(message_ids):
+        key = ("messages.get", message_id, variant)
+        flight, leader = mailbox.reads.join(key, "messages.get")
+        (led if leader else joined).append((index, key, flight))
+    try:
+        pending = [index for index, _, _ in led]
+        _fetch_batched(mailbox, service, message_ids, pending, results, get_kwargs)
+    except BaseException as error:
+        for index, key, flight in led:
+            mailbox.reads.land(key, flight, error=error)
+        raise
+    # Hand out what this call fetched before waiting, so callers waiting on
+    # each other's messages never wait in a circle.
+    for index, key, flight in led:
+        mailbox.reads.land(key, flight, results[index])
+    for index, key, flight in joined:
+        results[index] = flight.wait()
+
+    fetched = [msg for msg in results if msg is not None]
+    failed = [message_ids[i] for i, msg in enumerate(results) if msg is None]
+    return fetched, failed
+
+
+def _fetch_batched(mailbox, service, message_ids, pending, results, get_kwargs):
+    # Fills ``results`` at the ``pending`` indexes; items that fail for good stay None.
+    attempt = 0
+    while pending:
+        retry = []
+
+        def on_response(request_id, response, exception):
+            # A failed item only leaves its slot empty; the rest of the batch
+            # is unaffected. Transient failures are retried below.
+            index = int(request_id)
+            if exception is None:
+                results[index] = response
+            elif isinstance(exception, HttpError) and mailbox.scheduler.should_retry_error(
+                exception, attempt
+            ):
+                retry.append((index, exception.resp.get("retry-after")))
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=on_response)
+            for index in chunk:
+                batch.add(
+                    service.users()
+                    .messages()
+                    .get(userId="me", id=message_ids[index], **get_kwargs),
+                    request_id=str(index),
+                )
+            mailbox.scheduler.execute(batch, units=QUOTA_UNITS["messages.get"] * len(chunk))
+
+        if not retry:
+            break
+        time.sleep(max(mailbox.scheduler.backoff(attempt, after) for _, after in retry))
+        pending = sorted(index for index, _ in retry)
+        attempt += 1
+
+
+# Headers kept for each message; "metadata" requests ask Gmail for only these.
+SUMMARY_HEADERS = ["Subject", "From", "To"]
+
+# Partial-response projections, so Gmail skips everything else in the resource.
+METADATA_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload/headers"
+FULL_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload"
+
+
+def list_message_ids(query, limit, include_spam_trash=False):
+    """Lists the IDs of messages matching a query, following page tokens.
+
+    Args:
+        query (str): The Gmail search query.
+        limit (int): The maximum number of IDs to return.
+        include_spam_trash (bool): Whether to also list messages in Spam and Trash.
+
+    Returns:
+        tuple: The message IDs, newest first, and whether every match was listed.
+    """
+    mailbox = current_account()
+    message_ids = []
+    page_token = None
+    while len(message_ids) < limit:
+        response = execute_read(
+            mailbox.gmail()
+            .users()
+            .messages()
+            .list(
+                userId="me",
+                q=query,
+                maxResults=min(500, limit - len(message_ids)),
+                pageToken=page_token,
+                includeSpamTrash=include_spam_trash,
+                fields="messages/id,nextPageToken",
+            )
+        )
+        message_ids.extend(message["id"] for message in response.get("messages", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return message_ids, True
+    return message_ids, False
+
+
+# Number of most recent messages mirrored locally by a full sync.
+MAILBOX_SYNC_LIMIT = int(os.getenv("MAILBOX_SYNC_LIMIT", "500"))
+# Minimum number of seconds between two incremental syncs.
+MAILBOX_SYNC_INTERVAL = float(os.getenv("MAILBOX_SYNC_INTERVAL", "15"))
+
+
+
+def full_sync():
+    """Replaces the local mirror with the most recent messages of the mailbox.
+
+    If some messages cannot be fetched, only the newer messages listed before
+    the first of them are trusted: the floor is raised above that gap, and
+    incremental syncs carry on from the stored history ID.
+    """
+    mailbox = current_account()
+    # Take the history ID first so no change made during the sync is lost.
+    profile = mailbox.scheduler.execute(mailbox.gmail().users().getProfile(userId="me"))
+    labels = mailbox.scheduler.execute(
+        mailbox.gmail().users().labels().list(userId="me", fields="labels(id,name)")
+    )
+    # Spam and Trash are mirrored too, so in:spam, in:trash and messages
+    # restored from the trash can be answered locally.
+    message_ids, complete = list_message_ids("", MAILBOX_SYNC_LIMIT, include_spam_trash=True)
+
+    fetched, failed = fetch_messages(
+        message_ids,
+        format="metadata",
+        metadataHeaders=SUMMARY_HEADERS,
+        fields=METADATA_FIELDS,
+    )
+    messages = [Message.from_resource(msg) for msg in fetched]
+    mailbox.store.clear()
+    mailbox.store.upsert(messages)
+    if failed:
+        failed = set(failed)
+        gap = next(index for index, message_id in enumerate(message_ids) if message_id in failed)
+        before_gap = set(message_ids[:gap])
+        dates = [message.internal_date for message in messages if message.id in before_gap]
+        # A message missing from the mirror may share the date of the oldest
+        # one kept, so start just after it.
+        floor = min(dates) + 1 if dates else int(time.time() * 1000)
+        complete = False
+    elif complete or not messages:
+        floor = 0
+    else:
+        floor = min(message.internal_date for message in messages)
+    # User label names as label: expects them, for local search.
+    label_ids = {
+        item["name"].lower().replace(" ", "-").replace("/", "-"): item["id"]
+        for item in labels.get("labels", [])
+    }
+    mailbox.store.set_state(
+        history_id=profile["historyId"],
+        floor=floor,
+        complete=int(complete),
+        labels=json.dumps(label_ids),
+    )
+
+
+def _run_full_sync(mailbox):
+    # A new thread starts with an empty context; run the sync on the account that asked for it.
+    _current_account.set(mailbox)
+    try:
+        full_sync()
+    except Exception:
+        logger.exception("Background mailbox sync failed for account %s", mailbox.name)
+
+
+def start_full_sync():
+    """Starts a full sync of the current account on a background thread, unless one is already running.
+
+    Until it finishes there is no stored history ID, so reads are answered by
+    Gmail rather than by a half-filled mirror.
+
+    Returns:
+        threading.Thread: The thread running the sync, to join if needed.
+    """
+    mailbox = current_account()
+    with mailbox.full_sync_lock:
+        if mailbox.full_sync_thread is None or not mailbox.full_sync_thread.is_alive():
+            mailbox.full_sync_thread = threading.Thread(
+                target=_run_full_sync,
+                args=(mailbox,),
+                name=f"mailbox-full-sync-{mailbox.name}",
+                daemon=True,
+            )
+            mailbox.full_sync_thread.start()
+        return mailbox.full_sync_thread
+
+
+def sync_mailbox(force=False):
+    """Brings the current account's mirror up to date using the Gmail history API.
+
+    When there is no stored history ID, or Gmail no longer has history that
+    old, a full sync is started in the background instead.
+
+    Args:
+        force (bool): Sync even if the last sync was less than
+            ``MAILBOX_SYNC_INTERVAL`` seconds ago.
+
+    Raises:
+        HttpError: If the history could not be read. The next call syncs again
+            instead of waiting for ``MAILBOX_SYNC_INTERVAL``.
+    """
+    mailbox = current_account()
+    with mailbox.sync_lock:
+        if not force and time.monotonic() - mailbox.last_sync < MAILBOX_SYNC_INTERVAL:
+            return
+        mailbox.last_sync = time.monotonic()
+
+        start_history_id = mailbox.store.get_state("history_id")
+        if start_history_id is None:
+            start_full_sync()
+            return
+        try:
+            _apply_history(start_history_id)
+        except HttpError as error:
+            if error.resp.status == 404:
+                # The stored history ID has expired.
+                mailbox.store.clear()
+                start_full_sync()
+                return
+            mailbox.last_sync = 0.0
+            raise
+
+
+def _apply_history(start_history_id):
+    mailbox = current_account()
+    added, deleted = set(), set()
+    relabeled = False
+    page_token = None
+    while True:
+        response = mailbox.scheduler.execute(
+            mailbox.gmail()
+            .users()
+            .history()
+            .list(
+                userId="me",
+                startHistoryId=start_history_id,
+                pageToken=page_token,
+            )
+        )
+        for record in response.get("history", []):
+            for item in record.get("messagesAdded", []):
+                added.add(item["message"]["id"])
+                deleted.discard(item["message"]["id"])
+            for item in record.get("messagesDeleted", []):
+                deleted.add(item["message"]["id"])
+                added.discard(item["message"]["id"])
+            for item in record.get("labelsAdded", []):
+                relabeled = True
+                mailbox.store.update_labels(
+                    item["message"]["id"], added=item["labelIds"]
+                )
+            for item in record.get("labelsRemoved", []):
+                relabeled = True
+                mailbox.store.update_labels(
+                    item["message"]["id"], removed=item["labelIds"]
+                )
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+    fetched, failed = fetch_messages(
+        sorted(added),
+        format="metadata",
+        metadataHeaders=SUMMARY_HEADERS,
+        fields=METADATA_FIELDS,
+    )
+    mailbox.store.upsert([Message.from_resource(msg) for msg in fetched])
+    mailbox.store.delete(list(deleted))
+    if added or deleted or relabeled:
+        mailbox.result_cache.invalidate()
+    if not failed:
+        # Otherwise keep the old history ID so the missing messages are
+        # picked up again by the next sync.
+        mailbox.store.set_state(history_id=response["historyId"])
+
+
+def local_search(query, num_emails):
+    """Answers a query from the local mirror when that gives the same result as Gmail.
+
+    Queries using operators the search index does not understand, or that
+    could match messages older than the mirror holds, go to Gmail instead.
+
+    Args:
+        query (str): The Gmail search query.
+        num_emails (int): The number of results wanted.
+
+    Returns:
+        list: The matching message IDs, newest first, or None if Gmail must be asked.
+    """
+    mailbox = current_account()
+    if mailbox.store.get_state("history_id") is None:
+        return None
+    search = parse_query(query, json.loads(mailbox.store.get_state("labels", "{}")))
+    if search is None:
+        return None
+    floor = int(mailbox.store.get_state("floor", 0))
+    message_ids = mailbox.store.index.search(search, num_emails, since=floor)
+    if len(message_ids) < num_emails and mailbox.store.get_state("complete") != "1":
+        return None
+    return message_ids
+
+
+def sync_and_search(query, num_emails):
+    """Brings the mirror up to date, then answers a query from it if possible.
+
+    Args:
+        query (str): The Gmail search query.
+        num_emails (int): The number of results wanted.
+
+    Returns:
+        list: The matching message IDs, newest first, or None if Gmail must be asked.
+    """
+    try:
+        sync_mailbox()
+    except HttpError as error:
+        # A stale mirror must not answer; ask Gmail directly this time.
+        logger.warning("Mailbox sync failed, reading from Gmail: %s", error)
+        return None
+    return local_search(query, num_emails)
+
+
+def load_messages(message_ids, include_body=False):
+    """Loads messages from the local mirror, fetching only what it lacks.
+
+    Args:
+        message_ids (list): The IDs of the messages to load.
+        include_body (bool): Whether plain-text bodies are needed too.
+
+    Returns:
+        tuple: The Message records in the order of ``message_ids`` (carrying
+        their body when ``include_body`` is set), and the IDs that could not be
+        fetched.
+    """
+    mailbox = current_account()
+    # Bodies are not mirrored, so reading them always goes to Gmail.
+    found = {} if include_body else mailbox.store.get_many(message_ids)
+    missing = [message_id for message_id in message_ids if message_id not in found]
+    failed = []
+    if missing:
+        if include_body:
+            fetched, failed = fetch_messages(
+                missing, format="full", fields=FULL_FIELDS
+            )
         else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    return build("gmail", "v1", credentials=creds)
+            fetched, failed = fetch_messages(
+                missing,
+                format="metadata",
+                metadataHeaders=SUMMARY_HEADERS,
+                fields=METADATA_FIELDS,
+            )
+        new_messages = []
+        for resource in fetched:
+            message = Message.from_resource(resource, include_body)
+            if include_body and not message.has_body:
+                # HTML-only bodies, and bodies Gmail stores separately.
+                try:
+                    message.body = read_text_body(
+                        message.id, resource.get("payload", {}), READ_BYTE_BUDGET
+                    )
+                except (HttpError, AttachmentError):
+                    failed.append(message.id)
+                    continue
+            new_messages.append(message)
+        mirror_messages(new_messages)
+        found.update((message.id, message) for message in new_messages)
+    ordered = [found[message_id] for message_id in message_ids if message_id in found]
+    return ordered, failed
+
+
+def mirror_messages(messages):
+    """Stores fetched messages that fall inside the mirrored range of the mailbox.
+
+    Older messages are left out, so reading far back in the mailbox does not
+    grow the mirror beyond what a full sync keeps.
+
+    Args:
+        messages (list): Message records just fetched from Gmail.
+    """
+    mailbox = current_account()
+    if mailbox.store.get_state("history_id") is None:
+        # A full sync is due and will replace the mirror anyway.
+        return
+    floor = int(mailbox.store.get_state("floor", 0))
+    mailbox.store.upsert([message for message in messages if message.internal_date >= floor])
+
+
+# Messages requested per list call while streaming results.
+LIST_PAGE_SIZE = 100
+# Upper bounds on what one read_emails call returns: a number of messages,
+# and bytes of header, snippet and body text.
+READ_MAX_EMAILS = int(os.getenv("READ_MAX_EMAILS", "100"))
+READ_BYTE_BUDGET = int(os.getenv("READ_BYTE_BUDGET", "200000"))
+
+
+def take_within(messages, limit=None, byte_budget=None):
+    """Yields messages until a count or a text size is reached.
+
+    Args:
+        messages (iterable): Message records, in display order.
+        limit (int): Stop after this many messages, or None for no limit.
+        byte_budget (int): Stop before the yielded messages exceed this many
+            bytes of text, or None for no budget. The first message is always
+            yielded.
+
+    Yields:
+        Message: The records that fit.
+    """
+    emitted = 0
+    used_bytes = 0
+    for message in messages:
+        if limit is not None and emitted >= limit:
+            return
+        size = message.text_size()
+        if byte_budget is not None and emitted and used_bytes + size > byte_budget:
+            return
+        yield message
+        emitted += 1
+        used_bytes += size
+
+
+def iter_emails(query, limit=None, byte_budget=None, include_body=False, failed=None):
+    """Yields messages matching a query, newest first, fetching pages lazily.
+
+    Each page of IDs is fetched in batches as it arrives, so the first messages
+    are yielded before later pages are listed, and memory stays bounded by one
+    page however many messages match.
+
+    Args:
+        query (str): The Gmail search query.
+        limit (int): Stop after this many messages, or None for no limit.
+        byte_budget (int): Stop before the yielded messages exceed this many
+            bytes of text, or None for no budget. The first message is always
+            yielded.
+        include_body (bool): Whether to include the plain-text body of each message.
+        failed (list): If given, IDs of messages that could not be fetched are
+            appended to it.
+
+    Yields:
+        Message: One record per match.
+    """
+    return take_within(_iter_matches(query, limit, include_body, failed), limit, byte_budget)
+
+
+def _iter_matches(query, limit, include_body, failed):
+    mailbox = current_account()
+    emitted = 0
+    page_token = None
+    while limit is None or emitted < limit:
+        page_size = LIST_PAGE_SIZE if limit is None else min(LIST_PAGE_SIZE, limit - emitted)
+        response = execute_read(
+            mailbox.gmail()
+            .users()
+            .messages()
+            .list(
+                userId="me",
+                q=query,
+                maxResults=page_size,
+                pageToken=page_token,
+                fields="messages/id,nextPageToken",
+            )
+        )
+        message_ids = [message["id"] for message in response.get("messages", [])]
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            messages, batch_failed = load_messages(
+                message_ids[start:start + BATCH_SIZE], include_body
+            )
+            if failed is not None:
+                failed.extend(batch_failed)
+            yield from messages
+            emitted += len(messages)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+
+NO_EMAILS_FOUND = "No emails found matching your query."
+EXPIRED_PAGE_TOKEN = "That page_token has expired; run the search again without it."
+
+
+def format_summaries(messages, failed=(), include_body=False):
+    """Formats messages into the text returned by the read tools.
+
+    Each thread is one line of compact JSON: its newest matching message,
+    with the IDs of older matches in the same thread under "earlier". The lines
+    are kept within OUTPUT_TOKEN_BUDGET; threads that do not fit are
+    remembered under a continuation handle the model can pass back as
+    ``page_token``.
+
+    Args:
+        messages (list): Message records, in display order.
+        failed (list): IDs of messages that could not be fetched.
+        include_body (bool): Whether to show each message's body.
+
+    Returns:
+        str: One record per thread shown, then the continuation and failure lines.
+    """
+    mailbox = current_account()
+    threads = group_by_thread(messages)
+    earlier = {thread[0].id: [message.id for message in thread[1:]] for thread in threads}
+    lines, shown = fit_messages(
+        [thread[0] for thread in threads], OUTPUT_TOKEN_BUDGET, include_body, earlier
+    )
+    held_back = [message.id for thread in threads[shown:] for message in thread]
+    if held_back:
+        handle = mailbox.continuations.put(held_back, include_body)
+        arguments = f'page_token="{handle}"'
+        if mailbox is not default_account:
+            arguments += f', account="{mailbox.name}"'
+        lines.append(
+            f"{len(held_back)} more result(s) available; call read_emails again "
+            f"with {arguments} to see them."
+        )
+    if failed:
+        lines.append(f"Could not fetch {len(failed)} email(s): {', '.join(failed)}")
+    return "\n".join(lines)
+
+
+def read_continuation(page_token):
+    """Loads the page of messages a continuation handle stands for.
+
+    Args:
+        page_token (str): A handle returned in an earlier read_emails result.
+
+    Returns:
+        str: The next page, or a message asking for a new search if the handle expired.
+    """
+    mailbox = current_account()
+    entry = mailbox.continuations.get(page_token)
+    if entry is None:
+        return EXPIRED_PAGE_TOKEN
+    message_ids, include_body = entry
+    messages, failed = load_messages(message_ids, include_body)
+    return format_summaries(messages, failed, include_body)
+
+
+def sent_record(sent_message, to, subject, body):
+    """Builds the Message record for a message we just sent."""
+    return Message(
+        sent_message["id"],
+        sent_message.get("threadId"),
+        int(time.time() * 1000),
+        sent_message.get("labelIds", ["SENT"]),
+        sender="me",
+        recipient=to,
+        subject=subject,
+        snippet=body[:200],
+    )
+
+
+# Gmail accepts up to 1000 message IDs per batchModify call.
+BULK_CHUNK_SIZE = 1000
+
+# Label changes applied by each bulk action. There is no permanent delete:
+# batchDelete needs the full https://mail.google.com/ scope, and the agent only
+# asks for gmail.modify.
+BULK_ACTIONS = {
+    "trash": {"addLabelIds": ["TRASH"], "removeLabelIds": ["INBOX"]},
+    "archive": {"removeLabelIds": ["INBOX"]},
+    "mark_read": {"removeLabelIds": ["UNREAD"]},
+    "mark_unread": {"addLabelIds": ["UNREAD"]},
+    "add_label": {},
+    "remove_label": {},
+}
+
+
+def resolve_label_id(label):
+    """Returns the ID of a label given its name or ID.
+
+    Args:
+        label (str): A label name such as "Receipts", or a label ID.
+
+    Returns:
+        str: The label ID.
+
+    Raises:
+        ValueError: If the mailbox has no such label.
+    """
+    mailbox = current_account()
+    response = mailbox.scheduler.execute(
+        mailbox.gmail().users().labels().list(userId="me", fields="labels(id,name)")
+    )
+    for item in response.get("labels", []):
+        if label in (item["id"], item["name"]) or label.lower() == item["name"].lower():
+            return item["id"]
+    raise ValueError(f"No label named '{label}' was found.")
+
+
+def apply_bulk_action(message_ids, action, label_id=None):
+    """Applies one action to many messages with batchModify.
+
+    Args:
+        message_ids (list): The IDs of the messages to change.
+        action (str): One of the keys of ``BULK_ACTIONS``.
+        label_id (str): The label to add or remove, for "add_label" and "remove_label".
+
+    Returns:
+        tuple: The number of messages changed, progress lines, and one error
+        line per chunk that failed.
+    """
+    mailbox = current_account()
+    changes = dict(BULK_ACTIONS[action])
+    if action == "add_label":
+        changes["addLabelIds"] = [label_id]
+    elif action == "remove_label":
+        changes["removeLabelIds"] = [label_id]
+
+    service = mailbox.gmail()
+    changed = 0
+    progress, errors = [], []
+    for start in range(0, len(message_ids), BULK_CHUNK_SIZE):
+        chunk = message_ids[start:start + BULK_CHUNK_SIZE]
+        try:
+            mailbox.scheduler.execute(
+                service.users()
+                .messages()
+                .batchModify(userId="me", body={"ids": chunk, **changes})
+            )
+            mailbox.store.update_labels_many(
+                chunk,
+                added=changes.get("addLabelIds", ()),
+                removed=changes.get("removeLabelIds", ()),
+            )
+            # Label changes move messages in and out of other queries' results.
+            mailbox.result_cache.invalidate()
+        except HttpError as error:
+            errors.append(
+                f"Emails {start + 1}-{start + len(chunk)} could not be updated: {error}"
+            )
+            continue
+        changed += len(chunk)
+        progress.append(f"Processed {start + len(chunk)}/{len(message_ids)}")
+    return changed, progress, errors
+
+
+# Only the part tree is needed to find bodies and attachments; Gmail leaves the
+# data of large parts out and returns an attachmentId to fetch it separately.
+PART_FIELDS = "id,payload"
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def fetch_part_tree(message_id):
+    """Fetches the MIME part tree of a message."""
+    mailbox = current_account()
+    message = execute_read(
+        mailbox.gmail()
+        .users()
+        .messages()
+        .get(userId="me", id=message_id, format="full", fields=PART_FIELDS)
+    )
+    return message.get("payload", {})
+
+
+def read_part(message_id, part, max_bytes=None):
+    """Returns the decoded content of a part, streaming it if it is stored separately.
+
+    Args:
+        message_id (str): The ID of the message the part belongs to.
+        part (dict): A MIME part from ``walk_parts``.
+        max_bytes (int): Stop after this many bytes, or None for everything.
+
+    Returns:
+        bytes: The decoded content.
+    """
+    mailbox = current_account()
+    body = part.get("body", {})
+    if body.get("attachmentId"):
+        buffer = bytearray()
+        for piece in mailbox.attachment_downloader.iter_decoded(
+            message_id, body["attachmentId"], max_bytes
+        ):
+            buffer += piece
+        return bytes(buffer)
+    data = body.get("data", "")
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))[:max_bytes]
+
 
+def attachment_parts(payload):
+    """Yields the parts of a payload that carry a named file."""
+    for part in walk_parts(payload):
+        if part.get("filename"):
+            yield part
 
-# Initialize the Gmail service
-gmail_service = get_gmail_service()
+
+def read_text_body(message_id, payload, max_chars=None):
+    """Returns the text of a message body, preferring text/plain over text/html.
+
+    Args:
+        message_id (str): The ID of the message.
+        payload (dict): The ``payload`` of the message fetched with ``format=full``.
+        max_chars (int): Read only enough of the part for this many characters,
+            or None for all of it.
+
+    Returns:
+        str: The body text with any HTML tags stripped, or "" if there is none.
+    """
+    part = find_text_part(payload)
+    if part is None:
+        return ""
+    html = part["mimeType"] == "text/html"
+    limit = None
+    if max_chars is not None:
+        # UTF-8 uses at most four bytes per character; HTML needs room for tags.
+        limit = max_chars * (8 if html else 4)
+    body = read_part(message_id, part, limit).decode("utf-8", errors="replace")
+    if html:
+        body = " ".join(HTML_TAG_PATTERN.sub(" ", body).split())
+    return body
+
+
+# threads.get returns every message of a conversation in one call.
+THREAD_METADATA_FIELDS = "id,messages(id,threadId,labelIds,snippet,internalDate,payload/headers)"
+THREAD_FULL_FIELDS = "id,messages(id,threadId,labelIds,snippet,internalDate,payload)"
+
+
+def fetch_thread(thread_id, include_body=False):
+    """Fetches every message of a conversation with a single ``threads.get``.
+
+    Args:
+        thread_id (str): The ID of the thread.
+        include_body (bool): Whether to fetch the plain-text bodies too.
+
+    Returns:
+        list: The Message records, oldest first, carrying their body when
+        ``include_body`` is set.
+    """
+    mailbox = current_account()
+    if include_body:
+        request = mailbox.gmail().users().threads().get(
+            userId="me", id=thread_id, format="full", fields=THREAD_FULL_FIELDS
+        )
+    else:
+        request = mailbox.gmail().users().threads().get(
+            userId="me",
+            id=thread_id,
+            format="metadata",
+            metadataHeaders=SUMMARY_HEADERS,
+            fields=THREAD_METADATA_FIELDS,
+        )
+    resources = execute_read(request).get("messages", [])
+    messages = []
+    for resource in resources:
+        message = Message.from_resource(resource, include_body)
+        if include_body and not message.has_body:
+            # HTML-only bodies, and bodies Gmail stores separately.
+            message.body = read_text_body(
+                message.id, resource.get("payload", {}), READ_BYTE_BUDGET
+            )
+        messages.append(message)
+    mirror_messages(messages)
+    return sorted(messages, key=lambda message: message.internal_date)
+
+
+def format_thread(thread_id, messages, include_body=False):
+    """Formats a conversation into the text returned by ``read_thread``.
+
+    The first line describes the thread; then each message is one line of
+    compact JSON with only what it added to the conversation, its quoted
+    history left out. The lines are kept within OUTPUT_TOKEN_BUDGET by leaving
+    out the oldest messages.
+
+    Args:
+        thread_id (str): The ID of the thread.
+        messages (list): Its Message records, oldest first.
+        include_body (bool): Whether the records carry bodies rather than snippets.
+
+    Returns:
+        str: The thread line, one record per message shown, and a line
+        with the IDs of the older messages left out.
+    """
+    entries = []
+    for message in messages:
+        if include_body:
+            entries.append((message, *collapse_quoted(message.body)))
+        else:
+            entries.append((message, collapse_quoted_snippet(message.snippet), 0))
+    participants = list(dict.fromkeys(message.sender for message in messages))
+    header = dump_record(
+        {
+            "thread": thread_id,
+            "subject": messages[0].subject,
+            "messages": len(messages),
+            "participants": participants,
+        }
+    )
+    budget = OUTPUT_TOKEN_BUDGET - estimate_tokens(header)
+    lines, shown = fit_thread(entries, budget)
+    if shown < len(messages):
+        # Make room for the IDs of everything but the newest message, then fit again.
+        budget -= estimate_tokens(older_messages_line(messages[:-1]))
+        lines, shown = fit_thread(entries, budget)
+        lines.insert(0, older_messages_line(messages[: len(messages) - shown]))
+    return "\n".join([header] + lines)
+
+
+def older_messages_line(messages):
+    """Returns the line naming the older messages of a thread that were left out."""
+    return (
+        f"{len(messages)} older message(s) not shown; read them with read_email_body: "
+        + ", ".join(message.id for message in messages)
+    )
 
 
 # Initialize the Agent first
@@ -41,131 +1011,685 @@ email_agent = Agent(
 
 
 @email_agent.tool
-def read_emails(query: str, num_emails: int = 5):
+@instrument_tool
+@account_tool
+def read_emails(
+    query: str,
+    num_emails: int = 5,
+    include_body: bool = False,
+    page_token: str = "",
+    account: str = "",
+):
     """Reads the most recent emails from the user's inbox based on a query.
 
     Args:
         query (str): The search query to filter emails (e.g., "from:sender@example.com subject:meeting").
-        num_emails (int): The maximum number of emails to read (default is 5).
+        num_emails (int): The maximum number of emails to read, across as many result pages as needed (default is 5, at most READ_MAX_EMAILS).
+        include_body (bool): Whether to include the plain-text body of each email (default is False).
+        page_token (str): The handle from a "more results available" line, to read the next page of an earlier search (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
 
     Returns:
-        str: A summary of the emails found, or a message indicating no emails were found.
+        str: One JSON record per email found, or a message indicating no emails were found.
     """
+    mailbox = current_account()
+    if page_token:
+        try:
+            return read_continuation(page_token)
+        except HttpError as error:
+            return f"An error occurred: {error}"
+    # Keep one read bounded in API calls, memory and the size of the answer.
+    num_emails = max(1, min(num_emails, READ_MAX_EMAILS))
+    cache_key = mailbox.result_cache.make_key(query, num_emails, include_body)
+    cached = mailbox.result_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
-        results = (
-            gmail_service.users()
-            .messages()
-            .list(userId="me", q=query, maxResults=num_emails)
-            .execute()
-        )
-        messages = results.get("messages", [])
+        message_ids = sync_and_search(query, num_emails)
+        if message_ids is None:
+            failed = []
+            messages = list(
+                iter_emails(
+                    query,
+                    num_emails,
+                    byte_budget=READ_BYTE_BUDGET,
+                    include_body=include_body,
+                    failed=failed,
+                )
+            )
+        else:
+            messages, failed = load_messages(message_ids, include_body)
+            messages = list(take_within(messages, byte_budget=READ_BYTE_BUDGET))
 
-        if not messages:
-            return "No emails found matching your query."
+        if not messages and not failed:
+            mailbox.result_cache.put(cache_key, NO_EMAILS_FOUND)
+            return NO_EMAILS_FOUND
 
-        email_summary = []
-        for message in messages:
-            msg = (
-                gmail_service.users()
-                .messages()
-                .get(userId="me", id=message["id"])
-                .execute()
-            )
-            headers = msg["payload"]["headers"]
-            subject = next(filter(lambda h: h["name"] == "Subject", headers), {}).get(
-                "value", "No Subject"
-            )
-            sender = next(filter(lambda h: h["name"] == "From", headers), {}).get(
-                "value", "Unknown Sender"
-            )
-            snippet = msg.get("snippet", "No snippet available.")
-            email_summary.append(
-                f"From: {sender}\nSubject: {subject}\nSnippet: {snippet}\n---"
-            )
-        return "\n".join(email_summary)
+        summary = format_summaries(messages, failed, include_body)
+        if not failed:
+            mailbox.result_cache.put(cache_key, summary, [message.id for message in messages])
+        return summary
     except HttpError as error:
         return f"An error occurred: {error}"
 
 
 @email_agent.tool
-def send_email(to: str, subject: str, body: str):
+@instrument_tool
+@account_tool
+def send_email(
+    to: str, subject: str, body: str, attachments: list = None, account: str = ""
+):
     """Sends an email to the specified recipient.
 
     Args:
         to (str): The recipient's email address.
         subject (str): The subject of the email.
         body (str): The body content of the email.
+        attachments (list): Names of files in the outbox directory to attach (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
 
     Returns:
         str: A message indicating whether the email was sent successfully or if an error occurred.
     """
+    mailbox = current_account()
     try:
-        message = MIMEText(body)
-        message["to"] = to
-        message["subject"] = subject
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        create_message = {"raw": raw_message}
-        send_message = (
-            gmail_service.users()
-            .messages()
-            .send(userId="me", body=create_message)
-            .execute()
-        )
+        with build_message(to, subject, body, attachments) as message:
+            send_message = mailbox.scheduler.execute_upload(
+                mailbox.gmail()
+                .users()
+                .messages()
+                .send(userId="me", media_body=media_upload(message))
+            )
+        mailbox.store.upsert([sent_record(send_message, to, subject, body)])
+        mailbox.result_cache.invalidate()
         return f"Email sent successfully! Message Id: {send_message['id']}"
-    except HttpError as error:
+    except (HttpError, ValueError, OSError) as error:
         return f"An error occurred: {error}"
 
 
 @email_agent.tool
-def delete_email(message_id: str):
+@instrument_tool
+@account_tool
+def delete_email(message_id: str, account: str = ""):
     """Deletes an email by its message ID.
 
     Args:
         message_id (str): The ID of the email to delete.
+        account (str): The registered account whose mailbox to use (default is the main account).
 
     Returns:
         str: A message indicating whether the email was deleted successfully or if an error occurred.
     """
+    mailbox = current_account()
     try:
-        gmail_service.users().messages().delete(userId="me", id=message_id).execute()
+        mailbox.scheduler.execute(
+            mailbox.gmail().users().messages().delete(userId="me", id=message_id)
+        )
+        mailbox.store.delete([message_id])
+        mailbox.result_cache.invalidate([message_id])
         return f"Email with ID {message_id} deleted successfully."
     except HttpError as error:
         return f"An error occurred: {error}"
 
 
 @email_agent.tool
-def create_draft(to: str, subject: str, body: str):
+@instrument_tool
+@account_tool
+def create_draft(
+    to: str, subject: str, body: str, attachments: list = None, account: str = ""
+):
     """Creates a draft email.
 
     Args:
         to (str): The recipient's email address.
         subject (str): The subject of the draft email.
         body (str): The body content of the draft email.
+        attachments (list): Names of files in the outbox directory to attach (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
 
     Returns:
         str: A message indicating whether the draft was created successfully or if an error occurred.
     """
+    mailbox = current_account()
     try:
-        message = MIMEText(body)
-        message["to"] = to
-        message["subject"] = subject
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        create_message = {"raw": raw_message}
-        draft = (
-            gmail_service.users()
-            .drafts()
-            .create(userId="me", body={"message": create_message})
-            .execute()
-        )
+        with build_message(to, subject, body, attachments) as message:
+            draft = mailbox.scheduler.execute_upload(
+                mailbox.gmail()
+                .users()
+                .drafts()
+                .create(userId="me", media_body=media_upload(message))
+            )
+        mailbox.result_cache.invalidate()
         return f"Draft created successfully! Draft Id: {draft['id']}"
+    except (HttpError, ValueError, OSError) as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def bulk_update_emails(
+    query: str = "",
+    action: str = "trash",
+    label: str = "",
+    dry_run: bool = False,
+    max_emails: int = 5000,
+    cluster: str = "",
+    account: str = "",
+):
+    """Applies one action to every email matching a query, e.g. to clean up spam or newsletters.
+
+    Args:
+        query (str): The search query selecting the emails (e.g., "in:spam" or "category:promotions older_than:1y").
+        action (str): One of "trash", "archive", "mark_read", "mark_unread", "add_label" or "remove_label" (default is "trash").
+        label (str): The label name for "add_label" and "remove_label".
+        dry_run (bool): Only count the matching emails without changing them (default is False).
+        max_emails (int): The maximum number of emails to change (default is 5000).
+        cluster (str): A "cluster" handle from find_email_clusters, to act on that group of emails instead of a query.
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: How many emails matched or were changed, with any partial failures.
+    """
+    if action not in BULK_ACTIONS:
+        return f"Unknown action '{action}'. Use one of: {', '.join(BULK_ACTIONS)}."
+    if cluster:
+        entry = current_account().continuations.get(cluster)
+        if entry is None:
+            return "That cluster has expired; run find_email_clusters again."
+    elif not query.strip():
+        # An empty query matches the whole mailbox.
+        return "A search query is required, e.g. 'in:spam' or 'is:unread'."
+    if action in ("add_label", "remove_label") and not label:
+        return f"The '{action}' action needs a label name."
+    try:
+        if cluster:
+            message_ids, complete = entry[0][:max_emails], len(entry[0]) <= max_emails
+            selection = f"cluster {cluster}"
+        else:
+            message_ids, complete = list_message_ids(query, max_emails)
+            selection = f"'{query}'"
+        if not message_ids:
+            return "No emails found matching your query."
+        more = "" if complete else f" (stopped at the limit of {max_emails})"
+        if dry_run:
+            return (
+                f"{len(message_ids)} email(s) match {selection}{more}. "
+                f"Nothing was changed."
+            )
+
+        label_id = resolve_label_id(label) if label else None
+        changed, progress, errors = apply_bulk_action(message_ids, action, label_id)
+        lines = progress + errors
+        lines.append(f"Applied '{action}' to {changed} of {len(message_ids)} email(s){more}.")
+        return "\n".join(lines)
+    except (HttpError, ValueError) as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def read_email_body(message_id: str, max_chars: int = 5000, account: str = ""):
+    """Reads the full text of an email and lists its attachments.
+
+    Args:
+        message_id (str): The ID of the email to read.
+        max_chars (int): The maximum number of body characters to return (default is 5000).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: The email body followed by its attachments, or a message indicating an error occurred.
+    """
+    try:
+        payload = fetch_part_tree(message_id)
+        attachments = list(attachment_parts(payload))
+        body = read_text_body(message_id, payload, max_chars)
+        if len(body) > max_chars:
+            body = body[:max_chars] + "\n... (truncated)"
+
+        lines = [body or "(This email has no text body.)"]
+        if attachments:
+            lines.append(f"\nAttachments ({len(attachments)}):")
+            for part in attachments:
+                size = part.get("body", {}).get("size", 0)
+                lines.append(f"- {part['filename']} ({part.get('mimeType')}, {size} bytes)")
+        return "\n".join(lines)
+    except (HttpError, AttachmentError) as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def read_thread(thread_id: str, include_body: bool = False, account: str = ""):
+    """Reads a whole conversation in one call, without the quoted history of each reply.
+
+    Args:
+        thread_id (str): The "thread" of an email in a read_emails result.
+        include_body (bool): Whether to show what each message says in full rather than its snippet (default is False).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: A line describing the thread, then one JSON record per message, oldest first.
+    """
+    try:
+        messages = fetch_thread(thread_id, include_body)
+        if not messages:
+            return f"Thread {thread_id} has no messages."
+        return format_thread(thread_id, messages, include_body)
+    except (HttpError, AttachmentError) as error:
+        return f"An error occurred: {error}"
+
+
+# Shown by search_emails until the first full sync has filled the mirror.
+MIRROR_NOT_READY = (
+    "The local copy of the mailbox is still being built; try again in a moment, "
+    "or use read_emails with a Gmail search query."
+)
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def search_emails(description: str, num_emails: int = 5, account: str = ""):
+    """Finds emails by what they are about, when their exact words or sender are not known.
+
+    Searches the subjects, senders and snippets of the recent mail kept locally,
+    ranked by similarity to the description, without calling Gmail's search.
+
+    Args:
+        description (str): What the emails are about, in plain words (e.g., "the email about the budget overrun").
+        num_emails (int): The maximum number of emails to return, best match first (default is 5, at most READ_MAX_EMAILS).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: One JSON record per email found, or a message indicating no emails were found.
+    """
+    mailbox = current_account()
+    num_emails = max(1, min(num_emails, READ_MAX_EMAILS))
+    try:
+        sync_mailbox()
     except HttpError as error:
+        # Ranking by topic does not need the very latest mail; search what is stored.
+        logger.warning("Mailbox sync failed, searching the local copy: %s", error)
+    if mailbox.store.get_state("history_id") is None:
+        return MIRROR_NOT_READY
+    message_ids = [
+        message_id for message_id, _ in mailbox.store.semantic.search(description, num_emails)
+    ]
+    found = mailbox.store.get_many(message_ids)
+    messages = [found[message_id] for message_id in message_ids if message_id in found]
+    if not messages:
+        return NO_EMAILS_FOUND
+    return format_summaries(messages)
+
+
+# Most mirrored emails find_email_clusters groups, newest first.
+CLUSTER_MAX_EMAILS = int(os.getenv("CLUSTER_MAX_EMAILS", "20000"))
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def find_email_clusters(
+    query: str = "", min_size: int = 3, num_clusters: int = 10, account: str = ""
+):
+    """Groups near-identical emails, such as newsletters, notifications and repeated automated mail, for bulk cleanup.
+
+    Works on the recent mail kept locally. Each group gets a "cluster" handle,
+    so one decision can act on the whole group with bulk_update_emails.
+
+    Args:
+        query (str): A search query limiting which emails are grouped (e.g., "category:promotions"); empty for all but spam and trash.
+        min_size (int): The fewest emails a group needs to be shown (default is 3).
+        num_clusters (int): The maximum number of groups to show, largest first (default is 10).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: One JSON record per group with its size, sender, dates and a sample email, then how to act on a group.
+    """
+    mailbox = current_account()
+    try:
+        sync_mailbox()
+    except HttpError as error:
+        logger.warning("Mailbox sync failed, grouping the local copy: %s", error)
+    if mailbox.store.get_state("history_id") is None:
+        return MIRROR_NOT_READY
+    search = parse_query(
+        query, json.loads(mailbox.store.get_state("labels", "{}")), approximate=True
+    )
+    if search is None:
+        return (
+            "That query needs Gmail's own search; use from:, to:, subject:, label:, "
+            "category:, is:, in:, after:, before: and plain words, or no query."
+        )
+    message_ids = mailbox.store.index.search(search, CLUSTER_MAX_EMAILS)
+    found = mailbox.store.get_many(message_ids)
+    messages = [found[message_id] for message_id in message_ids if message_id in found]
+    clusters = near_duplicate_clusters(messages, max(2, min_size))
+    if not clusters:
+        return "No groups of near-identical emails found."
+
+    lines = []
+    for cluster in clusters[:max(1, num_clusters)]:
+        handle = mailbox.continuations.put([message.id for message in cluster])
+        line = dump_record(cluster_record(handle, cluster))
+        if lines and estimate_tokens("\n".join(lines + [line])) > OUTPUT_TOKEN_BUDGET:
+            break
+        lines.append(line)
+    if len(clusters) > len(lines):
+        lines.append(f"{len(clusters) - len(lines)} smaller group(s) not shown.")
+    arguments = "" if mailbox is default_account else f', account="{mailbox.name}"'
+    lines.append(
+        f'Act on a whole group with bulk_update_emails(cluster="<cluster>", action=...{arguments}), '
+        f'or list its emails with read_emails(query="", page_token="<cluster>"{arguments}).'
+    )
+    return "\n".join(lines)
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+def save_attachments(message_id: str, account: str = ""):
+    """Downloads every attachment of an email to the local attachment store.
+
+    Args:
+        message_id (str): The ID of the email whose attachments should be saved.
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: Where each attachment was saved, or a message indicating an error occurred.
+    """
+    mailbox = current_account()
+    try:
+        lines = []
+        for part in attachment_parts(fetch_part_tree(message_id)):
+            part_id = part.get("partId", "")
+            stored = attachment_store.lookup(message_id, part_id)
+            if stored is not None:
+                lines.append(f"- {part['filename']}: already saved at {stored[0]}")
+                continue
+            body = part.get("body", {})
+            if body.get("attachmentId"):
+                pieces = mailbox.attachment_downloader.iter_decoded(message_id, body["attachmentId"])
+            else:
+                pieces = [read_part(message_id, part)]
+            path, size, duplicate = attachment_store.save(
+                message_id, part_id, part["filename"], pieces
+            )
+            note = " (identical to a file already saved)" if duplicate else ""
+            lines.append(f"- {part['filename']}: {size} bytes saved at {path}{note}")
+        if not lines:
+            return f"Email with ID {message_id} has no attachments."
+        return "\n".join([f"Attachments of email {message_id}:"] + lines)
+    except (HttpError, AttachmentError, OSError) as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+async def read_emails_async(
+    query: str,
+    num_emails: int = 5,
+    page_token: str = "",
+    account: str = "",
+):
+    """Reads the most recent emails matching a query without blocking other sessions.
+
+    Args:
+        query (str): The search query to filter emails (e.g., "from:sender@example.com subject:meeting").
+        num_emails (int): The maximum number of emails to read, across as many result pages as needed (default is 5, at most READ_MAX_EMAILS).
+        page_token (str): The handle from a "more results available" line, to read the next page of an earlier search (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: One JSON record per email found, or a message indicating no emails were found.
+    """
+    mailbox = current_account()
+    if page_token:
+        try:
+            return await asyncio.to_thread(read_continuation, page_token)
+        except HttpError as error:
+            return f"An error occurred: {error}"
+    num_emails = max(1, min(num_emails, READ_MAX_EMAILS))
+    cache_key = mailbox.result_cache.make_key(query, num_emails, False)
+    cached = mailbox.result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        # The sync and the mirror use blocking calls; keep them off the loop.
+        message_ids = await asyncio.to_thread(sync_and_search, query, num_emails)
+        if message_ids is None:
+            message_ids = await list_message_ids_async(query, num_emails)
+        if not message_ids:
+            mailbox.result_cache.put(cache_key, NO_EMAILS_FOUND)
+            return NO_EMAILS_FOUND
+
+        found = await asyncio.to_thread(mailbox.store.get_many, message_ids)
+        missing = [message_id for message_id in message_ids if message_id not in found]
+        fetched, failed = await mailbox.async_gmail.get_messages(
+            missing,
+            format="metadata",
+            metadataHeaders=SUMMARY_HEADERS,
+            fields=METADATA_FIELDS,
+        )
+        new_messages = [Message.from_resource(msg) for msg in fetched]
+        await asyncio.to_thread(mirror_messages, new_messages)
+        found.update((message.id, message) for message in new_messages)
+        ordered = [found[message_id] for message_id in message_ids if message_id in found]
+        ordered = list(take_within(ordered, byte_budget=READ_BYTE_BUDGET))
+        summary = format_summaries(ordered, failed=failed)
+        if not failed:
+            mailbox.result_cache.put(cache_key, summary, [message.id for message in ordered])
+        return summary
+    except AsyncGmailError as error:
         return f"An error occurred: {error}"
 
 
+async def list_message_ids_async(query, limit):
+    """Lists the IDs of messages matching a query, following page tokens.
+
+    Args:
+        query (str): The Gmail search query.
+        limit (int): The maximum number of IDs to return.
+
+    Returns:
+        list: The message IDs, newest first.
+    """
+    mailbox = current_account()
+    message_ids = []
+    page_token = None
+    while len(message_ids) < limit:
+        response = await mailbox.async_gmail.request(
+            "GET",
+            "messages",
+            params={
+                "q": query,
+                "maxResults": min(LIST_PAGE_SIZE, limit - len(message_ids)),
+                "pageToken": page_token,
+                "fields": "messages/id,nextPageToken",
+            },
+            api_method="messages.list",
+        )
+        message_ids.extend(message["id"] for message in response.get("messages", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+    return message_ids
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+async def send_email_async(
+    to: str, subject: str, body: str, attachments: list = None, account: str = ""
+):
+    """Sends an email to the specified recipient without blocking other sessions.
+
+    Args:
+        to (str): The recipient's email address.
+        subject (str): The subject of the email.
+        body (str): The body content of the email.
+        attachments (list): Names of files in the outbox directory to attach (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: A message indicating whether the email was sent successfully or if an error occurred.
+    """
+    mailbox = current_account()
+    try:
+        # Reading and encoding attachments is blocking file work; keep it off the loop.
+        message = await asyncio.to_thread(build_message, to, subject, body, attachments)
+        with message:
+            send_message = await mailbox.async_gmail.request(
+                "POST", "messages/send", api_method="messages.send", media=message
+            )
+        mailbox.store.upsert([sent_record(send_message, to, subject, body)])
+        mailbox.result_cache.invalidate()
+        return f"Email sent successfully! Message Id: {send_message['id']}"
+    except (AsyncGmailError, ValueError, OSError) as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+async def delete_email_async(message_id: str, account: str = ""):
+    """Deletes an email by its message ID without blocking other sessions.
+
+    Args:
+        message_id (str): The ID of the email to delete.
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: A message indicating whether the email was deleted successfully or if an error occurred.
+    """
+    mailbox = current_account()
+    try:
+        await mailbox.async_gmail.request(
+            "DELETE", f"messages/{message_id}", api_method="messages.delete"
+        )
+        mailbox.store.delete([message_id])
+        mailbox.result_cache.invalidate([message_id])
+        return f"Email with ID {message_id} deleted successfully."
+    except AsyncGmailError as error:
+        return f"An error occurred: {error}"
+
+
+@email_agent.tool
+@instrument_tool
+@account_tool
+async def create_draft_async(
+    to: str, subject: str, body: str, attachments: list = None, account: str = ""
+):
+    """Creates a draft email without blocking other sessions.
+
+    Args:
+        to (str): The recipient's email address.
+        subject (str): The subject of the draft email.
+        body (str): The body content of the draft email.
+        attachments (list): Names of files in the outbox directory to attach (default is none).
+        account (str): The registered account whose mailbox to use (default is the main account).
+
+    Returns:
+        str: A message indicating whether the draft was created successfully or if an error occurred.
+    """
+    mailbox = current_account()
+    try:
+        message = await asyncio.to_thread(build_message, to, subject, body, attachments)
+        with message:
+            draft = await mailbox.async_gmail.request(
+                "POST", "drafts", api_method="drafts.create", media=message
+            )
+        mailbox.result_cache.invalidate()
+        return f"Draft created successfully! Draft Id: {draft['id']}"
+    except (AsyncGmailError, ValueError, OSError) as error:
+        return f"An error occurred: {error}"
+
+
+# Intent analysis is exposed to the model as well as used for routing.
+analyze_intent_tool = email_agent.tool(instrument_tool(analyze_intent))
+
+# Specialized agents that only see the tool their intent needs
+read_agent = Agent(
+    "read_agent",
+    "An agent that reads and searches emails using the Gmail API.",
+    tools=[read_emails, search_emails, read_thread, read_email_body, save_attachments],
+)
+send_agent = Agent(
+    "send_agent",
+    "An agent that sends emails using the Gmail API.",
+    tools=[send_email],
+)
+delete_agent = Agent(
+    "delete_agent",
+    "An agent that deletes emails using the Gmail API.",
+    tools=[delete_email, find_email_clusters, bulk_update_emails],
+)
+modify_agent = Agent(
+    "modify_agent",
+    "An agent that marks emails read or unread, archives and labels them using the Gmail API.",
+    tools=[find_email_clusters, bulk_update_emails],
+)
+draft_agent = Agent(
+    "draft_agent",
+    "An agent that creates email drafts using the Gmail API.",
+    tools=[create_draft],
+)
+INTENT_AGENTS = {
+    "read": read_agent,
+    "send": send_agent,
+    "delete": delete_agent,
+    "draft": draft_agent,
+    "modify": modify_agent,
+}
+
+
+def route_email_request(user_input: str, account: str = ""):
+    """Routes a request to the specialized agent for its intent.
+
+    The intent is found with keyword matching, not a model call. Requests whose
+    intent is unclear, or that have no specialized agent (calendar and drive
+    requests), go to the main agent with every tool.
+
+    Args:
+        user_input (str): The user's request.
+        account (str): The registered account the request is for; every tool
+            call made while answering uses its mailbox (default is the main account).
+
+    Returns:
+        str: The response of the agent that handled the request.
+
+    Raises:
+        AccountError: If no account of that name is registered.
+    """
+    intent, confident = classify(user_input)
+    # Every tool and Gmail call made while answering is traced under this turn.
+    with use_account(account), span("turn", intent=intent, confident=confident):
+        if confident and intent in EMAIL_INTENTS:
+            logger.info("🎯 Routing to %s agent", intent)
+            return INTENT_AGENTS[intent].run(user_input)
+        logger.info("🎯 Using main agent for %s query", intent)
+        return email_agent.run(user_input)
+
+
 # Assign tools to the agent after they are defined
 email_agent.tools = [
     read_emails,
     send_email,
     delete_email,
     create_draft,
+    find_email_clusters,
+    bulk_update_emails,
+    read_thread,
+    read_email_body,
+    search_emails,
+    save_attachments,
+    read_emails_async,
+    send_email_async,
+    delete_email_async,
+    create_draft_async,
+    analyze_intent_tool,
 ]
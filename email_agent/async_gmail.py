@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+
+from .metrics import api_call
+from .quota import DEFAULT_QUOTA_UNITS, QUOTA_UNITS
+
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1/users/me"
+GMAIL_UPLOAD_URL = "https://gmail.googleapis.com/upload/gmail/v1/users/me"
+
+# Upper bound on Gmail requests in flight at once, across all sessions.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GMAIL_MAX_CONCURRENT_REQUESTS", "10"))
+# Number of keep-alive connections shared by all sessions.
+CONNECTION_POOL_SIZE = int(os.getenv("GMAIL_CONNECTION_POOL_SIZE", "20"))
+# Bytes of an uploaded message read and sent at a time.
+UPLOAD_READ_SIZE = 256 * 1024
+
+
+class AsyncGmailError(Exception):
+    """Raised when an async Gmail request fails."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _query_params(params):
+    # Repeated parameters such as metadataHeaders are passed as lists.
+    pairs = []
+    for key, value in (params or {}).items():
+        if isinstance(value, (list, tuple)):
+            pairs.extend((key, str(item)) for item in value)
+        elif value is not None:
+            pairs.append((key, str(value)))
+    return pairs
+
+
+async def _read_chunks(media):
+    # aiohttp closes file bodies once sent; a generator leaves the file open for a retry.
+    media.seek(0)
+    for chunk in iter(lambda: media.read(UPLOAD_READ_SIZE), b""):
+        yield chunk
+
+
+class AsyncGmailClient:
+    """A non-blocking Gmail REST client shared by every agent session.
+
+    All requests go through one aiohttp connection pool and are limited by one
+    semaphore, so many concurrent sessions can wait on Gmail without a thread
+    each. When a ``QuotaScheduler`` is given, requests are metered and retried
+    the same way as the synchronous tools. When a ``SingleFlight`` is given,
+    concurrent identical GET requests share one call.
+    """
+
+    def __init__(
+        self,
+        get_credentials,
+        max_concurrent_requests=None,
+        pool_size=None,
+        scheduler=None,
+        single_flight=None,
+    ):
+        self.get_credentials = get_credentials
+        self.scheduler = scheduler
+        self.single_flight = single_flight
+        self.max_concurrent_requests = max_concurrent_requests or MAX_CONCURRENT_REQUESTS
+        self.pool_size = pool_size or CONNECTION_POOL_SIZE
+        self._credentials = None
+        self._session = None
+        self._loop = None
+        self._semaphore = None
+        self._refresh_lock = None
+
+    def _ensure_session(self):
+        # aiohttp sessions and asyncio primitives belong to the running loop,
+        # so they are created on first use rather than at import time.
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._refresh_lock = asyncio.Lock()
+        return self._session
+
+    async def _authorization(self):
+        from google.auth.transport.requests import Request
+
+        if self._credentials is None:
+            # Loading may read token.json or run the OAuth flow; keep it off the loop.
+            self._credentials = await asyncio.to_thread(self.get_credentials)
+        credentials = self._credentials
+        if not credentials.valid:
+            async with self._refresh_lock:
+                if not credentials.valid:
+                    # google-auth only refreshes synchronously; keep it off the loop.
+                    await asyncio.to_thread(credentials.refresh, Request())
+        return {"Authorization": f"Bearer {credentials.token}"}
+
+    async def request(self, method, path, params=None, body=None, api_method=None, media=None):
+        """Sends one request to the Gmail API.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path below ``users/me``, e.g. "messages".
+            params (dict): Query string parameters.
+            body (dict): A JSON request body.
+            api_method (str): The Gmail method name used for quota accounting,
+                e.g. "messages.list".
+            media (file): An RFC 2822 message to stream to the upload endpoint
+                instead of sending a JSON body, e.g. one from ``build_message``.
+
+        Returns:
+            dict: The decoded JSON response, or an empty dict if there is none.
+
+        Raises:
+            AsyncGmailError: If the request fails or Gmail returns an error status.
+        """
+        if method == "GET" and self.single_flight is not None:
+            # Reads change nothing, so concurrent identical ones can share a call.
+            return await self.single_flight.do_async(
+                (path, tuple(_query_params(params))),
+                api_method or method,
+                lambda: self._send(method, path, params, body, api_method, media),
+            )
+        return await self._send(method, path, params, body, api_method, media)
+
+    async def _send(self, method, path, params, body, api_method, media):
+        import aiohttp
+
+        session = self._ensure_session()
+        units = QUOTA_UNITS.get(api_method, DEFAULT_QUOTA_UNITS)
+        idempotent = method in ("GET", "DELETE")
+        url = f"{GMAIL_API_URL}/{path}"
+        sent = len(json.dumps(body)) if body is not None else 0
+        if media is not None:
+            url = f"{GMAIL_UPLOAD_URL}/{path}"
+            params = {**(params or {}), "uploadType": "media"}
+            sent = media.seek(0, os.SEEK_END)
+        attempt = 0
+        while True:
+            if self.scheduler is not None:
+                await self.scheduler.acquire_async(units)
+            async with self._semaphore:
+                headers = await self._authorization()
+                if media is not None:
+                    headers["Content-Type"] = "message/rfc822"
+                    headers["Content-Length"] = str(sent)
+                try:
+                    with api_call(api_method or method, units) as call:
+                        async with session.request(
+                            method,
+                            url,
+                            params=_query_params(params),
+                            json=body,
+                            headers=headers,
+                            data=None if media is None else _read_chunks(media),
+                        ) as response:
+                            status = response.status
+                            retry_after = response.headers.get("Retry-After")
+                            text = await response.text()
+                        call.status = status
+                        call.sent = sent
+                        call.received = len(text)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    raise AsyncGmailError(str(error) or "Request timed out") from error
+
+            if status < 400:
+                return json.loads(text) if text else {}
+            if (
+                self.scheduler is None
+                or attempt >= self.scheduler.max_retries
+                or not self.scheduler.is_retryable(status, text.encode(), idempotent)
+            ):
+                raise AsyncGmailError(f"<HttpError {status}: {text}>", status)
+            await asyncio.sleep(self.scheduler.backoff(attempt, retry_after))
+            attempt += 1
+
+    async def get_messages(self, message_ids, **params):
+        """Fetches several messages concurrently.
+
+        Args:
+            message_ids (list): The IDs of the messages to fetch.
+            **params: Query string parameters for ``messages.get``.
+
+        Returns:
+            tuple: The messages in the order of ``message_ids``, and the IDs
+            that could not be fetched.
+        """
+        responses = await asyncio.gather(
+            *(
+                self.request("GET", f"messages/{i}", params=params, api_method="messages.get")
+                for i in message_ids
+            ),
+            return_exceptions=True,
+        )
+        for response in responses:
+            if isinstance(response, Exception) and not isinstance(
+                response, AsyncGmailError
+            ):
+                raise response
+        fetched = [r for r in responses if not isinstance(r, AsyncGmailError)]
+        failed = [
+            message_id
+            for message_id, r in zip(message_ids, responses)
+            if isinstance(r, AsyncGmailError)
+        ]
+        return fetched, failed
+
+    async def close(self):
+        """Closes the shared connection pool."""
+        if self._session is not None:
+            await self._session.close()
+
+    def close_soon(self):
+        """Closes the connection pool from any thread, on the loop that opened it."""
+        if self._session is not None and not self._session.closed and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.close(), self._loop)
@@ -0,0 +1,327 @@
+import base64
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .metrics import api_call
+
+ATTACHMENT_URL = (
+    "https://gmail.googleapis.com/gmail/v1/users/me/messages/{message_id}"
+    "/attachments/{attachment_id}"
+)
+
+# Bytes read from the HTTP response at a time while streaming an attachment.
+CHUNK_SIZE = 64 * 1024
+
+
+def walk_parts(payload):
+    """Yields every MIME part of a message payload, depth first.
+
+    Args:
+        payload (dict): The ``payload`` of a message fetched with ``format=full``.
+
+    Yields:
+        dict: Each part, starting with the payload itself.
+    """
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        yield part
+        stack.extend(reversed(part.get("parts", [])))
+
+
+def find_text_part(payload):
+    """Returns the part holding the text of a message body.
+
+    The first text/plain part is preferred, then the first text/html part.
+    Parts that carry a named file are attachments, not the body.
+
+    Args:
+        payload (dict): The ``payload`` of a message fetched with ``format=full``.
+
+    Returns:
+        dict: The part, or None if the message has no text body.
+    """
+    html_part = None
+    for part in walk_parts(payload):
+        if part.get("filename"):
+            continue
+        if part.get("mimeType") == "text/plain":
+            return part
+        if part.get("mimeType") == "text/html" and html_part is None:
+            html_part = part
+    return html_part
+
+
+class Base64UrlStreamDecoder:
+    """Decodes base64url text that arrives in arbitrary-sized pieces."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def decode(self, chunk):
+        """Decodes as much of ``chunk`` as possible, keeping any partial quantum."""
+        data = self._pending + chunk
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return base64.urlsafe_b64decode(data[:usable])
+
+    def finish(self):
+        """Decodes whatever is left, adding the padding Gmail sometimes omits."""
+        data, self._pending = self._pending, b""
+        if not data:
+            return b""
+        return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class AttachmentError(Exception):
+    """Raised when an attachment download fails."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def iter_json_string_value(chunks, key):
+    """Yields the raw contents of one JSON string value from a streamed response.
+
+    Only the characters of the value are kept in memory, one chunk at a time,
+    so a multi-megabyte ``data`` field never has to be held whole. The value
+    must not contain escape sequences, which is true of base64url text.
+
+    Args:
+        chunks (iterable): The response body as byte chunks.
+        key (str): The JSON key whose string value should be streamed.
+
+    Yields:
+        bytes: Consecutive pieces of the value.
+
+    Raises:
+        AttachmentError: If the response has no such value, or ends before
+            the value does.
+    """
+    marker = f'"{key}"'.encode()
+    buffer = b""
+    chunks = iter(chunks)
+    # Find the opening quote of the value.
+    for chunk in chunks:
+        buffer += chunk
+        index = buffer.find(marker)
+        if index == -1:
+            buffer = buffer[-len(marker):]
+            continue
+        quote = buffer.find(b'"', index + len(marker))
+        if quote == -1:
+            continue
+        buffer = buffer[quote + 1:]
+        break
+    else:
+        raise AttachmentError(f"The response has no '{key}' value.")
+
+    while True:
+        end = buffer.find(b'"')
+        if end != -1:
+            yield buffer[:end]
+            return
+        yield buffer
+        buffer = next(chunks, None)
+        if buffer is None:
+            raise AttachmentError(f"The response ended inside the '{key}' value.")
+
+
+class AttachmentStore:
+    """Content-addressed local storage for downloaded attachments.
+
+    Files are stored once per SHA-256 digest, so the same attachment sent in
+    many messages takes disk space once. An index remembers which message
+    part maps to which digest, so a part is only ever downloaded once.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("ATTACHMENT_DIR", "attachments")
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self):
+        if self._connection is None:
+            os.makedirs(self.root, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.root, "index.sqlite3"), check_same_thread=False
+            )
+            with connection:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS parts (
+                        message_id TEXT,
+                        part_id TEXT,
+                        sha256 TEXT,
+                        filename TEXT,
+                        size INTEGER,
+                        PRIMARY KEY (message_id, part_id)
+                    )
+                    """
+                )
+            self._connection = connection
+        return self._connection
+
+    def path_for(self, digest):
+        """Returns where the file with this SHA-256 digest is stored."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def lookup(self, message_id, part_id):
+        """Returns (path, size) for a part that was already stored, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, size FROM parts WHERE message_id = ? AND part_id = ?",
+                (message_id, part_id),
+            ).fetchone()
+        if row is None or not os.path.exists(self.path_for(row[0])):
+            return None
+        return self.path_for(row[0]), row[1]
+
+    def save(self, message_id, part_id, filename, pieces):
+        """Streams decoded bytes to disk and files them under their digest.
+
+        Args:
+            message_id (str): The ID of the message the part belongs to.
+            part_id (str): The MIME part ID within the message.
+            filename (str): The attachment's file name.
+            pieces (iterable): The decoded content, as byte strings.
+
+        Returns:
+            tuple: The stored path, the size in bytes, and whether an identical
+            file was already stored.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        os.makedirs(self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".download-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for piece in pieces:
+                    digest.update(piece)
+                    handle.write(piece)
+                    size += len(piece)
+            path = self.path_for(digest.hexdigest())
+            duplicate = os.path.exists(path)
+            if duplicate:
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?, ?)",
+                (message_id, part_id, digest.hexdigest(), filename, size),
+            )
+        return path, size, duplicate
+
+
+class AttachmentDownloader:
+    """Streams ``messages.attachments.get`` responses without buffering them.
+
+    The JSON response is parsed incrementally and its base64url ``data`` field
+    is decoded chunk by chunk, so peak memory stays at a few chunks no matter
+    how large the attachment is.
+    """
+
+    def __init__(self, get_credentials, scheduler=None):
+        self.get_credentials = get_credentials
+        self.scheduler = scheduler
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            from google.auth.transport.requests import AuthorizedSession
+
+            session = AuthorizedSession(self.get_credentials())
+            self._local.session = session
+        return session
+
+    def _open(self, url):
+        # Retries happen before the first byte is handed out, never mid-stream.
+        from requests import RequestException
+
+        from .quota import QUOTA_UNITS, parse_retry_after
+
+        units = QUOTA_UNITS["messages.attachments.get"]
+        attempt = 0
+        while True:
+            if self.scheduler is not None:
+                self.scheduler.acquire(units)
+            try:
+                with api_call("messages.attachments.get", units) as call:
+                    response = self._session().get(
+                        url, params={"fields": "data"}, stream=True
+                    )
+                    call.status = response.status_code
+                    # The body is streamed later; count what the server announced.
+                    call.received = int(response.headers.get("Content-Length") or 0)
+            except RequestException as error:
+                if self.scheduler is None or attempt >= self.scheduler.max_retries:
+                    raise AttachmentError(str(error)) from error
+                time.sleep(self.scheduler.backoff(attempt))
+                attempt += 1
+                continue
+            if response.status_code < 400:
+                return response
+            content = response.content
+            response.close()
+            if (
+                self.scheduler is None
+                or attempt >= self.scheduler.max_retries
+                or not self.scheduler.is_retryable(response.status_code, content)
+            ):
+                raise AttachmentError(
+                    f"<HttpError {response.status_code}: "
+                    f"{content.decode('utf-8', errors='replace')}>",
+                    response.status_code,
+                )
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            time.sleep(self.scheduler.backoff(attempt, retry_after))
+            attempt += 1
+
+    def iter_decoded(self, message_id, attachment_id, max_bytes=None):
+        """Yields the decoded bytes of an attachment as they arrive.
+
+        Args:
+            message_id (str): The ID of the message.
+            attachment_id (str): The ``body.attachmentId`` of the part.
+            max_bytes (int): Stop after this many decoded bytes, or None.
+
+        Yields:
+            bytes: Consecutive pieces of the attachment.
+
+        Raises:
+            AttachmentError: If Gmail returns an error or the connection fails.
+        """
+        from requests import RequestException
+
+        url = ATTACHMENT_URL.format(message_id=message_id, attachment_id=attachment_id)
+        decoder = Base64UrlStreamDecoder()
+        produced = 0
+        with self._open(url) as response:
+            chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+            try:
+                for encoded in iter_json_string_value(chunks, "data"):
+                    piece = decoder.decode(encoded)
+                    if max_bytes is not None and produced + len(piece) >= max_bytes:
+                        yield piece[: max_bytes - produced]
+                        return
+                    produced += len(piece)
+                    yield piece
+            except RequestException as error:
+                raise AttachmentError(f"Download interrupted: {error}") from error
+            piece = decoder.finish()
+        if max_bytes is not None:
+            piece = piece[: max_bytes - produced]
+        yield piece
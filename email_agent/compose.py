@@ -0,0 +1,155 @@
+import base64
+import mimetypes
+import os
+import secrets
+import tempfile
+from email import policy
+from email.message import EmailMessage
+from email.mime.base import MIMEBase
+from email.mime.text import MIMEText
+
+# Gmail refuses messages larger than this, attachments and encoding included.
+MAX_MESSAGE_BYTES = 35 * 1024 * 1024
+# Messages up to this size are built in memory; larger ones spill to a temporary file.
+SPOOL_MAX_BYTES = 1024 * 1024
+# Only files in this directory can be attached, so a request cannot mail out
+# arbitrary files from the machine.
+SEND_ATTACHMENT_DIR = os.getenv("SEND_ATTACHMENT_DIR", "outbox")
+# Bytes of an attachment read at once; a multiple of 57 so every chunk
+# encodes to whole 76-character base64 lines.
+READ_CHUNK_BYTES = 57 * 1024
+# Messages larger than this are sent as a resumable upload, which survives a
+# dropped connection; smaller ones go in a single request.
+RESUMABLE_UPLOAD_THRESHOLD = int(os.getenv("RESUMABLE_UPLOAD_THRESHOLD", str(5 * 1024 * 1024)))
+# Bytes sent per resumable upload request, rounded down to the 256 KiB
+# multiple Gmail requires.
+UPLOAD_CHUNK_UNIT = 256 * 1024
+UPLOAD_CHUNK_SIZE = UPLOAD_CHUNK_UNIT * max(
+    int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024))) // UPLOAD_CHUNK_UNIT, 1
+)
+
+
+def resolve_attachment(path, root=None):
+    """Returns the absolute path of a file that may be attached.
+
+    Args:
+        path (str): The file name, relative to the attachment directory or
+            to the working directory.
+        root (str): The attachment directory (default is SEND_ATTACHMENT_DIR).
+
+    Returns:
+        str: The real path of the file.
+
+    Raises:
+        ValueError: If the path leaves the attachment directory or is not a file.
+    """
+    root = os.path.realpath(root or SEND_ATTACHMENT_DIR)
+    for candidate in (os.path.join(root, path), path):
+        full_path = os.path.realpath(candidate)
+        # realpath resolves symlinks, so a link cannot point out of the directory.
+        if os.path.commonpath([root, full_path]) == root and os.path.isfile(full_path):
+            return full_path
+    raise ValueError(f"No file named '{path}' was found in {root}; only files there can be attached.")
+
+
+def encoded_size(size):
+    """Returns the size of ``size`` bytes once base64-encoded in 76-character CRLF lines."""
+    characters = 4 * ((size + 2) // 3)
+    return characters + 2 * ((characters + 75) // 76)
+
+
+def _headers(message):
+    # Only the header block, folded and encoded; the body is streamed after it.
+    return b"".join(policy.SMTP.fold_binary(name, value) for name, value in message.items()) + b"\r\n"
+
+
+def build_message(to, subject, body, attachments=(), root=None):
+    """Builds an email as RFC 2822 bytes in a file, ready to upload.
+
+    Attachments are read from disk and base64-encoded chunk by chunk, so
+    memory use does not grow with their size. Small messages stay in memory;
+    larger ones are written to a temporary file that is deleted on close.
+
+    Args:
+        to (str): The recipient's email address.
+        subject (str): The subject of the email.
+        body (str): The plain-text body of the email.
+        attachments (list): Files to attach, from the attachment directory.
+        root (str): The attachment directory (default is SEND_ATTACHMENT_DIR).
+
+    Returns:
+        tempfile.SpooledTemporaryFile: The message, positioned at its start.
+
+    Raises:
+        ValueError: If an attachment cannot be used or the message is too large for Gmail.
+    """
+    paths = [resolve_attachment(path, root) for path in attachments or ()]
+    expected = len(body.encode()) + sum(encoded_size(os.path.getsize(path)) for path in paths)
+    if expected > MAX_MESSAGE_BYTES:
+        raise ValueError(
+            f"The email would be about {expected // (1024 * 1024)} MB; Gmail accepts at most "
+            f"{MAX_MESSAGE_BYTES // (1024 * 1024)} MB including attachments."
+        )
+
+    handle = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    envelope = EmailMessage()
+    envelope["To"] = to
+    envelope["Subject"] = subject
+    if not paths:
+        envelope.set_content(body, charset="utf-8")
+        handle.write(envelope.as_bytes(policy=policy.SMTP))
+        handle.seek(0)
+        return handle
+
+    boundary = f"=={secrets.token_hex(16)}=="
+    envelope["MIME-Version"] = "1.0"
+    envelope["Content-Type"] = f'multipart/mixed; boundary="{boundary}"'
+    delimiter = f"\r\n--{boundary}\r\n".encode()
+    text = MIMEText(body, "plain", "utf-8")
+    del text["MIME-Version"]
+
+    handle.write(_headers(envelope))
+    handle.write(delimiter)
+    handle.write(text.as_bytes(policy=policy.SMTP))
+    for path in paths:
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        part = MIMEBase(*mime_type.split("/", 1))
+        del part["MIME-Version"]
+        part.add_header("Content-Disposition", "attachment", filename=os.path.basename(path))
+        part["Content-Transfer-Encoding"] = "base64"
+        handle.write(delimiter)
+        handle.write(_headers(part))
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(READ_CHUNK_BYTES), b""):
+                handle.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+    handle.write(f"\r\n--{boundary}--\r\n".encode())
+    handle.seek(0)
+    return handle
+
+
+def message_size(handle):
+    """Returns the size in bytes of a message built by ``build_message``."""
+    position = handle.tell()
+    size = handle.seek(0, os.SEEK_END)
+    handle.seek(position)
+    return size
+
+
+def media_upload(handle):
+    """Wraps a message built by ``build_message`` as the ``media_body`` of a Gmail request.
+
+    Args:
+        handle (file): The message, as returned by ``build_message``.
+
+    Returns:
+        googleapiclient.http.MediaIoBaseUpload: The upload, resumable if the
+        message is larger than RESUMABLE_UPLOAD_THRESHOLD.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    return MediaIoBaseUpload(
+        handle,
+        mimetype="message/rfc822",
+        chunksize=UPLOAD_CHUNK_SIZE,
+        resumable=message_size(handle) > RESUMABLE_UPLOAD_THRESHOLD,
+    )
@@ -0,0 +1,195 @@
+import contextlib
+import datetime
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
+
+# Refresh this many seconds before the access token expires.
+REFRESH_MARGIN = float(os.getenv("GMAIL_TOKEN_REFRESH_MARGIN", "300"))
+# Seconds to wait before retrying a failed background refresh.
+REFRESH_RETRY_DELAY = 60
+# Shortest wait between two scheduled refreshes.
+MIN_REFRESH_DELAY = 10
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on ``path`` across processes.
+
+    Args:
+        path (str): The lock file to create and lock.
+    """
+    with open(path, "a+b") as handle:
+        if os.name == "nt":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(path, data):
+    """Replaces a file in one step so readers never see a partial write.
+
+    Args:
+        path (str): The file to write.
+        data (str): The new contents.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _utcnow():
+    # google-auth stores expiry as a naive UTC datetime.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Keeps one set of Gmail credentials fresh for every worker.
+
+    All services share the same ``Credentials`` object. A background timer
+    refreshes it shortly before it expires, so tool calls never wait on an
+    OAuth round trip. Refreshed tokens are written atomically under a file
+    lock, and a token already refreshed by another process is reused instead
+    of being refreshed again.
+    """
+
+    def __init__(
+        self,
+        token_path="token.json",
+        client_secrets_path="credentials.json",
+        scopes=SCOPES,
+        refresh_margin=None,
+    ):
+        self.token_path = token_path
+        self.client_secrets_path = client_secrets_path
+        self.scopes = scopes
+        self.refresh_margin = REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self._credentials = None
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def get(self):
+        """Returns the shared credentials, loading or authorizing them on first use.
+
+        Returns:
+            google.oauth2.credentials.Credentials: Valid credentials.
+        """
+        if self._credentials is not None:
+            return self._credentials
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._load()
+                self._schedule_refresh()
+        return self._credentials
+
+    def _token_lock(self):
+        """Returns a context manager held while the stored token is read or replaced."""
+        return file_lock(self.token_path + ".lock")
+
+    def _read_token(self):
+        from google.oauth2.credentials import Credentials
+
+        if not os.path.exists(self.token_path):
+            return None
+        return Credentials.from_authorized_user_file(self.token_path, self.scopes)
+
+    def _write_token(self, creds):
+        atomic_write(self.token_path, creds.to_json())
+
+    def _authorize(self):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets_path, self.scopes)
+        return flow.run_local_server(port=0)
+
+    def _load(self):
+        with self._token_lock():
+            creds = self._read_token()
+            if creds and creds.valid:
+                return creds
+            if creds and creds.expired and creds.refresh_token:
+                from google.auth.transport.requests import Request
+
+                creds.refresh(Request())
+            else:
+                creds = self._authorize()
+            self._write_token(creds)
+            return creds
+
+    def refresh(self):
+        """Refreshes the shared credentials in place and persists them."""
+        from google.auth.transport.requests import Request
+
+        with self._lock, self._token_lock():
+            creds = self._credentials
+            on_disk = self._read_token()
+            if (
+                on_disk is not None
+                and on_disk.expiry is not None
+                and (creds.expiry is None or on_disk.expiry > creds.expiry)
+                and self._seconds_left(on_disk) > self.refresh_margin
+            ):
+                # Another process refreshed the token already.
+                creds.token = on_disk.token
+                creds.expiry = on_disk.expiry
+                return
+            creds.refresh(Request())
+            self._write_token(creds)
+
+    @staticmethod
+    def _seconds_left(creds):
+        if creds.expiry is None:
+            return float("inf")
+        return (creds.expiry - _utcnow()).total_seconds()
+
+    def _schedule_refresh(self, delay=None):
+        if delay is None:
+            seconds_left = self._seconds_left(self._credentials)
+            if seconds_left == float("inf"):
+                return
+            delay = max(seconds_left - self.refresh_margin, MIN_REFRESH_DELAY)
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Background Gmail token refresh failed")
+            self._schedule_refresh(REFRESH_RETRY_DELAY)
+        else:
+            self._schedule_refresh()
+
+    def stop(self):
+        """Cancels the background refresh timer."""
+        if self._timer is not None:
+            self._timer.cancel()
@@ -0,0 +1,183 @@
+import html
+import random
+import re
+import zlib
+
+# MinHash signature length, split into LSH bands of equal width. Two messages
+# become candidates when any band matches; with 20 bands of 3 rows that
+# happens for 93% of pairs at 0.5 similarity and 99.9% at 0.7.
+SIGNATURE_LENGTH = 60
+BANDS = 20
+# Estimated Jaccard similarity at which two messages count as near-duplicates.
+DUPLICATE_THRESHOLD = 0.5
+# Subject shingles are repeated this many times, since automated mail often
+# shares a subject template while the text below it changes.
+SUBJECT_WEIGHT = 3
+# Characters of a known body that are shingled.
+BODY_SHINGLE_CHARS = 2000
+
+_WORD = re.compile(r"[^\W_]+")
+_DIGITS = re.compile(r"\d+")
+_ADDRESS = re.compile(r"[\w.+'-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def normalize(text):
+    """Lower-cases text and replaces numbers, so "Order #1041" and "Order #1187" read the same.
+
+    Args:
+        text (str): Subject, snippet or body text.
+
+    Returns:
+        list: The words of the text.
+    """
+    return _WORD.findall(_DIGITS.sub("0", html.unescape(text).lower()))
+
+
+def shingles(words, tag=""):
+    """Returns the word pairs of a text, or its single word, tagged by where they come from."""
+    if len(words) < 2:
+        return {tag + word for word in words}
+    return {f"{tag}{first} {second}" for first, second in zip(words, words[1:])}
+
+
+def message_shingles(message):
+    """Returns the shingles of a message: its sender address, subject, snippet and any known body.
+
+    Args:
+        message (Message): The message.
+
+    Returns:
+        set: The shingles, as strings.
+    """
+    subject = normalize(message.subject)
+    found = set()
+    for copy in range(SUBJECT_WEIGHT):
+        found |= shingles(subject, f"{copy}:")
+    found |= shingles(normalize(message.snippet))
+    if message.has_body:
+        found |= shingles(normalize(message.body[:BODY_SHINGLE_CHARS]))
+    address = _ADDRESS.search(message.sender)
+    if address:
+        found.add("from:" + address.group(0).lower())
+    return found
+
+
+def minhash_signatures(shingle_sets, seed=0):
+    """Computes MinHash signatures for many shingle sets in a few vectorized passes. Needs numpy.
+
+    Each shingle is hashed once with CRC-32; the SIGNATURE_LENGTH hash
+    functions are then multiply-shift hashes of that value, applied to every
+    shingle of every set at once.
+
+    Args:
+        shingle_sets (list): Non-empty sets of shingle strings.
+        seed (int): Seeds the hash functions, so signatures are reproducible.
+
+    Returns:
+        numpy.ndarray: One row of SIGNATURE_LENGTH uint32 values per set.
+    """
+    import numpy as np
+
+    rng = random.Random(seed)
+    multipliers = np.array(
+        [rng.getrandbits(64) | 1 for _ in range(SIGNATURE_LENGTH)], dtype=np.uint64
+    )
+    offsets = np.array([rng.getrandbits(64) for _ in range(SIGNATURE_LENGTH)], dtype=np.uint64)
+    values = np.fromiter(
+        (zlib.crc32(shingle.encode()) for found in shingle_sets for shingle in found),
+        dtype=np.uint64,
+    )
+    starts = np.zeros(len(shingle_sets), dtype=np.int64)
+    np.cumsum([len(found) for found in shingle_sets[:-1]], out=starts[1:])
+    signatures = np.empty((len(shingle_sets), SIGNATURE_LENGTH), dtype=np.uint32)
+    for column in range(SIGNATURE_LENGTH):
+        # Multiplication wraps modulo 2**64; the high 32 bits are the hash.
+        hashed = (values * multipliers[column] + offsets[column]) >> np.uint64(32)
+        signatures[:, column] = np.minimum.reduceat(hashed, starts)
+    return signatures
+
+
+def cluster_signatures(signatures, threshold=None):
+    """Groups near-identical signatures with banded locality-sensitive hashing. Needs numpy.
+
+    In each band, the rows sharing the band's values are compared with the
+    first of them over the whole signature, and joined to it if they agree on
+    at least ``threshold`` of it. Clusters are the connected groups that
+    result, found by label propagation. Every step is linear in the number
+    of rows, apart from the sort that groups each band.
+
+    Args:
+        signatures (numpy.ndarray): MinHash signatures, one row per item.
+        threshold (float): The estimated Jaccard similarity needed to join,
+            by default DUPLICATE_THRESHOLD.
+
+    Returns:
+        list: Lists of row numbers, one per cluster, largest first. Rows
+        without a near-duplicate are left out.
+    """
+    import numpy as np
+
+    threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+    count = len(signatures)
+    if count < 2:
+        return []
+    width = SIGNATURE_LENGTH // BANDS
+    sources, targets = [], []
+    rows = np.arange(count)
+    for band in range(BANDS):
+        # Fold the band into one key; a collision only adds a candidate to check.
+        keys = np.zeros(count, dtype=np.uint64)
+        for column in range(band * width, (band + 1) * width):
+            keys = (keys * np.uint64(0x100000001B3)) ^ signatures[:, column]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse]
+        candidates = np.flatnonzero(leaders != rows)
+        if not len(candidates):
+            continue
+        agreement = (signatures[candidates] == signatures[leaders[candidates]]).mean(axis=1)
+        joined = candidates[agreement >= threshold]
+        sources.append(joined)
+        targets.append(leaders[joined])
+    if not sources:
+        return []
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+
+    labels = rows.copy()
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, sources, labels[targets])
+        np.minimum.at(labels, targets, labels[sources])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    clusters = [group.tolist() for group in np.split(order, boundaries) if len(group) > 1]
+    clusters.sort(key=len, reverse=True)
+    return clusters
+
+
+def near_duplicate_clusters(messages, min_size=2, threshold=None):
+    """Clusters messages that are near-duplicates of each other, such as newsletters and notifications.
+
+    Args:
+        messages (list): Message records, in display order.
+        min_size (int): The fewest messages a cluster is reported with.
+        threshold (float): The estimated Jaccard similarity needed to join a
+            cluster, by default DUPLICATE_THRESHOLD.
+
+    Returns:
+        list: Lists of messages, one per cluster, largest first; each list
+        keeps the order of ``messages``.
+    """
+    shingled = [(message, message_shingles(message)) for message in messages]
+    shingled = [(message, found) for message, found in shingled if found]
+    if len(shingled) < 2:
+        return []
+    signatures = minhash_signatures([found for _, found in shingled])
+    return [
+        [shingled[row][0] for row in cluster]
+        for cluster in cluster_signatures(signatures, threshold)
+        if len(cluster) >= min_size
+    ]
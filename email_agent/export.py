@@ -0,0 +1,504 @@
+import argparse
+import base64
+import contextvars
+import email
+import email.policy
+import gzip
+import json
+import logging
+import mailbox
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import agent
+
+logger = logging.getLogger(__name__)
+
+# Threads fetching parts at once. Throughput grows with them until the quota
+# scheduler of the account (GMAIL_QUOTA_UNITS_PER_SECOND) becomes the limit.
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+# Messages per part file; each part is fetched in batches of BATCH_SIZE.
+EXPORT_PART_SIZE = int(os.getenv("EXPORT_PART_SIZE", "1000"))
+# IDs listed per messages.list call, the most Gmail allows.
+EXPORT_LIST_PAGE_SIZE = 500
+
+CHECKPOINT_NAME = "export.sqlite3"
+EXPORT_HEADERS = ["From", "To", "Cc", "Subject"]
+METADATA_EXPORT_FIELDS = "id,threadId,labelIds,snippet,internalDate,sizeEstimate,payload/headers"
+RAW_EXPORT_FIELDS = "id,threadId,labelIds,snippet,internalDate,sizeEstimate,raw"
+
+# Column order of every part file.
+COLUMNS = (
+    "id",
+    "thread_id",
+    "internal_date",
+    "labels",
+    "sender",
+    "recipient",
+    "cc",
+    "subject",
+    "snippet",
+    "size_estimate",
+    "body",
+)
+
+
+class ExportCheckpoint:
+    """Remembers what an export has listed and written, so it can be resumed.
+
+    Every listed ID is stored with the part it was assigned to and whether that
+    part was written. A part is assigned before it is fetched and marked done
+    only after its file is in place, so an interrupted export rewrites the
+    parts it had not finished and never writes a message twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER,
+                    part INTEGER,
+                    done INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS messages_by_part ON messages (part, done);
+                CREATE TABLE IF NOT EXISTS export_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+
+    def get_state(self, key, default=None):
+        row = self._conn.execute(
+            "SELECT value FROM export_state WHERE key = ?", (key,)
+        ).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, **values):
+        with self._conn:
+            self._set_state(values)
+
+    def _set_state(self, values):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO export_state VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def check_settings(self, **settings):
+        """Stores the settings of a new export, or checks a resumed one uses the same.
+
+        Raises:
+            ValueError: If the checkpoint belongs to an export with other settings.
+        """
+        stored = self.get_state("settings")
+        wanted = json.dumps(settings, sort_keys=True)
+        if stored is None:
+            self.set_state(settings=wanted)
+        elif stored != wanted:
+            raise ValueError(
+                f"{self.path} belongs to an export with other settings ({stored}); "
+                f"use another output directory or the same settings."
+            )
+
+    def add_page(self, message_ids, next_page_token):
+        """Stores one page of listed IDs together with the token of the next page."""
+        with self._conn:
+            start = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO messages (id, position) VALUES (?, ?)",
+                [(message_id, start + offset) for offset, message_id in enumerate(message_ids)],
+            )
+            self._set_state({"page_token": next_page_token or "", "listed": int(not next_page_token)})
+
+    def assign_parts(self, part_size):
+        """Splits the IDs not yet assigned into new parts, keeping the listing order."""
+        with self._conn:
+            next_part = self._conn.execute("SELECT COALESCE(MAX(part) + 1, 0) FROM messages").fetchone()[0]
+            pending = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT id FROM messages WHERE part IS NULL ORDER BY position"
+                )
+            ]
+            for offset in range(0, len(pending), part_size):
+                self._conn.executemany(
+                    "UPDATE messages SET part = ? WHERE id = ?",
+                    [(next_part, message_id) for message_id in pending[offset:offset + part_size]],
+                )
+                next_part += 1
+
+    def pending_parts(self):
+        """Returns the parts still to be written, as (part, message IDs) pairs."""
+        parts = {}
+        for part, message_id in self._conn.execute(
+            "SELECT part, id FROM messages WHERE part IS NOT NULL AND done = 0 ORDER BY position"
+        ):
+            parts.setdefault(part, []).append(message_id)
+        return sorted(parts.items())
+
+    def finish_part(self, part, written, failed):
+        """Marks the written messages of a part as done and releases the failed ones.
+
+        Failed messages go back to the pool of unassigned IDs, so the next run
+        puts them in a new part instead of rewriting this one.
+        """
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE messages SET done = 1 WHERE id = ?", [(i,) for i in written]
+            )
+            self._conn.executemany(
+                "UPDATE messages SET part = NULL WHERE id = ?", [(i,) for i in failed]
+            )
+
+    def counts(self):
+        """Returns how many IDs were listed and how many were written."""
+        return self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(done), 0) FROM messages"
+        ).fetchone()
+
+    def close(self):
+        self._conn.close()
+
+
+class ParquetWriter:
+    """Writes parts as zstd-compressed Parquet files. Needs pyarrow."""
+
+    extension = ".parquet"
+
+    def __init__(self):
+        import pyarrow
+        import pyarrow.parquet
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = pyarrow.schema(
+            [
+                ("id", pyarrow.string()),
+                ("thread_id", pyarrow.string()),
+                ("internal_date", pyarrow.timestamp("ms", tz="UTC")),
+                ("labels", pyarrow.list_(pyarrow.string())),
+                ("sender", pyarrow.string()),
+                ("recipient", pyarrow.string()),
+                ("cc", pyarrow.string()),
+                ("subject", pyarrow.string()),
+                ("snippet", pyarrow.string()),
+                ("size_estimate", pyarrow.int64()),
+                ("body", pyarrow.string()),
+            ]
+        )
+
+    def write(self, path, rows):
+        columns = {name: [row[name] for row in rows] for name in COLUMNS}
+        table = self._pa.table(columns, schema=self.schema)
+        self._pq.write_table(table, path, compression="zstd")
+
+
+class JsonLinesWriter:
+    """Writes parts as gzip-compressed JSON lines, one message per line."""
+
+    extension = ".jsonl.gz"
+
+    def write(self, path, rows):
+        with gzip.open(path, "wt", encoding="utf-8") as handle:
+            for row in rows:
+                handle.write(json.dumps(row, ensure_ascii=False))
+                handle.write("\n")
+
+
+WRITERS = {"parquet": ParquetWriter, "jsonl": JsonLinesWriter}
+
+
+def resolve_format(file_format):
+    """Returns the part format to use; "auto" means Parquet if pyarrow is installed.
+
+    Raises:
+        ValueError: If the format is unknown, or Parquet is asked for without pyarrow.
+    """
+    if file_format == "auto":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return "jsonl"
+        return "parquet"
+    if file_format not in WRITERS:
+        raise ValueError(f"Unknown format '{file_format}'. Use one of: auto, {', '.join(WRITERS)}.")
+    if file_format == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet output needs pyarrow: pip install pyarrow") from None
+    return file_format
+
+
+def header_values(headers):
+    """Maps the lower-cased names of Gmail payload headers to their values."""
+    return {header["name"].lower(): header["value"] for header in headers}
+
+
+def text_of(parsed):
+    """Returns the text body of a parsed message, preferring text/plain over text/html."""
+    part = parsed.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        text = part.get_content()
+    except (LookupError, ValueError):
+        # Unknown or wrong charsets.
+        text = part.get_payload(decode=True).decode("utf-8", errors="replace")
+    if part.get_content_subtype() == "html":
+        text = " ".join(agent.HTML_TAG_PATTERN.sub(" ", text).split())
+    return text
+
+
+def export_row(resource):
+    """Turns a fetched message resource into one row of a part file.
+
+    Args:
+        resource (dict): A message fetched with ``format=metadata`` or ``format=raw``.
+
+    Returns:
+        tuple: The row, and the raw RFC 2822 bytes (None for metadata).
+    """
+    raw = None
+    body = None
+    if "raw" in resource:
+        data = resource["raw"]
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        parsed = email.message_from_bytes(raw, policy=email.policy.default)
+        headers = {name.lower(): str(value) for name, value in parsed.items()}
+        body = text_of(parsed)
+    else:
+        headers = header_values(resource.get("payload", {}).get("headers", []))
+    row = {
+        "id": resource["id"],
+        "thread_id": resource.get("threadId"),
+        "internal_date": int(resource.get("internalDate", 0)),
+        "labels": resource.get("labelIds", []),
+        "sender": headers.get("from"),
+        "recipient": headers.get("to"),
+        "cc": headers.get("cc"),
+        "subject": headers.get("subject"),
+        "snippet": resource.get("snippet"),
+        "size_estimate": resource.get("sizeEstimate"),
+        "body": body,
+    }
+    return row, raw
+
+
+def write_mbox(path, raw_messages):
+    """Writes raw messages to an mbox file, quoting "From " lines as needed."""
+    box = mailbox.mbox(path, create=True)
+    try:
+        for raw in raw_messages:
+            box.add(raw)
+    finally:
+        box.close()
+
+
+def export_part(output_dir, part, message_ids, writer, raw, mbox):
+    """Fetches one part in batches and writes its files.
+
+    Files are written under a temporary name and renamed when complete, so a
+    part file on disk is never half written.
+
+    Returns:
+        tuple: The IDs written, and the IDs that could not be fetched.
+    """
+    if raw:
+        fetched, failed = agent.fetch_messages(message_ids, format="raw", fields=RAW_EXPORT_FIELDS)
+    else:
+        fetched, failed = agent.fetch_messages(
+            message_ids,
+            format="metadata",
+            metadataHeaders=EXPORT_HEADERS,
+            fields=METADATA_EXPORT_FIELDS,
+        )
+    rows, raw_messages = [], []
+    for resource in fetched:
+        row, raw_bytes = export_row(resource)
+        rows.append(row)
+        raw_messages.append(raw_bytes)
+
+    name = os.path.join(output_dir, f"part-{part:05d}")
+    if rows:
+        writer.write(name + writer.extension + ".tmp", rows)
+        os.replace(name + writer.extension + ".tmp", name + writer.extension)
+        if mbox:
+            if os.path.exists(name + ".mbox.tmp"):
+                os.remove(name + ".mbox.tmp")
+            write_mbox(name + ".mbox.tmp", raw_messages)
+            os.replace(name + ".mbox.tmp", name + ".mbox")
+    return [row["id"] for row in rows], failed
+
+
+def list_into(checkpoint, query, include_spam_trash):
+    """Lists every matching ID into the checkpoint, resuming from the stored page token."""
+    mailbox_account = agent.current_account()
+    page_token = checkpoint.get_state("page_token") or None
+    while checkpoint.get_state("listed") != "1":
+        response = mailbox_account.scheduler.execute(
+            mailbox_account.gmail()
+            .users()
+            .messages()
+            .list(
+                userId="me",
+                q=query,
+                maxResults=EXPORT_LIST_PAGE_SIZE,
+                pageToken=page_token,
+                includeSpamTrash=include_spam_trash,
+                fields="messages/id,nextPageToken",
+            )
+        )
+        page_token = response.get("nextPageToken")
+        checkpoint.add_page([message["id"] for message in response.get("messages", [])], page_token)
+
+
+def export_mailbox(
+    output_dir,
+    query="",
+    account="",
+    workers=None,
+    file_format="auto",
+    mbox=False,
+    bodies=False,
+    include_spam_trash=False,
+    part_size=None,
+    progress=None,
+):
+    """Exports every message matching a query to part files, resuming an earlier run.
+
+    IDs are listed into a checkpoint in ``output_dir`` first. They are then
+    split into parts that a pool of threads fetches in batches; each part is
+    written to its own file and recorded in the checkpoint as soon as it is
+    complete. Running the export again with the same settings carries on
+    with the parts and messages not yet written.
+
+    Args:
+        output_dir (str): The directory for the part files and the checkpoint.
+        query (str): The Gmail search query selecting the messages (default is all).
+        account (str): The registered account to export (default is the main account).
+        workers (int): The number of parts fetched at once (default is EXPORT_WORKERS).
+        file_format (str): "parquet", "jsonl" or "auto" for Parquet when pyarrow is installed.
+        mbox (bool): Also write the raw messages of each part to an mbox file.
+        bodies (bool): Include the text body of each message (fetches raw messages).
+        include_spam_trash (bool): Also export messages in Spam and Trash.
+        part_size (int): Messages per part file (default is EXPORT_PART_SIZE).
+        progress (callable): Called with (written, listed, failed) after each part.
+
+    Returns:
+        dict: Messages listed, written and failed in this run, parts written and seconds taken.
+
+    Raises:
+        ValueError: If the output directory holds an export with other settings.
+        HttpError: If listing the messages fails.
+    """
+    workers = workers or EXPORT_WORKERS
+    part_size = part_size or EXPORT_PART_SIZE
+    file_format = resolve_format(file_format)
+    writer = WRITERS[file_format]()
+    raw = mbox or bodies
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = ExportCheckpoint(os.path.join(output_dir, CHECKPOINT_NAME))
+    started = time.monotonic()
+    written_now = failed_now = parts_now = 0
+    try:
+        with agent.use_account(account):
+            # The listed IDs and page token only make sense for one mailbox.
+            checkpoint.check_settings(
+                account=agent.current_account().name,
+                query=query,
+                format=file_format,
+                raw=raw,
+                mbox=mbox,
+                include_spam_trash=include_spam_trash,
+            )
+            list_into(checkpoint, query, include_spam_trash)
+            checkpoint.assign_parts(part_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+                # Each worker runs on the account chosen above.
+                futures = {
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        export_part,
+                        output_dir,
+                        part,
+                        message_ids,
+                        writer,
+                        raw,
+                        mbox,
+                    ): part
+                    for part, message_ids in checkpoint.pending_parts()
+                }
+                for future in as_completed(futures):
+                    part = futures[future]
+                    try:
+                        written, failed = future.result()
+                    except Exception:
+                        # The part stays pending and is retried by the next run.
+                        logger.exception("Export of part %d failed", part)
+                        continue
+                    checkpoint.finish_part(part, written, failed)
+                    written_now += len(written)
+                    failed_now += len(failed)
+                    parts_now += 1
+                    if progress is not None:
+                        listed, done = checkpoint.counts()
+                        progress(done, listed, failed_now)
+        listed, done = checkpoint.counts()
+    finally:
+        checkpoint.close()
+    return {
+        "listed": listed,
+        "written": done,
+        "written_this_run": written_now,
+        "failed": failed_now,
+        "parts": parts_now,
+        "format": file_format,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a mailbox to compressed part files.")
+    parser.add_argument("output_dir", help="directory for the part files and the checkpoint")
+    parser.add_argument("--query", default="", help="Gmail search query (default: every message)")
+    parser.add_argument("--account", default="", help="registered account to export")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="parts fetched at once")
+    parser.add_argument("--format", default="auto", choices=["auto", *WRITERS], help="part file format")
+    parser.add_argument("--mbox", action="store_true", help="also write raw messages as mbox")
+    parser.add_argument("--bodies", action="store_true", help="include text bodies in the part files")
+    parser.add_argument("--include-spam-trash", action="store_true", help="also export Spam and Trash")
+    parser.add_argument("--part-size", type=int, default=EXPORT_PART_SIZE, help="messages per part file")
+    args = parser.parse_args()
+
+    def report(written, listed, failed):
+        print(f"\r📦 {written}/{listed} messages written, {failed} failed", end="", flush=True)
+
+    result = export_mailbox(
+        args.output_dir,
+        query=args.query,
+        account=args.account,
+        workers=args.workers,
+        file_format=args.format,
+        mbox=args.mbox,
+        bodies=args.bodies,
+        include_spam_trash=args.include_spam_trash,
+        part_size=args.part_size,
+        progress=report,
+    )
+    print(
+        f"\n✅ {result['written']}/{result['listed']} messages exported as {result['format']} "
+        f"in {result['seconds']:.1f}s"
+    )
+    if result["written"] < result["listed"]:
+        print("⚠️ Some messages were not exported; run the same command again to retry them.")
+
+
+if __name__ == "__main__":
+    main()
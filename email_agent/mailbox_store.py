@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+
+from .message import Message
+from .search_index import SearchIndex
+from .semantic_index import SemanticIndex
+
+
+class MailboxStore:
+    """A local SQLite mirror of message metadata, keyed by Gmail message ID.
+
+    The mirror always holds the most recent messages of the mailbox: a full
+    sync stores the newest messages, and incremental syncs only add newer mail
+    or update what is already stored. Any query that finds enough matches
+    locally therefore returns the same messages Gmail would.
+
+    An inverted index over the stored headers and snippets is built on first
+    use of ``index``, and a topic index on first use of ``semantic``; both are
+    kept up to date by every change to the mirror.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("MAILBOX_CACHE_DB", "mailbox_cache.sqlite3")
+        self._lock = threading.Lock()
+        self._connection = None
+        self._index = None
+        self._semantic = None
+
+    @property
+    def _conn(self):
+        # Opened on first use so that importing the agent stays cheap.
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            self._create_schema(connection)
+            self._connection = connection
+        return self._connection
+
+    @property
+    def index(self):
+        """The SearchIndex over every stored message, built on first access."""
+        with self._lock:
+            if self._index is None:
+                index = SearchIndex()
+                for row in self._conn.execute("SELECT * FROM messages"):
+                    index.add(Message.from_record(row))
+                self._index = index
+            return self._index
+
+    @property
+    def semantic(self):
+        """The SemanticIndex over every stored message, built on first access. Needs numpy."""
+        with self._lock:
+            if self._semantic is None:
+                semantic = SemanticIndex()
+                rows = self._conn.execute("SELECT * FROM messages")
+                semantic.add([Message.from_record(row) for row in rows])
+                self._semantic = semantic
+            return self._semantic
+
+    @staticmethod
+    def _create_schema(connection):
+        with connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id TEXT PRIMARY KEY,
+                    thread_id TEXT,
+                    internal_date INTEGER,
+                    label_ids TEXT,
+                    sender TEXT,
+                    recipient TEXT,
+                    subject TEXT,
+                    snippet TEXT
+                );
+                CREATE INDEX IF NOT EXISTS messages_by_date
+                    ON messages (internal_date DESC);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+
+    def upsert(self, messages):
+        """Inserts or replaces messages.
+
+        Args:
+            messages (list): The Message records to store.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [message.to_record() for message in messages],
+            )
+            if self._index is not None:
+                for message in messages:
+                    self._index.add(message)
+            if self._semantic is not None:
+                self._semantic.add(messages)
+
+    def delete(self, message_ids):
+        """Removes messages from the mirror.
+
+        Args:
+            message_ids (list): The IDs of the messages to remove.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM messages WHERE id = ?", [(i,) for i in message_ids]
+            )
+            if self._index is not None:
+                self._index.remove(message_ids)
+            if self._semantic is not None:
+                self._semantic.remove(message_ids)
+
+    def update_labels(self, message_id, added=(), removed=()):
+        """Applies a label change to a stored message, if it is stored.
+
+        Args:
+            message_id (str): The ID of the message.
+            added (list): Label IDs added to the message.
+            removed (list): Label IDs removed from the message.
+        """
+        self.update_labels_many([message_id], added, removed)
+
+    def update_labels_many(self, message_ids, added=(), removed=()):
+        """Applies the same label change to several stored messages.
+
+        Args:
+            message_ids (list): The IDs of the messages; unknown IDs are skipped.
+            added (list): Label IDs added to the messages.
+            removed (list): Label IDs removed from the messages.
+        """
+        with self._lock, self._conn:
+            for message_id in message_ids:
+                row = self._conn.execute(
+                    "SELECT label_ids FROM messages WHERE id = ?", (message_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                labels = [l for l in row["label_ids"].split() if l not in removed]
+                labels.extend(l for l in added if l not in labels)
+                self._conn.execute(
+                    "UPDATE messages SET label_ids = ? WHERE id = ?",
+                    (" ".join(labels), message_id),
+                )
+                if self._index is not None:
+                    self._index.set_labels(message_id, labels)
+                if self._semantic is not None:
+                    self._semantic.set_labels(message_id, labels)
+
+    def get_many(self, message_ids):
+        """Looks up stored messages by ID.
+
+        Args:
+            message_ids (list): The IDs to look up.
+
+        Returns:
+            dict: Message IDs mapped to Message records, for the IDs that are stored.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self._conn.execute(
+                    f"SELECT * FROM messages WHERE id IN ({placeholders})", chunk
+                ):
+                    found[row["id"]] = Message.from_record(row)
+        return found
+
+    def clear(self):
+        """Drops every stored message and the sync state."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM sync_state")
+            if self._index is not None:
+                self._index.clear()
+            if self._semantic is not None:
+                self._semantic.clear()
+
+    def get_state(self, key, default=None):
+        """Reads a sync state value, such as the last stored history ID."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM sync_state WHERE key = ?", (key,)
+            ).fetchone()
+        return default if row is None else row["value"]
+
+    def set_state(self, **values):
+        """Stores one or more sync state values."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                [(key, str(value)) for key, value in values.items()],
+            )
+
+    def close(self):
+        """Closes the database and drops the indexes; all are reopened on next use."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._index = None
+            self._semantic = None
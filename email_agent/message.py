@@ -0,0 +1,162 @@
+import base64
+import sys
+import time
+
+from .attachments import find_text_part
+
+# Headers kept on a Message, mapped to the attribute that holds them.
+HEADER_FIELDS = {"from": "sender", "to": "recipient", "subject": "subject"}
+
+
+class Message:
+    """A compact record of one Gmail message, shared by the tools and the mirror.
+
+    Only the fields the agent shows are kept, in slots rather than a per-object
+    dict. Label IDs and addresses repeat across a mailbox, so they are interned
+    and stored once. A plain-text body that came inline is kept in its
+    encoded form and only decoded the first time it is read.
+    """
+
+    __slots__ = (
+        "id",
+        "thread_id",
+        "internal_date",
+        "label_ids",
+        "sender",
+        "recipient",
+        "subject",
+        "snippet",
+        "_body",
+        "_body_data",
+    )
+
+    def __init__(
+        self,
+        id,
+        thread_id=None,
+        internal_date=0,
+        label_ids=(),
+        sender="Unknown Sender",
+        recipient="",
+        subject="No Subject",
+        snippet="No snippet available.",
+        body=None,
+    ):
+        self.id = id
+        self.thread_id = thread_id
+        self.internal_date = internal_date
+        self.label_ids = tuple(sys.intern(label) for label in label_ids)
+        self.sender = sys.intern(sender)
+        self.recipient = sys.intern(recipient)
+        self.subject = subject
+        self.snippet = snippet
+        self._body = body
+        self._body_data = None
+
+    @classmethod
+    def from_resource(cls, resource, include_body=False):
+        """Builds a Message from a Gmail message resource.
+
+        Headers are read in a single pass that stops once every kept header
+        has been seen.
+
+        Args:
+            resource (dict): A message fetched with ``format=metadata`` or ``format=full``.
+            include_body (bool): Whether to keep an inline plain-text body for
+                later decoding. Bodies that are HTML only or stored separately
+                (under an ``attachmentId``) are left for the caller to set.
+
+        Returns:
+            Message: The compact record.
+        """
+        payload = resource.get("payload", {})
+        fields = {}
+        for header in payload.get("headers", ()):
+            field = HEADER_FIELDS.get(header["name"].lower())
+            if field is not None and field not in fields:
+                fields[field] = header["value"]
+                if len(fields) == len(HEADER_FIELDS):
+                    break
+        message = cls(
+            resource["id"],
+            resource.get("threadId"),
+            int(resource.get("internalDate", time.time() * 1000)),
+            resource.get("labelIds", ()),
+            snippet=resource.get("snippet", "No snippet available."),
+            **fields,
+        )
+        if include_body:
+            part = find_text_part(payload)
+            if part is None:
+                message._body = ""
+            elif part["mimeType"] == "text/plain" and "data" in part.get("body", {}):
+                message._body_data = part["body"]["data"]
+        return message
+
+    @classmethod
+    def from_record(cls, record):
+        """Builds a Message from a ``messages`` table row, in column order."""
+        (message_id, thread_id, internal_date, label_ids,
+         sender, recipient, subject, snippet) = record
+        return cls(
+            message_id, thread_id, internal_date, label_ids.split(),
+            sender, recipient, subject, snippet,
+        )
+
+    def to_record(self):
+        """Returns the values of the ``messages`` table row, in column order."""
+        return (
+            self.id,
+            self.thread_id,
+            self.internal_date,
+            " ".join(self.label_ids),
+            self.sender,
+            self.recipient,
+            self.subject,
+            self.snippet,
+        )
+
+    @property
+    def has_body(self):
+        """Whether the body was fetched, so reading it needs no API call."""
+        return self._body is not None or self._body_data is not None
+
+    @property
+    def body(self):
+        """The plain-text body, decoded on first access; empty if not fetched."""
+        if self._body is None and self._body_data is not None:
+            data, self._body_data = self._body_data, None
+            self._body = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode(
+                "utf-8", errors="replace"
+            )
+        return self._body or ""
+
+    @body.setter
+    def body(self, text):
+        self._body = text
+        self._body_data = None
+
+    def text_size(self):
+        """Returns the number of bytes this message adds to a read result.
+
+        A body that is still encoded is sized from its base64 length, so this
+        does not decode it.
+        """
+        size = sum(
+            len(text.encode("utf-8")) for text in (self.sender, self.subject, self.snippet)
+        )
+        if self._body is not None:
+            return size + len(self._body.encode("utf-8"))
+        if self._body_data is not None:
+            return size + len(self._body_data) * 3 // 4
+        return size
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.to_record() == other.to_record()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message(id={self.id!r}, subject={self.subject!r})"
@@ -0,0 +1,421 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Number of finished spans kept for the /traces endpoint.
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+
+# Tools report failures as strings; these recover the HTTP status from them.
+_ERROR_PREFIX = "An error occurred"
+_STATUS_PATTERN = re.compile(r"HttpError (\d{3})")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Adds ``amount`` to the series selected by ``labels``."""
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Returns the current value of one series, 0 if it was never incremented."""
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Records one observation in the series selected by ``labels``."""
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(b), s, c)) for key, (b, s, c) in self._series.items())
+        for key, (buckets, total, count) in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, buckets):
+                cumulative += hits
+                labels = _format_labels(self.labels, key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them for Prometheus."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labels=()):
+        """Returns the counter called ``name``, creating it on first use."""
+        return self._get(Counter, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=()):
+        """Returns the histogram called ``name``, creating it on first use."""
+        return self._get(Histogram, name, documentation, labels)
+
+    def _get(self, kind, name, documentation, labels):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = kind(name, documentation, labels)
+            return metric
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+tool_calls = registry.counter(
+    "email_agent_tool_calls_total", "Tool calls by outcome.", ("tool", "outcome")
+)
+tool_errors = registry.counter(
+    "email_agent_tool_errors_total",
+    "Tool calls that returned an error string, by HTTP status.",
+    ("tool", "status"),
+)
+tool_latency = registry.histogram(
+    "email_agent_tool_duration_seconds", "Tool call latency.", ("tool",)
+)
+api_calls = registry.counter(
+    "gmail_api_calls_total", "Gmail API calls, retries included, by status.", ("method", "status")
+)
+api_latency = registry.histogram(
+    "gmail_api_duration_seconds", "Gmail API call latency.", ("method",)
+)
+quota_units = registry.counter(
+    "gmail_quota_units_total", "Gmail quota units consumed.", ("method",)
+)
+bytes_sent = registry.counter(
+    "gmail_api_request_bytes_total", "Request payload bytes sent to Gmail.", ("method",)
+)
+bytes_received = registry.counter(
+    "gmail_api_response_bytes_total", "Response payload bytes received from Gmail.", ("method",)
+)
+
+
+class Span:
+    """One timed step of a trace, such as a user turn, a tool call or an API call."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration", "attributes")
+
+    def __init__(self, name, parent=None, **attributes):
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+_current_span = contextvars.ContextVar("email_agent_span", default=None)
+_finished_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Times a block as a span, nested under the span already open in this context.
+
+    Context variables follow asyncio tasks and ``asyncio.to_thread``, so API
+    calls made by a tool are linked to the tool call and the user turn above it.
+
+    Args:
+        name (str): The span name, e.g. "turn" or "tool.read_emails".
+        **attributes: Values recorded with the span.
+
+    Yields:
+        Span: The open span; attributes may be added to it.
+    """
+    current = Span(name, _current_span.get(), **attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        _finished_spans.append(current)
+
+
+def recent_traces(limit=50):
+    """Returns the most recent traces, newest first, each with its spans in start order.
+
+    Args:
+        limit (int): The maximum number of traces to return.
+
+    Returns:
+        list: One dict per trace with its ``trace_id`` and ``spans``.
+    """
+    traces = {}
+    for finished in reversed(list(_finished_spans)):
+        if finished.trace_id not in traces:
+            if len(traces) >= limit:
+                continue
+            traces[finished.trace_id] = []
+        traces[finished.trace_id].append(finished.to_dict())
+    return [
+        {"trace_id": trace_id, "spans": sorted(spans, key=lambda item: item["start"])}
+        for trace_id, spans in traces.items()
+    ]
+
+
+class ApiCall:
+    """The API call in progress: byte counts, filled in by the transport or the
+    caller, and the HTTP status if the caller sees one without an exception."""
+
+    __slots__ = ("sent", "received", "status")
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.status = None
+
+
+_current_call = contextvars.ContextVar("email_agent_api_call", default=None)
+
+
+@contextlib.contextmanager
+def api_call(method, units=0):
+    """Records one Gmail API call: latency, status, quota units, bytes and a span.
+
+    The status is the one set on the yielded ``ApiCall``, else 200 unless the
+    block raises; an exception with an HTTP status (``resp.status`` or
+    ``status``) is counted under that status, anything else under "error".
+
+    Args:
+        method (str): The Gmail method, e.g. "messages.list" or "batch".
+        units (int): The quota units charged for the call.
+
+    Yields:
+        ApiCall: Byte counters the caller or the transport adds to.
+    """
+    call = ApiCall()
+    token = _current_call.set(call)
+    status = "200"
+    try:
+        with span(f"gmail.{method}", units=units) as current:
+            try:
+                yield call
+            except BaseException as error:
+                resp = getattr(error, "resp", None)
+                code = getattr(resp, "status", None) or getattr(error, "status", None)
+                status = str(code) if code else "error"
+                raise
+            finally:
+                if call.status is not None:
+                    status = str(call.status)
+                current.attributes.update(status=status, sent=call.sent, received=call.received)
+    finally:
+        _current_call.reset(token)
+        api_calls.inc(method=method, status=status)
+        api_latency.observe(current.duration, method=method)
+        quota_units.inc(units, method=method)
+        bytes_sent.inc(call.sent, method=method)
+        bytes_received.inc(call.received, method=method)
+
+
+def _body_size(body, headers):
+    # Upload chunks are streamed from a file and only carry their size in a header.
+    if body is None or isinstance(body, (bytes, str)):
+        return len(body or b"")
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    return int(headers.get("content-length", 0))
+
+
+class MeteredHttp:
+    """Wraps an httplib2-style client so its traffic counts towards the current API call.
+
+    Args:
+        http: The object doing the actual requests, e.g. an ``AuthorizedHttp``.
+    """
+
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        call = _current_call.get()
+        if call is not None:
+            call.sent += _body_size(body, headers)
+            call.received += len(content or b"")
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def _record_tool_result(name, result, started):
+    outcome = "ok"
+    if isinstance(result, str) and result.startswith(_ERROR_PREFIX):
+        outcome = "error"
+        match = _STATUS_PATTERN.search(result)
+        tool_errors.inc(tool=name, status=match.group(1) if match else "unknown")
+    tool_calls.inc(tool=name, outcome=outcome)
+    tool_latency.observe(time.perf_counter() - started, tool=name)
+
+
+def instrument_tool(function):
+    """Wraps a tool so every call is timed, counted and traced.
+
+    Tools turn failures into "An error occurred: ..." strings; those are
+    counted as errors, by HTTP status when the message carries one.
+
+    Args:
+        function (callable): A sync or async tool function.
+
+    Returns:
+        callable: The wrapped tool, with the same name, signature and docstring.
+    """
+    name = function.__name__
+
+    if asyncio.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with span(f"tool.{name}"):
+                try:
+                    result = await function(*args, **kwargs)
+                except BaseException:
+                    tool_calls.inc(tool=name, outcome="exception")
+                    raise
+            _record_tool_result(name, result, started)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        with span(f"tool.{name}"):
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                tool_calls.inc(tool=name, outcome="exception")
+                raise
+        _record_tool_result(name, result, started)
+        return result
+
+    return wrapper
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serves ``/metrics`` (Prometheus text) and ``/traces`` (JSON) on a background thread.
+
+    Args:
+        port (int): The port to listen on; 0 picks a free one.
+        host (str): The address to bind, local only by default.
+
+    Returns:
+        http.server.ThreadingHTTPServer: The running server; call ``shutdown()`` to stop it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = registry.render().encode()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path.split("?")[0] == "/traces":
+                body = json.dumps(recent_traces()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
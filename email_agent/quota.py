@@ -0,0 +1,265 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+
+from .metrics import api_call
+
+# Gmail quota units charged per API method.
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    "drafts.create": 10,
+    "getProfile": 1,
+    "history.list": 2,
+    "messages.attachments.get": 5,
+    "messages.batchDelete": 50,
+    "messages.batchModify": 50,
+    "messages.delete": 10,
+    "messages.get": 5,
+    "messages.list": 5,
+    "messages.modify": 5,
+    "messages.send": 100,
+    "messages.trash": 5,
+    "threads.get": 10,
+    "threads.list": 10,
+}
+# Charged for methods missing from the table above.
+DEFAULT_QUOTA_UNITS = 5
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def api_method(request):
+    """Returns the Gmail method name of a googleapiclient request, e.g. "messages.list".
+
+    Batches have no single method and are reported as "batch".
+    """
+    method_id = getattr(request, "methodId", None)
+    return method_id.replace("gmail.users.", "", 1) if method_id else "batch"
+
+
+def quota_cost(request):
+    """Returns the quota units a googleapiclient request will consume.
+
+    Args:
+        request (googleapiclient.http.HttpRequest): The request to be executed.
+
+    Returns:
+        int: The number of Gmail quota units.
+    """
+    return QUOTA_UNITS.get(api_method(request), DEFAULT_QUOTA_UNITS)
+
+
+def parse_retry_after(value):
+    """Converts a Retry-After header into seconds, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class QuotaScheduler:
+    """Meters Gmail calls by quota units and retries transient failures.
+
+    A token bucket holds quota units and refills at the per-user rate Gmail
+    allows. Every call reserves its cost before it is sent, waiting if the
+    bucket is empty. 429 and 5xx responses (and 403 rate-limit errors) are
+    retried with exponential backoff and full jitter, honouring Retry-After.
+    Limits come from the environment:
+
+    - ``GMAIL_QUOTA_UNITS_PER_SECOND``: refill rate (default 250)
+    - ``GMAIL_QUOTA_BURST``: bucket size (default one second of units)
+    - ``GMAIL_MAX_RETRIES``: retries per call (default 5)
+    - ``GMAIL_RETRY_DELAY``: base backoff in seconds (default 1)
+    - ``GMAIL_MAX_RETRY_DELAY``: backoff ceiling in seconds (default 32)
+    """
+
+    def __init__(
+        self,
+        units_per_second=None,
+        burst=None,
+        max_retries=None,
+        retry_delay=None,
+        max_retry_delay=None,
+    ):
+        self.units_per_second = units_per_second or float(
+            os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250")
+        )
+        self.burst = burst or float(os.getenv("GMAIL_QUOTA_BURST", self.units_per_second))
+        self.max_retries = (
+            int(os.getenv("GMAIL_MAX_RETRIES", "5")) if max_retries is None else max_retries
+        )
+        self.retry_delay = retry_delay or float(os.getenv("GMAIL_RETRY_DELAY", "1"))
+        self.max_retry_delay = max_retry_delay or float(
+            os.getenv("GMAIL_MAX_RETRY_DELAY", "32")
+        )
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.units_used = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def reserve(self, units):
+        """Takes ``units`` from the bucket and returns how long to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.units_per_second
+            )
+            self._updated = now
+            # The bucket may go negative; later callers then wait for the debt
+            # to be paid off, which keeps callers in arrival order.
+            self._tokens -= units
+            self.units_used += units
+            wait = -self._tokens / self.units_per_second if self._tokens < 0 else 0.0
+            self.throttled_seconds += wait
+        return wait
+
+    def acquire(self, units):
+        """Blocks until ``units`` quota units are available."""
+        wait = self.reserve(units)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, units):
+        """Waits without blocking the event loop until ``units`` quota units are available."""
+        wait = self.reserve(units)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def is_retryable(self, status, content=b"", idempotent=True):
+        """Tells whether a failed call with this HTTP status should be retried.
+
+        Args:
+            status (int): The HTTP status code.
+            content (bytes): The error response body.
+            idempotent (bool): Whether repeating the call is harmless. A send
+                that failed with a 5xx may still have gone out, so only rate
+                limit errors are retried for non-idempotent calls.
+        """
+        if status == 429:
+            return True
+        if status in RETRYABLE_STATUSES:
+            return idempotent
+        # Gmail reports per-user rate limiting as 403 rateLimitExceeded.
+        return status == 403 and b"ratelimitexceeded" in (content or b"").lower()
+
+    def backoff(self, attempt, retry_after=None):
+        """Returns the number of seconds to wait before retry number ``attempt``.
+
+        Args:
+            attempt (int): The retry number, starting at 0.
+            retry_after (str): The Retry-After header of the failed response, if any.
+        """
+        with self._lock:
+            self.retries += 1
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            return delay
+        ceiling = min(self.max_retry_delay, self.retry_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def should_retry_error(self, error, attempt, idempotent=True):
+        """Tells whether an HttpError should be retried after ``attempt`` retries."""
+        return attempt < self.max_retries and self.is_retryable(
+            error.resp.status, error.content, idempotent
+        )
+
+    def execute(self, request, units=None, idempotent=True):
+        """Executes a googleapiclient request within the quota, retrying transient errors.
+
+        Args:
+            request (googleapiclient.http.HttpRequest): The request (or batch) to execute.
+            units (int): The quota cost, if it differs from ``quota_cost(request)``.
+            idempotent (bool): Whether the request may be repeated after a 5xx.
+
+        Returns:
+            dict: The API response.
+
+        Raises:
+            googleapiclient.errors.HttpError: If the call fails for good.
+        """
+        from googleapiclient.errors import HttpError
+
+        units = quota_cost(request) if units is None else units
+        method = api_method(request)
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                with api_call(method, units):
+                    return request.execute()
+            except HttpError as error:
+                if not self.should_retry_error(error, attempt, idempotent):
+                    raise
+                time.sleep(self.backoff(attempt, error.resp.get("retry-after")))
+                attempt += 1
+
+    def execute_upload(self, request, units=None):
+        """Executes a media upload request within the quota, resuming after failures.
+
+        A resumable upload is sent chunk by chunk. When a chunk fails with a
+        transient status or the connection drops, the upload is resumed from
+        the last byte Gmail confirmed rather than started again; Gmail only
+        acts on the message once the last chunk arrives, so this is safe even
+        for sends. Other uploads are sent in one request like ``execute``.
+
+        Args:
+            request (googleapiclient.http.HttpRequest): The request, built with ``media_body``.
+            units (int): The quota cost, if it differs from ``quota_cost(request)``.
+
+        Returns:
+            dict: The API response.
+
+        Raises:
+            googleapiclient.errors.HttpError: If the upload fails for good.
+            OSError: If the connection keeps failing.
+        """
+        if not request.resumable:
+            return self.execute(request, units, idempotent=False)
+
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        units = quota_cost(request) if units is None else units
+        attempt = 0
+        self.acquire(units)
+        with api_call(api_method(request), units):
+            while True:
+                try:
+                    _, response = request.next_chunk()
+                except HttpError as error:
+                    if not self.should_retry_error(error, attempt):
+                        raise
+                    retry_after = error.resp.get("retry-after")
+                except (OSError, httplib2.HttpLib2Error):
+                    if attempt >= self.max_retries:
+                        raise
+                    retry_after = None
+                else:
+                    if response is not None:
+                        return response
+                    # Every confirmed chunk starts the retry count afresh.
+                    attempt = 0
+                    continue
+                time.sleep(self.backoff(attempt, retry_after))
+                attempt += 1
+
+    def stats(self):
+        """Returns the quota units used, retries made and seconds spent throttled."""
+        with self._lock:
+            return {
+                "units_used": self.units_used,
+                "retries": self.retries,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """An in-process TTL + LRU cache for read tool results.
+
+    Entries are keyed by the normalized query and result count. Each entry
+    remembers the message IDs it contains so a deletion only drops the entries
+    that showed that message. Empty results are cached too, for a shorter time.
+    Settings come from the environment:
+
+    - ``READ_CACHE_SIZE``: maximum number of entries (default 256)
+    - ``READ_CACHE_TTL``: seconds a result stays fresh (default 60)
+    - ``READ_CACHE_NEGATIVE_TTL``: seconds an empty result stays fresh (default 15)
+    """
+
+    def __init__(self, max_entries=None, ttl=None, negative_ttl=None):
+        self.max_entries = max_entries or int(os.getenv("READ_CACHE_SIZE", "256"))
+        self.ttl = float(os.getenv("READ_CACHE_TTL", "60")) if ttl is None else ttl
+        self.negative_ttl = (
+            float(os.getenv("READ_CACHE_NEGATIVE_TTL", "15"))
+            if negative_ttl is None
+            else negative_ttl
+        )
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query, num_emails, *options):
+        """Builds a cache key; queries differing only in case or spacing share it.
+
+        Args:
+            query (str): The Gmail search query.
+            num_emails (int): The number of results requested.
+            *options: Any other arguments that change the result.
+
+        Returns:
+            tuple: A hashable key.
+        """
+        return (" ".join(query.lower().split()), num_emails) + options
+
+    def get(self, key):
+        """Returns the cached value for ``key``, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, message_ids=()):
+        """Caches a result.
+
+        Args:
+            key (tuple): A key from ``make_key``.
+            value: The result to cache.
+            message_ids (list): The IDs of the messages in the result; an empty
+                list marks a negative (no matches) result.
+        """
+        ttl = self.ttl if message_ids else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value, frozenset(message_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, message_ids=None):
+        """Drops cached results that a mailbox change may have made stale.
+
+        Args:
+            message_ids (list): Drop only the entries showing one of these
+                messages; None drops every entry (e.g. after a send, since the
+                new message could match any query).
+        """
+        with self._lock:
+            if message_ids is None:
+                self._entries.clear()
+                return
+            message_ids = set(message_ids)
+            for key in [
+                key
+                for key, (_, _, cached_ids) in self._entries.items()
+                if not cached_ids.isdisjoint(message_ids)
+            ]:
+                del self._entries[key]
+
+    def stats(self):
+        """Returns hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,140 @@
+import re
+
+# Intents returned by analyze_intent, grouped by service.
+EMAIL_INTENTS = ("read", "send", "delete", "draft", "modify")
+CALENDAR_INTENTS = (
+    "calendar_create",
+    "calendar_read",
+    "calendar_update",
+    "calendar_delete",
+)
+DRIVE_INTENTS = ("drive_list", "drive_create", "drive_delete", "drive_share")
+GENERAL_INTENT = "general"
+
+# Keyword lexicon: every word (or two-word phrase) maps to the features it
+# signals. Nouns pick the service, verbs pick the operation.
+_LEXICON_SOURCE = {
+    "email_noun": "email emails mail mails message messages inbox spam unread",
+    "draft_noun": "draft drafts",
+    "calendar_noun": "calendar calendars meeting meetings event events appointment "
+    "appointments agenda",
+    "drive_noun": "drive file files folder folders document documents directory "
+    "directories pdf pdfs docs",
+    "send_verb": "send compose write reply forward",
+    "read_verb": "show list find check read search browse view display get "
+    "upcoming what how",
+    "create_verb": "create make add new book set_up save",
+    "update_verb": "reschedule change update modify edit move rename",
+    "delete_verb": "delete remove trash cancel clear erase",
+    "modify_verb": "mark archive unarchive star unstar",
+    "share_verb": "share access permission permissions public grant",
+    "general": "help hi hello hey thanks what_can can_you",
+}
+LEXICON = {}
+for _feature, _words in _LEXICON_SOURCE.items():
+    for _word in _words.split():
+        LEXICON.setdefault(_word.replace("_", " "), set()).add(_feature)
+LEXICON = {word: frozenset(features) for word, features in LEXICON.items()}
+
+# Possessives that turn "schedule" into a noun ("check my schedule").
+_DETERMINERS = frozenset(("my", "the", "your", "our", "this", "today's"))
+# Verbs that name an operation outright, as opposed to question words.
+_STRONG_VERBS = frozenset(
+    ("send_verb", "create_verb", "update_verb", "delete_verb", "share_verb")
+)
+
+_ADDRESS_PATTERN = re.compile(r"\S+@\S+")
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def extract_features(user_input):
+    """Turns a request into the set of lexicon features it mentions.
+
+    Args:
+        user_input (str): The user's request.
+
+    Returns:
+        frozenset: Feature names such as "email_noun" or "delete_verb".
+    """
+    words = _WORD_PATTERN.findall(_ADDRESS_PATTERN.sub(" ", user_input.lower()))
+    features = set()
+    previous = ""
+    for index, word in enumerate(words):
+        features.update(LEXICON.get(word, ()))
+        features.update(LEXICON.get(f"{previous} {word}", ()))
+        if word == "schedule":
+            features.add("calendar_noun")
+            if previous not in _DETERMINERS:
+                features.add("create_verb")
+        elif word == "email" and index == 0:
+            # "email the report to ..." uses "email" as a verb.
+            features.add("send_verb")
+        previous = word
+    return frozenset(features)
+
+
+def classify(user_input):
+    """Classifies a request into an intent without calling a model.
+
+    Args:
+        user_input (str): The user's request.
+
+    Returns:
+        tuple: The intent, and whether both the service and the operation were
+        named explicitly (a confident match).
+    """
+    features = extract_features(user_input)
+    has = features.__contains__
+    strong_verb = not _STRONG_VERBS.isdisjoint(features)
+
+    if has("general") and not strong_verb and not has("draft_noun"):
+        return GENERAL_INTENT, True
+
+    if has("send_verb") and not has("draft_noun") and not has("drive_noun"):
+        return "send", True
+
+    if has("drive_noun") and not has("email_noun") or (
+        has("share_verb") and not has("calendar_noun")
+    ):
+        if has("share_verb"):
+            return "drive_share", True
+        if has("delete_verb"):
+            return "drive_delete", True
+        if has("create_verb"):
+            return "drive_create", True
+        return "drive_list", has("read_verb")
+
+    if has("calendar_noun") and not has("email_noun") and not has("draft_noun"):
+        if has("update_verb"):
+            return "calendar_update", True
+        if has("delete_verb"):
+            return "calendar_delete", True
+        if has("create_verb"):
+            return "calendar_create", True
+        return "calendar_read", has("read_verb")
+
+    if has("modify_verb") and not has("draft_noun") and not has("delete_verb"):
+        # "mark all emails as read" changes labels; it does not read anything.
+        return "modify", has("email_noun")
+    if has("draft_noun") and not has("delete_verb"):
+        return "draft", True
+    if has("delete_verb"):
+        # The delete agent cannot delete drafts, so those go to the main agent.
+        return "delete", has("email_noun") and not has("draft_noun")
+    if has("read_verb") or has("email_noun"):
+        return "read", has("read_verb") and has("email_noun")
+    return GENERAL_INTENT, False
+
+
+def analyze_intent(user_input: str):
+    """Analyzes a user request and returns the operation it asks for.
+
+    Args:
+        user_input (str): The user's request (e.g., "show me my recent emails").
+
+    Returns:
+        str: One of "read", "send", "delete", "draft", "modify", "calendar_create",
+        "calendar_read", "calendar_update", "calendar_delete", "drive_list",
+        "drive_create", "drive_delete", "drive_share" or "general".
+    """
+    return classify(user_input)[0]
@@ -0,0 +1,347 @@
+import bisect
+import calendar
+import heapq
+import re
+import threading
+import time
+from datetime import datetime
+
+# Labels Gmail leaves out of search results unless the query asks for them.
+HIDDEN_LABELS = frozenset(("SPAM", "TRASH"))
+
+# Values of is:, in: and category: mapped to the label ID they select.
+IS_LABELS = {
+    "unread": "UNREAD",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+}
+IN_LABELS = {
+    "inbox": "INBOX",
+    "sent": "SENT",
+    "spam": "SPAM",
+    "trash": "TRASH",
+    "draft": "DRAFT",
+    "drafts": "DRAFT",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+    "unread": "UNREAD",
+}
+CATEGORY_LABELS = {
+    "primary": "CATEGORY_PERSONAL",
+    "personal": "CATEGORY_PERSONAL",
+    "social": "CATEGORY_SOCIAL",
+    "promotions": "CATEGORY_PROMOTIONS",
+    "updates": "CATEGORY_UPDATES",
+    "forums": "CATEGORY_FORUMS",
+}
+# Header fields that can be searched with an operator of the same name.
+FIELD_OPERATORS = ("from", "to", "subject")
+# Fields whose Gmail search also covers data the index does not hold.
+APPROXIMATE_FIELDS = frozenset(("text", "to"))
+
+# Gmail reads dates in search queries as midnight Pacific Standard Time.
+QUERY_TIMEZONE_OFFSET = -8 * 3600
+DATE_FORMATS = ("%Y/%m/%d", "%Y-%m-%d", "%m/%d/%Y")
+
+_QUERY_TOKEN = re.compile(r'(-?)(?:([a-z_]+):)?("[^"]*"|[^\s"]+)|(\S)', re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+_ADDRESS = re.compile(r"[\w.+'-]+@[\w-]+(?:\.[\w-]+)+")
+# Characters that make a query need Gmail's own parser (grouping, OR, ...).
+_UNSUPPORTED = re.compile(r"[(){}]|\bOR\b|\bAND\b|\bAROUND\b|\|")
+
+
+def tokenize(text):
+    """Splits header or snippet text into the lower-cased tokens it is indexed under.
+
+    Email addresses are also indexed whole, by local part and by domain, so
+    ``from:john.doe@example.com`` and ``from:example.com`` match like in Gmail.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        set: The tokens.
+    """
+    text = text.lower()
+    tokens = set(_WORD.findall(text))
+    for address in _ADDRESS.findall(text):
+        local, _, domain = address.partition("@")
+        tokens.update((address, local, domain))
+    return tokens
+
+
+def parse_date(value):
+    """Converts an after:/before: value into milliseconds since the epoch, or None."""
+    if value.isdigit():
+        return int(value) * 1000
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return (calendar.timegm(parsed.timetuple()) - QUERY_TIMEZONE_OFFSET) * 1000
+    return None
+
+
+class SearchQuery:
+    """A Gmail search query broken down into conditions the index can check."""
+
+    def __init__(self):
+        self.terms = []
+        self.excluded_terms = []
+        self.labels = set()
+        self.excluded_labels = set()
+        self.after = None
+        self.before = None
+        self.include_hidden = False
+
+
+def parse_query(query, label_ids=None, approximate=False):
+    """Parses the subset of Gmail search syntax the local index can answer.
+
+    Supported: from:, subject:, after:, before:, newer_than:/older_than:
+    (in days), is:, in:, label:, category: and negation with "-". The index
+    only holds headers and snippets, so free text (which Gmail also looks for
+    in bodies) and to: (which Gmail also matches against Cc and Bcc) are only
+    accepted when ``approximate`` is set; free text is then matched against
+    headers and snippets, and to: against the To header.
+
+    Args:
+        query (str): The Gmail search query.
+        label_ids (dict): User label names, lower-cased with spaces and slashes
+            replaced by "-", mapped to their label IDs.
+        approximate (bool): Whether to accept free text and to: as described above.
+
+    Returns:
+        SearchQuery: The parsed query, or None if it uses anything else and
+        must be sent to Gmail.
+    """
+    if _UNSUPPORTED.search(query):
+        return None
+    label_ids = label_ids or {}
+    search = SearchQuery()
+    for negated, operator, value, stray in _QUERY_TOKEN.findall(query):
+        if stray:
+            return None
+        negated = bool(negated)
+        operator = operator.lower()
+        value = value.lower()
+        if value.startswith('"'):
+            value = value.strip('"')
+            if len(_WORD.findall(value)) > 1:
+                # Phrase order cannot be checked with an inverted index.
+                return None
+
+        if not operator or operator in FIELD_OPERATORS:
+            field = operator or "text"
+            if field in APPROXIMATE_FIELDS and not approximate:
+                return None
+            address = "@" in value or (field in ("from", "to") and "." in value.strip("."))
+            if address and field != "subject":
+                # Addresses, local parts and domains are indexed whole.
+                keys = [f"{field}:{value.strip('.')}"]
+            else:
+                keys = [f"{field}:{word}" for word in _WORD.findall(value)]
+            if not keys:
+                continue
+            (search.excluded_terms if negated else search.terms).append(keys)
+            continue
+
+        if operator in ("after", "before", "newer_than", "older_than"):
+            if negated:
+                return None
+            if operator in ("after", "before"):
+                bound = parse_date(value)
+            elif value[:-1].isdigit() and value.endswith("d"):
+                bound = int((time.time() - int(value[:-1]) * 86400) * 1000)
+            else:
+                bound = None
+            if bound is None:
+                return None
+            if operator in ("after", "newer_than"):
+                search.after = bound if search.after is None else max(search.after, bound)
+            else:
+                search.before = bound if search.before is None else min(search.before, bound)
+            continue
+
+        if operator == "in" and value == "anywhere":
+            search.include_hidden = not negated
+            continue
+        if operator == "is" and value == "read":
+            label, negated = "UNREAD", not negated
+        elif operator == "is":
+            label = IS_LABELS.get(value)
+        elif operator == "in":
+            label = IN_LABELS.get(value)
+        elif operator == "category":
+            label = CATEGORY_LABELS.get(value)
+        elif operator == "label":
+            name = value.replace(" ", "-").replace("/", "-")
+            label = IN_LABELS.get(name) or label_ids.get(name)
+        else:
+            label = None
+        if label is None:
+            return None
+        if negated:
+            search.excluded_labels.add(label)
+        else:
+            search.labels.add(label)
+            if label in HIDDEN_LABELS:
+                search.include_hidden = True
+    return search
+
+
+class SearchIndex:
+    """An in-memory inverted index over the headers and snippets of mirrored messages.
+
+    Each token and each label maps to the set of message IDs carrying it, so a
+    query is answered by intersecting a few sets. Messages are also kept in
+    newest-first order: when the surviving set is large, walking that order
+    and stopping after ``limit`` matches is cheaper than sorting the set. The
+    index is updated message by message as the mirror changes.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._label_postings = {}
+        self._keys = {}
+        self._dates = {}
+        self._labels = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._dates)
+
+    def add(self, message):
+        """Indexes a message, replacing any earlier version of it.
+
+        Args:
+            message (Message): The message to index.
+        """
+        fields = {
+            "from": tokenize(message.sender),
+            "to": tokenize(message.recipient),
+            "subject": tokenize(message.subject),
+        }
+        text = set(tokenize(message.snippet))
+        for tokens in fields.values():
+            text.update(tokens)
+        fields["text"] = text
+        keys = [f"{field}:{token}" for field, tokens in fields.items() for token in tokens]
+        with self._lock:
+            self._remove(message.id)
+            for key in keys:
+                self._postings.setdefault(key, set()).add(message.id)
+            self._keys[message.id] = keys
+            self._dates[message.id] = message.internal_date
+            bisect.insort(self._order, (-message.internal_date, message.id))
+            self._set_labels(message.id, message.label_ids)
+
+    def _set_labels(self, message_id, label_ids):
+        for label in self._labels.get(message_id, ()):
+            self._discard(self._label_postings, label, message_id)
+        self._labels[message_id] = frozenset(label_ids)
+        for label in label_ids:
+            self._label_postings.setdefault(label, set()).add(message_id)
+
+    @staticmethod
+    def _discard(postings, key, message_id):
+        posting = postings[key]
+        posting.discard(message_id)
+        if not posting:
+            del postings[key]
+
+    def _remove(self, message_id):
+        date = self._dates.pop(message_id, None)
+        if date is None:
+            return
+        for key in self._keys.pop(message_id):
+            self._discard(self._postings, key, message_id)
+        for label in self._labels.pop(message_id):
+            self._discard(self._label_postings, label, message_id)
+        del self._order[bisect.bisect_left(self._order, (-date, message_id))]
+
+    def remove(self, message_ids):
+        """Drops messages from the index; unknown IDs are skipped."""
+        with self._lock:
+            for message_id in message_ids:
+                self._remove(message_id)
+
+    def set_labels(self, message_id, label_ids):
+        """Records the current labels of an indexed message."""
+        with self._lock:
+            if message_id in self._labels:
+                self._set_labels(message_id, label_ids)
+
+    def clear(self):
+        """Drops every indexed message."""
+        with self._lock:
+            self._postings.clear()
+            self._label_postings.clear()
+            self._keys.clear()
+            self._dates.clear()
+            self._labels.clear()
+            self._order.clear()
+
+    def search(self, query, limit, since=0):
+        """Returns the newest indexed messages matching a parsed query.
+
+        Args:
+            query (SearchQuery): A query from ``parse_query``.
+            limit (int): The maximum number of IDs to return.
+            since (int): Only consider messages with an internal date (in
+                milliseconds) at or after this value.
+
+        Returns:
+            list: Matching message IDs, newest first.
+        """
+        with self._lock:
+            postings = [self._match(keys) for keys in query.terms]
+            postings.extend(self._label_postings.get(label, set()) for label in query.labels)
+            candidates = None
+            # Intersect the smallest postings first so the working set stays small.
+            for posting in sorted(postings, key=len):
+                candidates = posting if candidates is None else candidates & posting
+                if not candidates:
+                    return []
+
+            excluded_ids = set()
+            for keys in query.excluded_terms:
+                excluded_ids |= self._match(keys)
+            excluded_labels = set(query.excluded_labels)
+            if not query.include_hidden:
+                excluded_labels |= HIDDEN_LABELS
+            after = max(since, query.after or 0)
+            before = query.before
+
+            def matches(message_id):
+                date = self._dates[message_id]
+                return (
+                    message_id not in excluded_ids
+                    and date >= after
+                    and (before is None or date < before)
+                    and excluded_labels.isdisjoint(self._labels[message_id])
+                )
+
+            if candidates is not None and len(candidates) ** 2 <= limit * len(self._order):
+                return heapq.nlargest(
+                    limit, filter(matches, candidates), key=self._dates.__getitem__
+                )
+
+            found = []
+            start = 0 if before is None else bisect.bisect_left(self._order, (-before,))
+            for position in range(start, len(self._order)):
+                negated_date, message_id = self._order[position]
+                if -negated_date < after:
+                    break
+                if (candidates is None or message_id in candidates) and matches(message_id):
+                    found.append(message_id)
+                    if len(found) >= limit:
+                        break
+            return found
+
+    def _match(self, keys):
+        # Every word of a multi-word value must match.
+        postings = [self._postings.get(key, set()) for key in keys]
+        return set.intersection(*postings) if len(postings) > 1 else postings[0]
@@ -0,0 +1,304 @@
+import functools
+import html
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+
+from .search_index import HIDDEN_LABELS
+
+# Terms are hashed into this many buckets instead of keeping a vocabulary.
+# Only buckets in use take memory, so there is room enough to make collisions rare.
+HASH_BUCKETS = 1 << 24
+# Characters of a known body that are indexed; the start says what it is about.
+BODY_INDEX_CHARS = 2000
+# Subjects sum a message up, so their terms count this many times.
+SUBJECT_WEIGHT = 2
+# New messages are merged into the sorted matrix once they hold more terms
+# than this, or more than 1/MERGE_RATIO of the terms already merged.
+MERGE_MIN_TERMS = 1 << 16
+MERGE_RATIO = 16
+
+STOP_WORDS = frozenset(
+    """
+    about all am an and any are as at be been but by can could did do does for
+    from had has have he her him his how if in into is it its me my no not of
+    on or our she so than that the their them then there these they this those
+    to too up us was we were what when which who will with would you your
+    re fw fwd
+    """.split()
+)
+
+_WORD = re.compile(r"[^\W_]{2,}")
+_ADDRESS = re.compile(r"<[^>]*>")
+
+
+def stem(word):
+    """Strips common English endings, so "budgets" and "budget" are one term."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+@functools.lru_cache(maxsize=1 << 17)
+def word_bucket(word):
+    """Returns the hash bucket a lower-cased word is indexed under, or None for a stop word.
+
+    Buckets come from CRC-32, so they are the same in every process.
+    """
+    if word in STOP_WORDS:
+        return None
+    return zlib.crc32(stem(word).encode()) & (HASH_BUCKETS - 1)
+
+
+def text_buckets(text):
+    """Returns the hash buckets of the words in a text, with repeats.
+
+    Args:
+        text (str): Subject, snippet, body or query text.
+
+    Returns:
+        list: One bucket per word that is not a stop word.
+    """
+    found = [word_bucket(word) for word in _WORD.findall(text.lower())]
+    return [key for key in found if key is not None]
+
+
+def message_buckets(message):
+    """Returns the hash buckets of a message's subject, sender name, snippet and any known body."""
+    found = text_buckets(message.subject) * SUBJECT_WEIGHT
+    found += text_buckets(_ADDRESS.sub(" ", message.sender))
+    found += text_buckets(html.unescape(message.snippet))
+    if message.has_body:
+        found += text_buckets(message.body[:BODY_INDEX_CHARS])
+    return found
+
+
+def weigh(found):
+    """Turns hash buckets into an L2-normalized vector of log-scaled term frequencies.
+
+    Args:
+        found (list): Buckets from ``text_buckets`` or ``message_buckets``.
+
+    Returns:
+        dict: Hash buckets mapped to their weight; empty if there are none.
+    """
+    if not found:
+        return {}
+    counts = Counter(found)
+    weights = {key: 1.0 + math.log(count) for key, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {key: weight / norm for key, weight in weights.items()}
+
+
+class SemanticIndex:
+    """A hashed TF-IDF index over mirrored messages, for searches by topic. Needs numpy.
+
+    Messages are the rows of a sparse matrix of log-scaled term frequencies,
+    stored as three numpy arrays (hash bucket, row and weight of every term)
+    sorted by bucket, so the column of each query term is found by binary
+    search. A search multiplies the matrix by the query vector in one
+    vectorized pass over those columns and takes the top scores with a
+    partial sort. IDF weights are applied to the query only, from the column
+    lengths, so adding mail never re-weights stored rows.
+
+    New messages are appended to a small unsorted tail, which is scanned
+    whole and merged into the sorted arrays as it grows. Gmail messages never
+    change, so adding a message that is already indexed only replaces it if
+    its body has become known. Removed rows are dropped at the next merge.
+    """
+
+    def __init__(self):
+        import numpy
+
+        self._np = numpy
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def clear(self):
+        """Drops every indexed message."""
+        np = self._np
+        with self._lock:
+            self._buckets = np.empty(0, dtype=np.int32)
+            self._rows = np.empty(0, dtype=np.int32)
+            self._weights = np.empty(0, dtype=np.float32)
+            # (rows, buckets, weights) arrays added since the last merge.
+            self._tail = []
+            self._tail_size = 0
+            self._ids = []
+            self._row_of = {}
+            self._alive = np.zeros(0, dtype=bool)
+            self._visible = np.zeros(0, dtype=bool)
+            self._with_body = set()
+            self._removed = 0
+
+    def _reserve_rows(self, count):
+        np = self._np
+        needed = len(self._ids) + count
+        if needed > len(self._alive):
+            capacity = max(needed, 2 * len(self._alive), 1024)
+            for name in ("_alive", "_visible"):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=bool)
+                grown[: len(old)] = old
+                setattr(self, name, grown)
+
+    def add(self, messages):
+        """Indexes messages, as they are stored in the mirror.
+
+        Args:
+            messages (list): The Message records to index.
+        """
+        np = self._np
+        vectors = [(message, weigh(message_buckets(message))) for message in messages]
+        with self._lock:
+            new = {}
+            for message, vector in vectors:
+                if message.id in self._row_of:
+                    if not message.has_body or message.id in self._with_body:
+                        self._set_labels(message.id, message.label_ids)
+                        continue
+                    self._remove(message.id)
+                if vector:
+                    new[message.id] = (message, vector)
+            if not new:
+                return
+            first = len(self._ids)
+            self._reserve_rows(len(new))
+            buckets, weights, lengths = [], [], []
+            for row, (message, vector) in enumerate(new.values(), first):
+                buckets.extend(vector)
+                weights.extend(vector.values())
+                lengths.append(len(vector))
+                self._alive[row] = True
+                self._visible[row] = HIDDEN_LABELS.isdisjoint(message.label_ids)
+                self._ids.append(message.id)
+                self._row_of[message.id] = row
+                if message.has_body:
+                    self._with_body.add(message.id)
+            rows = np.arange(first, len(self._ids), dtype=np.int32)
+            self._tail.append(
+                (
+                    np.repeat(rows, lengths),
+                    np.array(buckets, dtype=np.int32),
+                    np.array(weights, dtype=np.float32),
+                )
+            )
+            self._tail_size += len(buckets)
+            if self._tail_size > max(MERGE_MIN_TERMS, len(self._buckets) // MERGE_RATIO):
+                self._merge()
+
+    def _set_labels(self, message_id, label_ids):
+        self._visible[self._row_of[message_id]] = HIDDEN_LABELS.isdisjoint(label_ids)
+
+    def set_labels(self, message_id, label_ids):
+        """Records the current labels of an indexed message; Spam and Trash are not searched."""
+        with self._lock:
+            if message_id in self._row_of:
+                self._set_labels(message_id, label_ids)
+
+    def _remove(self, message_id):
+        row = self._row_of.pop(message_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._visible[row] = False
+        self._ids[row] = None
+        self._with_body.discard(message_id)
+        self._removed += 1
+
+    def remove(self, message_ids):
+        """Drops messages from the index; unknown IDs are skipped."""
+        with self._lock:
+            for message_id in message_ids:
+                self._remove(message_id)
+            if self._removed * 2 > len(self._ids):
+                self._merge()
+
+    def _merge(self):
+        # Sorts the tail into the matrix, dropping and renumbering removed rows.
+        np = self._np
+        rows = np.concatenate([self._rows] + [chunk[0] for chunk in self._tail])
+        buckets = np.concatenate([self._buckets] + [chunk[1] for chunk in self._tail])
+        weights = np.concatenate([self._weights] + [chunk[2] for chunk in self._tail])
+        if self._removed:
+            kept = self._alive[rows]
+            rows, buckets, weights = rows[kept], buckets[kept], weights[kept]
+            kept_rows = self._alive[: len(self._ids)]
+            rows = (np.cumsum(kept_rows, dtype=np.int32) - 1)[rows]
+            self._visible = self._visible[: len(self._ids)][kept_rows]
+            self._ids = [message_id for message_id in self._ids if message_id is not None]
+            self._alive = np.ones(len(self._ids), dtype=bool)
+            self._row_of = {message_id: row for row, message_id in enumerate(self._ids)}
+            self._removed = 0
+        order = np.argsort(buckets, kind="stable")
+        self._buckets, self._rows, self._weights = buckets[order], rows[order], weights[order]
+        self._tail = []
+        self._tail_size = 0
+
+    def search(self, text, limit):
+        """Returns the messages closest in topic to a description.
+
+        Args:
+            text (str): What the messages are about, in plain words.
+            limit (int): The maximum number of messages to return.
+
+        Returns:
+            list: (message ID, score) pairs, best match first. Scores are
+            cosine similarities between 0 and 1; messages sharing no term with
+            the description are left out.
+        """
+        np = self._np
+        counts = Counter(text_buckets(text))
+        if not counts:
+            return []
+        query = np.array(sorted(counts), dtype=np.int32)
+        frequencies = np.array([counts[key] for key in sorted(counts)], dtype=np.float32)
+        with self._lock:
+            documents = len(self._row_of)
+            if not documents:
+                return []
+            starts = np.searchsorted(self._buckets, query, "left")
+            ends = np.searchsorted(self._buckets, query, "right")
+            positions = np.concatenate(
+                [np.arange(start, end) for start, end in zip(starts, ends)]
+            )
+            rows = [self._rows[positions]]
+            weights = [self._weights[positions]]
+            columns = [np.repeat(np.arange(len(query)), ends - starts)]
+            if len(self._tail) > 1:
+                self._tail = [tuple(np.concatenate(parts) for parts in zip(*self._tail))]
+            for tail_rows, tail_buckets, tail_weights in self._tail:
+                column = np.minimum(np.searchsorted(query, tail_buckets), len(query) - 1)
+                hits = np.flatnonzero(query[column] == tail_buckets)
+                rows.append(tail_rows[hits])
+                weights.append(tail_weights[hits])
+                columns.append(column[hits])
+            rows = np.concatenate(rows)
+            weights = np.concatenate(weights)
+            columns = np.concatenate(columns)
+            live = self._alive[rows]
+            rows, weights, columns = rows[live], weights[live], columns[live]
+
+            frequency = np.bincount(columns, minlength=len(query))
+            idf = np.log((1 + documents) / (1 + frequency)) + 1
+            vector = (1 + np.log(frequencies)) * idf
+            vector /= np.linalg.norm(vector)
+            row_count = len(self._ids)
+            scores = np.bincount(rows, weights=weights * vector[columns], minlength=row_count)
+            scores[~self._visible[:row_count]] = 0
+            found = min(limit, int(np.count_nonzero(scores > 0)))
+            if not found:
+                return []
+            best = np.argpartition(-scores, found - 1)[:found]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [(self._ids[row], round(float(scores[row]), 4)) for row in best]
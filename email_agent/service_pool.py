@@ -0,0 +1,92 @@
+import functools
+import os
+import threading
+import weakref
+
+from .metrics import MeteredHttp
+
+# Seconds before an idle Gmail connection attempt is abandoned.
+HTTP_TIMEOUT = float(os.getenv("GMAIL_HTTP_TIMEOUT", "60"))
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_document(api, version):
+    """Returns the discovery document bundled with google-api-python-client.
+
+    It is read once per process and shared by the services of every account,
+    instead of being fetched over the network.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+
+    return get_static_doc(api, version)
+
+
+class GmailServiceProvider:
+    """Hands each worker thread its own Gmail service.
+
+    ``httplib2.Http`` is not thread-safe, so one shared service cannot serve
+    concurrent tool calls. Every thread instead gets a service with its own
+    keep-alive connection, built once from a shared copy of the discovery
+    document and reused for the lifetime of the thread.
+    """
+
+    def __init__(self, get_credentials, timeout=None):
+        self.get_credentials = get_credentials
+        self.timeout = timeout or HTTP_TIMEOUT
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._created = 0
+        self._reused = 0
+
+    def get(self):
+        """Returns the Gmail service owned by the calling thread.
+
+        Returns:
+            googleapiclient.discovery.Resource: A service that is only ever used
+            from this thread.
+        """
+        service = getattr(self._local, "service", None)
+        if service is not None:
+            with self._lock:
+                self._reused += 1
+            return service
+
+        service = self._build()
+        self._local.service = service
+        thread = threading.current_thread()
+        with self._lock:
+            self._created += 1
+            self._owners[thread.ident] = weakref.ref(thread)
+        return service
+
+    def _build(self):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build, build_from_document
+
+        http = MeteredHttp(
+            AuthorizedHttp(self.get_credentials(), http=httplib2.Http(timeout=self.timeout))
+        )
+        document = discovery_document("gmail", "v1")
+        if document is None:
+            return build("gmail", "v1", http=http, cache_discovery=False)
+        return build_from_document(document, http=http)
+
+    def stats(self):
+        """Reports how the per-thread clients are being used.
+
+        Returns:
+            dict: The number of clients created, clients whose thread is still
+            alive, and calls that reused an existing client.
+        """
+        with self._lock:
+            for ident, owner in list(self._owners.items()):
+                thread = owner()
+                if thread is None or not thread.is_alive():
+                    del self._owners[ident]
+            return {
+                "clients_created": self._created,
+                "live_clients": len(self._owners),
+                "reused": self._reused,
+            }
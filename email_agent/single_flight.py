@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+from .metrics import registry
+
+coalesced_calls = registry.counter(
+    "gmail_coalesced_calls_total",
+    "Gmail reads answered by an identical call already in flight, by method.",
+    ("method",),
+)
+
+
+class Flight:
+    """One call in flight, whose outcome is shared by every caller waiting on it."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def finish(self, result=None, error=None):
+        """Records the outcome of the call and wakes the callers waiting on it."""
+        self._result = result
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        """Blocks until the call returns, then returns its result or raises its error."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class SingleFlight:
+    """Lets concurrent identical Gmail reads share one call.
+
+    The first caller for a key makes the call. Callers asking for the same key
+    before it returns wait for it and get the same result, or the same error.
+    Nothing is cached: once the call has returned, the next caller makes a new
+    one. Results are shared between callers, so they must not be modified.
+
+    Keys must identify the mailbox as well as the request, so each account has
+    its own ``SingleFlight``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._tasks = {}
+        self.coalesced = 0
+
+    def _count(self, method):
+        with self._lock:
+            self.coalesced += 1
+        coalesced_calls.inc(method=method)
+
+    def join(self, key, method):
+        """Joins the call in flight for ``key``, or starts one.
+
+        A caller that starts a call must make it and then pass its outcome to
+        ``land``, even if it fails, or the callers that joined it wait forever.
+
+        Args:
+            key (tuple): What identifies the request, e.g. its method and URI.
+            method (str): The Gmail method, for the coalesced-calls metric.
+
+        Returns:
+            tuple: The Flight, and whether this caller started it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                return flight, True
+        self._count(method)
+        return flight, False
+
+    def land(self, key, flight, result=None, error=None):
+        """Ends a call started with ``join`` and hands its outcome to the callers that joined."""
+        if error is not None and not isinstance(error, Exception):
+            # An interruption such as KeyboardInterrupt belongs to the thread it hit.
+            error = RuntimeError("The shared Gmail call was interrupted.")
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def do(self, key, method, function):
+        """Calls ``function``, or waits for the identical call already in flight.
+
+        Args:
+            key (tuple): What identifies the request, e.g. its method and URI.
+            method (str): The Gmail method, for the coalesced-calls metric.
+            function (callable): Makes the call and returns its result.
+
+        Returns:
+            The result of the call, shared with every caller that joined it.
+        """
+        flight, leader = self.join(key, method)
+        if not leader:
+            return flight.wait()
+        try:
+            result = function()
+        except BaseException as error:
+            self.land(key, flight, error=error)
+            raise
+        self.land(key, flight, result)
+        return result
+
+    async def do_async(self, key, method, function):
+        """Awaits ``function()``, or the identical call already in flight on this loop.
+
+        The call runs as a task of its own, so a caller that is cancelled stops
+        waiting without cancelling the call for the others.
+
+        Args:
+            key (tuple): What identifies the request, e.g. its method and URI.
+            method (str): The Gmail method, for the coalesced-calls metric.
+            function (callable): Returns the coroutine that makes the call.
+
+        Returns:
+            The result of the call, shared with every caller that joined it.
+        """
+        # Only the event loop's thread touches the tasks, so no lock is needed.
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(function())
+
+            def forget(done):
+                if self._tasks.get(key) is done:
+                    del self._tasks[key]
+                if not done.cancelled():
+                    # Retrieve the error, so a call every caller gave up on is not reported as unhandled.
+                    done.exception()
+
+            task.add_done_callback(forget)
+        else:
+            self._count(method)
+        return await asyncio.shield(task)
@@ -0,0 +1,76 @@
+import re
+
+# "On Mon, 4 Mar 2024 at 10:02, Alice <alice@example.com> wrote:", which mail
+# clients often wrap over two or three lines.
+ATTRIBUTION_PATTERN = re.compile(r"On\s.{0,300}?\swrote:\s*$", re.DOTALL)
+# Outlook and older clients start the quoted message with a separator line.
+ORIGINAL_MESSAGE_PATTERN = re.compile(r"-{2,}\s*Original Message\s*-{2,}$", re.IGNORECASE)
+# Either of them inside a one-line snippet, with everything quoted after it.
+SNIPPET_QUOTE_PATTERN = re.compile(
+    r"\s*(\bOn\s.{0,300}?\swrote:|-{2,}\s*Original Message\s*-{2,}).*$",
+    re.DOTALL | re.IGNORECASE,
+)
+# Outlook quotes the original headers, "From:" followed by "Sent:" or "Date:".
+OUTLOOK_HEADER_PATTERN = re.compile(r"(Sent|Date):\s", re.IGNORECASE)
+
+
+def _starts_quoted_history(lines, index):
+    line = lines[index].strip()
+    if line.startswith("On "):
+        return any(
+            ATTRIBUTION_PATTERN.match(" ".join(text.strip() for text in lines[index:end]))
+            for end in range(index + 1, min(index + 4, len(lines) + 1))
+        )
+    if ORIGINAL_MESSAGE_PATTERN.match(line):
+        return True
+    if line.startswith("From:"):
+        following = next((text.strip() for text in lines[index + 1:] if text.strip()), "")
+        return bool(OUTLOOK_HEADER_PATTERN.match(following))
+    return False
+
+
+def collapse_quoted(text):
+    """Removes the quoted history from the body of a reply.
+
+    Everything from the attribution line ("On ... wrote:") or an Outlook-style
+    original-message header onwards is dropped, as are lines quoted with ">"
+    above it. What is left is what this message added to the conversation.
+
+    Args:
+        text (str): The plain-text body of a message.
+
+    Returns:
+        tuple: The new text, and how many quoted lines were removed.
+    """
+    lines = text.splitlines()
+    kept = []
+    quoted = 0
+    for index, line in enumerate(lines):
+        if _starts_quoted_history(lines, index):
+            quoted += len(lines) - index
+            break
+        if line.lstrip().startswith(">"):
+            quoted += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip(), quoted
+
+
+def collapse_quoted_snippet(snippet):
+    """Cuts a Gmail snippet at the start of the quoted history, if it reaches it."""
+    return SNIPPET_QUOTE_PATTERN.sub("", snippet)
+
+
+def group_by_thread(messages):
+    """Groups messages by conversation, keeping the order threads first appear in.
+
+    Args:
+        messages (list): Message records, in display order.
+
+    Returns:
+        list: One list of messages per thread, each in display order.
+    """
+    groups = {}
+    for message in messages:
+        groups.setdefault(message.thread_id or message.id, []).append(message)
+    return list(groups.values())
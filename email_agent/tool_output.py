@@ -0,0 +1,259 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+
+# Tokens a read tool may return to the model; output beyond that is paged.
+OUTPUT_TOKEN_BUDGET = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "2000"))
+# Rough size of a token in characters, for English text and JSON punctuation.
+CHARS_PER_TOKEN = 4
+# A body is cut no shorter than this before whole messages are held back instead.
+MIN_BODY_CHARS = 200
+# Room kept for the continuation and failure lines under the records.
+FOOTER_CHARS = 240
+TRUNCATION_MARK = " …[truncated]"
+
+
+def estimate_tokens(text):
+    """Estimates how many model tokens a piece of text costs, without a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_date(message):
+    """Returns the date of a message as shown to the model, in UTC."""
+    return datetime.fromtimestamp(message.internal_date / 1000, timezone.utc).strftime(
+        "%Y-%m-%d %H:%M"
+    )
+
+
+def message_record(message, body=None, earlier=()):
+    """Returns the compact record shown to the model for one message.
+
+    Args:
+        message (Message): The message.
+        body (str): The body text to include, or None to leave it out.
+        earlier (list): IDs of older matches in the same thread, shown under
+            this message instead of as records of their own.
+
+    Returns:
+        dict: The fields the model needs, under short keys.
+    """
+    record = {
+        "id": message.id,
+        "date": format_date(message),
+        "from": message.sender,
+        "subject": message.subject,
+        "snippet": message.snippet,
+    }
+    if message.thread_id:
+        record["thread"] = message.thread_id
+    if earlier:
+        record["earlier"] = list(earlier)
+    if "UNREAD" in message.label_ids:
+        record["unread"] = True
+    if body is not None:
+        record["body"] = body
+    return record
+
+
+def dump_record(record):
+    """Serializes a record as one line of compact JSON."""
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def share_budget(budget, lengths):
+    """Splits a character budget between bodies as evenly as their lengths allow.
+
+    Bodies shorter than an even share keep their full length, and what they
+    leave over goes to the longer ones.
+
+    Args:
+        budget (int): The characters available for all bodies together.
+        lengths (list): The full length of each body.
+
+    Returns:
+        list: The characters each body may use, in the order of ``lengths``.
+    """
+    limits = [0] * len(lengths)
+    remaining = max(budget, 0)
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for position, index in enumerate(order):
+        fair = remaining // (len(order) - position)
+        limits[index] = min(lengths[index], fair)
+        remaining -= limits[index]
+    return limits
+
+
+def fit_messages(messages, token_budget, include_body=False, earlier=None):
+    """Renders as many messages as fit in a token budget, one JSON line each.
+
+    Messages are kept newest first and whole: a message that does not fit is
+    held back for the next page rather than cut. When bodies are included, the
+    budget left after the headers is shared between them, and long bodies are
+    shortened first; messages are only held back once the bodies would get
+    shorter than ``MIN_BODY_CHARS``. The first message is always shown.
+
+    Args:
+        messages (list): Message records, in display order.
+        token_budget (int): The tokens the lines may take.
+        include_body (bool): Whether to show each message's body.
+        earlier (dict): For messages that lead a thread, the IDs of the older
+            matches in it, by message ID.
+
+    Returns:
+        tuple: The lines, and how many of ``messages`` they show.
+    """
+    earlier = earlier or {}
+    budget = token_budget * CHARS_PER_TOKEN - FOOTER_CHARS
+    lines = [
+        dump_record(message_record(message, earlier=earlier.get(message.id, ())))
+        for message in messages
+    ]
+    count, used = 0, 0
+    for line in lines:
+        if count and used + len(line) + 1 > budget:
+            break
+        used += len(line) + 1
+        count += 1
+    if not include_body:
+        return lines[:count], count
+
+    bodies = [message.body or "" for message in messages[:count]]
+    while True:
+        # Each body also adds its key, quotes and the truncation mark.
+        spare = budget - used - count * (len(',"body":""') + len(TRUNCATION_MARK))
+        limits = share_budget(spare, [len(body) for body in bodies[:count]])
+        if count == 1 or all(
+            limit >= min(len(body), MIN_BODY_CHARS) for limit, body in zip(limits, bodies)
+        ):
+            break
+        count -= 1
+        used -= len(lines[count]) + 1
+
+    rendered = []
+    for message, body, limit in zip(messages, bodies, limits):
+        if len(body) > limit:
+            body = body[:limit] + TRUNCATION_MARK
+        rendered.append(dump_record(message_record(message, body, earlier.get(message.id, ()))))
+    return rendered, count
+
+
+def thread_record(message, text, quoted=0):
+    """Returns the compact record of one message in a conversation view.
+
+    Args:
+        message (Message): The message.
+        text (str): What the message added to the conversation.
+        quoted (int): The number of quoted lines left out of ``text``.
+
+    Returns:
+        dict: The fields the model needs, under short keys.
+    """
+    record = {"id": message.id, "date": format_date(message), "from": message.sender, "text": text}
+    if quoted:
+        record["quoted"] = quoted
+    if "UNREAD" in message.label_ids:
+        record["unread"] = True
+    return record
+
+
+def cluster_record(handle, messages):
+    """Returns the compact record of a group of near-identical messages.
+
+    Args:
+        handle (str): The handle that stands for the whole group.
+        messages (list): The messages of the group, newest first.
+
+    Returns:
+        dict: The group's size, most common sender, dates and newest message
+        as a sample, under short keys.
+    """
+    senders = Counter(message.sender for message in messages)
+    sample = messages[0]
+    record = {
+        "cluster": handle,
+        "count": len(messages),
+        "from": senders.most_common(1)[0][0],
+        "newest": format_date(sample),
+        "oldest": format_date(messages[-1]),
+        "subject": sample.subject,
+        "snippet": sample.snippet,
+    }
+    if len(senders) > 1:
+        record["senders"] = len(senders)
+    unread = sum("UNREAD" in message.label_ids for message in messages)
+    if unread:
+        record["unread"] = unread
+    return record
+
+
+def fit_thread(entries, token_budget):
+    """Renders a conversation, oldest message first, within a token budget.
+
+    The newest messages matter most for where a conversation stands, so when
+    the budget runs out it is the oldest messages that are left out. Long
+    texts are shortened first, as ``fit_messages`` does with bodies.
+
+    Args:
+        entries (list): (message, text, quoted lines) tuples, oldest first.
+        token_budget (int): The tokens the lines may take.
+
+    Returns:
+        tuple: The lines, and how many of the newest entries they show.
+    """
+    budget = token_budget * CHARS_PER_TOKEN - FOOTER_CHARS
+    heads = [len(dump_record(thread_record(message, "", quoted))) + 1 for message, _, quoted in entries]
+    count, used, reserved = 0, 0, 0
+    for head, (_, text, _) in zip(reversed(heads), reversed(entries)):
+        least = min(len(text), MIN_BODY_CHARS)
+        if count and used + head + reserved + least > budget:
+            break
+        used += head
+        reserved += least
+        count += 1
+    shown = entries[len(entries) - count:]
+    limits = share_budget(
+        budget - used - count * len(TRUNCATION_MARK), [len(text) for _, text, _ in shown]
+    )
+    lines = []
+    for (message, text, quoted), limit in zip(shown, limits):
+        if len(text) > limit:
+            text = text[:limit] + TRUNCATION_MARK
+        lines.append(dump_record(thread_record(message, text, quoted)))
+    return lines, count
+
+
+class ContinuationStore:
+    """Remembers the messages a budgeted result held back, under a short handle.
+
+    The model passes the handle back to get the next page, which is served
+    from the same list of IDs instead of searching again. Handles expire after
+    ``ttl`` seconds and the oldest are dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries=256, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, message_ids, include_body=False):
+        """Stores the held-back message IDs and returns their handle."""
+        handle = secrets.token_urlsafe(6)
+        with self._lock:
+            self._entries[handle] = (time.monotonic() + self.ttl, list(message_ids), include_body)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle):
+        """Returns the message IDs and body flag stored under a handle, or None if expired."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(handle, None)
+                return None
+            return entry[1], entry[2]
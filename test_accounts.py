@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for serving several mailboxes from one process.
+Checks the account registry, tokens stored per account, the LRU pool of warm
+accounts and how tools pick the account they work on.
+"""
+
+import sys
+import os
+import asyncio
+import datetime
+import json
+import tempfile
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent import agent
+from email_agent.accounts import AccountError, AccountPool, AccountRegistry, StoredCredentialManager
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def raises(function, *args):
+    try:
+        function(*args)
+    except AccountError:
+        return True
+    return False
+
+def make_token(access_token):
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    return json.dumps({
+        "token": access_token,
+        "refresh_token": "refresh",
+        "client_id": "client",
+        "client_secret": "secret",
+        "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    })
+
+def test_registry(workdir):
+    """Accounts are stored with their tokens and can be removed."""
+    print("🧪 Testing Registry")
+    print("=" * 50)
+
+    registry = AccountRegistry(os.path.join(workdir, "registry.sqlite3"))
+    registry.add("alice@example.com", make_token("a"))
+    registry.add("bob", make_token("b"))
+    registry.add("bob", make_token("b2"))
+    results = [
+        check("Accounts are listed", registry.names() == ["alice@example.com", "bob"]),
+        check("Adding again replaces the token", json.loads(registry.get_token("bob"))["token"] == "b2"),
+        check("Unknown accounts have no token", registry.get_token("carol") is None),
+        check("Accounts can be removed", registry.remove("bob") and registry.names() == ["alice@example.com"]),
+        check("Names that are not file names are refused", raises(registry.add, "../etc", "{}")),
+    ]
+    return all(results)
+
+def test_credentials(workdir):
+    """Tokens are read from and written back to the registry."""
+    print("\n🧪 Testing Stored Credentials")
+    print("=" * 50)
+
+    registry = AccountRegistry(os.path.join(workdir, "credentials.sqlite3"))
+    registry.add("alice", make_token("alice-token"))
+    manager = StoredCredentialManager(registry, "alice")
+    creds = manager.get()
+    manager.stop()
+    creds.token = "refreshed"
+    manager._write_token(creds)
+    missing = StoredCredentialManager(registry, "nobody")
+    results = [
+        check("Token comes from the registry", creds.token == "refreshed" and creds.refresh_token == "refresh"),
+        check("Refreshed tokens are stored", json.loads(registry.get_token("alice"))["token"] == "refreshed"),
+        check("Unregistered accounts are not authorized in a browser", raises(missing.get)),
+    ]
+    return all(results)
+
+def test_pool(workdir):
+    """The least recently used account is closed when the pool is full."""
+    print("\n🧪 Testing Pool")
+    print("=" * 50)
+
+    registry = AccountRegistry(os.path.join(workdir, "pool.sqlite3"))
+    for name in ("a", "b", "c"):
+        registry.add(name, make_token(name))
+    pool = AccountPool(registry, max_size=2, data_dir=os.path.join(workdir, "mirrors"))
+    first = pool.get("a")
+    pool.get("b")
+    again = pool.get("a")
+    pool.get("c")
+    stats = pool.stats()
+    results = [
+        check("Warm accounts are reused", again is first),
+        check("Pool stays within its size", stats["warm"] == 2),
+        check("Least recently used account is evicted", stats["evictions"] == 1 and pool.get("a") is first),
+        check("Evicted accounts are rebuilt on demand", pool.get("b") is not None and pool.stats()["misses"] == 4),
+        check("Each account has its own mirror", first.store.path.endswith(os.path.join("mirrors", "a.sqlite3"))),
+        check("Unknown accounts are refused", raises(pool.get, "nobody")),
+    ]
+    return all(results)
+
+def test_tools(workdir):
+    """Tools run on the account they name, and a bound turn cannot switch accounts."""
+    print("\n🧪 Testing Account Tools")
+    print("=" * 50)
+
+    registry = AccountRegistry(os.path.join(workdir, "tools.sqlite3"))
+    registry.add("alice", make_token("a"))
+    agent.account_pool = AccountPool(registry, data_dir=os.path.join(workdir, "tool-mirrors"))
+
+    @agent.account_tool
+    def whoami(account: str = ""):
+        return agent.current_account().name
+
+    @agent.account_tool
+    async def whoami_async(account: str = ""):
+        return agent.current_account().name
+
+    bound = agent._current_account.set(agent.get_account("alice"))
+    try:
+        in_turn = whoami()
+        refused = whoami(account="default")
+    finally:
+        agent._current_account.reset(bound)
+    results = [
+        check("No account means the default account", whoami() == "default"),
+        check("Named accounts are used", whoami(account="alice") == "alice"),
+        check("Async tools are bound too", asyncio.run(whoami_async("alice")) == "alice"),
+        check("Unknown accounts are reported", whoami(account="bob").startswith("An error occurred")),
+        check("A bound turn uses its account", in_turn == "alice"),
+        check("A bound turn cannot reach another account", refused.startswith("An error occurred")),
+        check("The binding ends with the call", agent.current_account() is agent.default_account),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Accounts Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = [
+            test_registry(workdir),
+            test_credentials(workdir),
+            test_pool(workdir),
+            test_tools(workdir),
+        ]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All account tests passed!")
+    else:
+        print("⚠️ Some account tests failed.")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test script for the async Gmail client and the async email tools.
+Checks retries, timeouts and partial failures in AsyncGmailClient with a
+stubbed HTTP session, and runs each async tool with a stubbed client.
+"""
+
+import sys
+import os
+import asyncio
+import json
+import tempfile
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent import agent
+from email_agent.accounts import Account
+from email_agent.async_gmail import AsyncGmailClient, AsyncGmailError
+from email_agent.message import Message
+from email_agent.quota import QuotaScheduler
+from email_agent.single_flight import SingleFlight
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+class FakeCredentials:
+    valid = True
+    token = "token"
+
+class FakeResponse:
+    def __init__(self, status, text, headers=None, delay=0):
+        self.status = status
+        self.headers = headers or {}
+        self._text = text
+        self._delay = delay
+
+    async def text(self):
+        await asyncio.sleep(self._delay)
+        return self._text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession; ``answer`` maps (method, url) to a response or an exception."""
+
+    closed = False
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        result = self.answer(method, url)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+def make_client(answer, single_flight=None):
+    client = AsyncGmailClient(
+        lambda: FakeCredentials(),
+        scheduler=QuotaScheduler(units_per_second=1e9, max_retries=3, retry_delay=0.001, max_retry_delay=0.002),
+        single_flight=single_flight,
+    )
+    session = FakeSession(answer)
+    client._session = session
+    client._loop = asyncio.get_running_loop()
+    client._semaphore = asyncio.Semaphore(client.max_concurrent_requests)
+    client._refresh_lock = asyncio.Lock()
+    return client, session
+
+def scripted(*responses):
+    """Answers every call with the next of ``responses``."""
+    remaining = list(responses)
+    return lambda method, url: remaining.pop(0)
+
+async def outcome(call):
+    try:
+        return await call
+    except AsyncGmailError as error:
+        return error.status
+
+def test_client():
+    """Transient errors are retried; timeouts and failed messages become AsyncGmailError."""
+    print("🧪 Testing Async Client")
+    print("=" * 50)
+
+    async def scenario():
+        found = {}
+        client, session = make_client(scripted(FakeResponse(503, "busy"), FakeResponse(200, '{"ok": 1}')))
+        found["retried"] = (await client.request("GET", "messages", api_method="messages.list"), len(session.calls))
+        client, session = make_client(scripted(FakeResponse(503, "busy")))
+        found["send"] = (await outcome(client.request("POST", "messages/send", body={}, api_method="messages.send")), len(session.calls))
+        client, session = make_client(scripted(FakeResponse(429, "slow", {"Retry-After": "0"}), FakeResponse(200, '{"id": "s1"}')))
+        found["rate_limited_send"] = await client.request("POST", "messages/send", body={}, api_method="messages.send")
+        client, session = make_client(scripted(FakeResponse(404, "missing")))
+        found["missing"] = (await outcome(client.request("GET", "messages/x")), len(session.calls))
+        client, session = make_client(scripted(asyncio.TimeoutError()))
+        try:
+            await client.request("GET", "messages")
+            found["timeout"] = None
+        except AsyncGmailError as error:
+            found["timeout"] = str(error)
+        client, session = make_client(scripted(FakeResponse(204, "")))
+        found["empty"] = await client.request("DELETE", "messages/x", api_method="messages.delete")
+
+        def by_id(method, url):
+            message_id = url.rsplit("/", 1)[1]
+            if message_id == "bad":
+                return FakeResponse(404, "missing")
+            return FakeResponse(200, json.dumps({"id": message_id}))
+
+        client, session = make_client(by_id)
+        found["partial"] = await client.get_messages(["a", "bad", "c"], format="metadata")
+
+        # A slow answer, so the other reads arrive while the first is in flight.
+        client, session = make_client(
+            lambda method, url: FakeResponse(200, '{"messages": []}', delay=0.05), single_flight=SingleFlight()
+        )
+        found["coalesced"] = await asyncio.gather(
+            *(client.request("GET", "messages", params={"q": "in:inbox"}, api_method="messages.list") for _ in range(5))
+        )
+        found["coalesced_calls"] = len(session.calls)
+        return found
+
+    found = asyncio.run(scenario())
+    results = [
+        check("5xx is retried until it succeeds", found["retried"] == ({"ok": 1}, 2)),
+        check("5xx is not retried for sends", found["send"] == (503, 1)),
+        check("429 is retried for sends", found["rate_limited_send"] == {"id": "s1"}),
+        check("404 is raised with its status", found["missing"] == (404, 1)),
+        check("Timeouts become AsyncGmailError", found["timeout"] == "Request timed out"),
+        check("Empty responses are an empty dict", found["empty"] == {}),
+        check("Fetched messages keep their order", [m["id"] for m in found["partial"][0]] == ["a", "c"]),
+        check("Failed messages are listed, not raised", found["partial"][1] == ["bad"]),
+        check("Concurrent identical reads share a call", len(found["coalesced"]) == 5 and found["coalesced_calls"] == 1),
+    ]
+    return all(results)
+
+class StubGmail:
+    """Stands in for an account's AsyncGmailClient, answering from a few canned messages."""
+
+    def __init__(self, messages=(), fail=False):
+        self.messages = {message["id"]: message for message in messages}
+        self.fail = fail
+        self.calls = []
+
+    async def request(self, method, path, params=None, body=None, api_method=None, media=None):
+        self.calls.append((method, path, api_method, media is not None))
+        if self.fail:
+            raise AsyncGmailError("<HttpError 500: failed>", 500)
+        if path == "messages":
+            return {"messages": [{"id": message_id} for message_id in self.messages]}
+        if path == "messages/send":
+            return {"id": "sent1", "threadId": "sent1"}
+        if path == "drafts":
+            return {"id": "r1", "message": {"id": "d1"}}
+        return {}
+
+    async def get_messages(self, message_ids, **params):
+        self.calls.append(("GET", "messages/*", "messages.get", False))
+        fetched = [self.messages[message_id] for message_id in message_ids if message_id != "gone"]
+        return fetched, [message_id for message_id in message_ids if message_id == "gone"]
+
+def make_resource(message_id, subject):
+    return {
+        "id": message_id,
+        "threadId": message_id,
+        "labelIds": ["INBOX"],
+        "snippet": f"About {subject}",
+        "internalDate": "1700000000000",
+        "payload": {"headers": [{"name": "From", "value": "a@example.com"}, {"name": "Subject", "value": subject}]},
+    }
+
+def install(workdir, stub):
+    account = Account("default", None, os.path.join(workdir, f"mirror-{time.time_ns()}.sqlite3"))
+    account.async_gmail = stub
+    # No sync this turn: the mirror has no history, so reads go to the stub.
+    account.last_sync = time.monotonic()
+    agent.default_account = account
+    return account
+
+def test_tools(workdir):
+    """Each async tool calls Gmail once and reports success or the error."""
+    print("\n🧪 Testing Async Tools")
+    print("=" * 50)
+
+    stub = StubGmail([make_resource("m1", "Budget"), make_resource("gone", "Lost"), make_resource("m3", "Plans")])
+    account = install(workdir, stub)
+    read = asyncio.run(agent.read_emails_async("in:inbox", 5))
+    records = [json.loads(line) for line in read.splitlines() if line.startswith("{")]
+
+    sent = asyncio.run(agent.send_email_async("bob@example.com", "Hello", "Body"))
+    mirrored = account.store.get_many(["sent1"])
+    draft = asyncio.run(agent.create_draft_async("bob@example.com", "Draft", "Body"))
+    account.store.upsert([Message.from_resource(make_resource("m9", "Old"))])
+    key = account.result_cache.make_key("in:inbox", 5)
+    account.result_cache.put(key, "cached", ["m9"])
+    deleted = asyncio.run(agent.delete_email_async("m9"))
+
+    failing = install(workdir, StubGmail(fail=True))
+    results = [
+        check("read_emails_async lists and fetches", [record["id"] for record in records] == ["m1", "m3"]),
+        check("read_emails_async reports failed fetches", "Could not fetch 1 email(s): gone" in read),
+        check("send_email_async uploads the message", sent == "Email sent successfully! Message Id: sent1"
+              and ("POST", "messages/send", "messages.send", True) in stub.calls),
+        check("Sent mail is mirrored", "sent1" in mirrored),
+        check("create_draft_async uploads the draft", draft == "Draft created successfully! Draft Id: r1"
+              and ("POST", "drafts", "drafts.create", True) in stub.calls),
+        check("delete_email_async deletes the message", deleted == "Email with ID m9 deleted successfully."
+              and ("DELETE", "messages/m9", "messages.delete", False) in stub.calls),
+        check("Deleted mail leaves the mirror and the cache",
+              account.store.get_many(["m9"]) == {} and account.result_cache.get(key) is None),
+        check("read errors are reported", asyncio.run(agent.read_emails_async("in:inbox")).startswith("An error occurred")),
+        check("send errors are reported", asyncio.run(agent.send_email_async("b@example.com", "S", "B")).startswith("An error occurred")),
+        check("draft errors are reported", asyncio.run(agent.create_draft_async("b@example.com", "S", "B")).startswith("An error occurred")),
+        check("delete errors are reported", asyncio.run(agent.delete_email_async("m1")).startswith("An error occurred")
+              and len(failing.async_gmail.calls) == 4),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Async Tools Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = [test_client(), test_tools(workdir)]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All async tool tests passed!")
+    else:
+        print("⚠️ Some async tool tests failed.")
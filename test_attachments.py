@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed attachment decoding and the attachment store.
+Checks chunked base64url decoding, JSON value streaming, part walking and deduplication.
+"""
+
+import sys
+import os
+import base64
+import json
+import tempfile
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.attachments import (
+    AttachmentError,
+    AttachmentStore,
+    Base64UrlStreamDecoder,
+    find_text_part,
+    iter_json_string_value,
+    walk_parts,
+)
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def decode_response(body, chunk_size):
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    decoder = Base64UrlStreamDecoder()
+    pieces = [decoder.decode(piece) for piece in iter_json_string_value(chunks, "data")]
+    return b"".join(pieces) + decoder.finish()
+
+def test_streamed_decoding():
+    """Attachment data decodes the same no matter how the response is split."""
+    print("🧪 Testing Streamed Decoding")
+    print("=" * 50)
+
+    content = os.urandom(100003)
+    body = json.dumps({"data": base64.urlsafe_b64encode(content).decode()}).encode()
+    results = [
+        check(f"Chunks of {size} bytes decode correctly", decode_response(body, size) == content)
+        for size in (1, 5, 4096, len(body))
+    ]
+
+    unpadded = json.dumps({"data": base64.urlsafe_b64encode(b"hello!!").decode().rstrip("=")}).encode()
+    results.append(check("Missing padding is tolerated", decode_response(unpadded, 3) == b"hello!!"))
+
+    for description, broken in (
+        ("Missing data value is an error", b'{"size": 0}'),
+        ("Truncated data value is an error", b'{"data": "aGVsbG8'),
+    ):
+        try:
+            decode_response(broken, 4)
+            raised = False
+        except AttachmentError:
+            raised = True
+        results.append(check(description, raised))
+    return all(results)
+
+def test_walk_parts():
+    """Parts are visited depth first, in document order."""
+    print("\n🧪 Testing Part Walking")
+    print("=" * 50)
+
+    payload = {
+        "partId": "",
+        "parts": [
+            {"partId": "0", "parts": [{"partId": "0.0"}, {"partId": "0.1"}]},
+            {"partId": "1"},
+        ],
+    }
+    order = [part["partId"] for part in walk_parts(payload)]
+    results = [check("Depth-first order", order == ["", "0", "0.0", "0.1", "1"])]
+
+    html = {"partId": "0", "mimeType": "text/html"}
+    plain = {"partId": "1", "mimeType": "text/plain", "body": {"attachmentId": "a1"}}
+    notes = {"partId": "2", "mimeType": "text/plain", "filename": "notes.txt"}
+    results += [
+        check("Plain text is preferred", find_text_part({"parts": [html, plain]}) is plain),
+        check("HTML is used when there is no plain text", find_text_part({"parts": [notes, html]}) is html),
+        check("Attached text files are not the body", find_text_part({"parts": [notes]}) is None),
+    ]
+    return all(results)
+
+def test_store_deduplication():
+    """Identical attachments are stored once and a saved part is remembered."""
+    print("\n🧪 Testing Attachment Store")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = AttachmentStore(root)
+        first = store.save("m1", "1", "report.pdf", [b"same ", b"content"])
+        second = store.save("m2", "2", "copy.pdf", [b"same content"])
+        results = [
+            check("First copy is new", not first[2]),
+            check("Second copy is detected as a duplicate", second[2] and second[0] == first[0]),
+            check("Size is recorded", first[1] == len(b"same content")),
+            check("Saved part can be looked up", store.lookup("m2", "2") == (first[0], first[1])),
+            check("Unknown part is not found", store.lookup("m3", "1") is None),
+        ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Attachment Retrieval Test")
+    print("=" * 60)
+
+    passed = [test_streamed_decoding(), test_walk_parts(), test_store_deduplication()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All attachment tests passed!")
+    else:
+        print("⚠️ Some attachment tests failed.")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk_update_emails.
+Runs bulk actions against the fake Gmail backend and checks how the matches
+are split into batchModify calls, what a failed chunk or a dry run reports,
+which requests are refused and that the mirror and result cache follow.
+"""
+
+import sys
+import os
+import itertools
+import tempfile
+
+# Add the project root and the benchmarks directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from email_agent import agent
+from email_agent.accounts import Account
+from email_agent.quota import QuotaScheduler
+from fake_gmail import FakeGmailHttp, FakeMailbox
+
+# 3 of every 5 fake messages are in the inbox, so 2400 of these: three chunks.
+MAILBOX_SIZE = 4000
+MIRROR_NUMBERS = itertools.count()
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def install(workdir):
+    """Points the agent at a fresh fake mailbox with a synced mirror."""
+    mailbox = FakeMailbox(MAILBOX_SIZE, body_size=100)
+    http = FakeGmailHttp(mailbox)
+    scheduler = QuotaScheduler(units_per_second=1e9, max_retries=1, retry_delay=0.001, max_retry_delay=0.002)
+    account = Account("default", None, os.path.join(workdir, f"mirror-{next(MIRROR_NUMBERS)}.sqlite3"), scheduler=scheduler)
+    account.gmail_service = build_from_document(get_static_doc("gmail", "v1"), http=http)
+    agent.default_account = account
+    agent.full_sync()
+    http.reset_stats()
+    return account, mailbox, http
+
+def labeled(mailbox, message_ids, label):
+    return sum(label in mailbox.messages[message_id]["labelIds"] for message_id in message_ids)
+
+def modify_calls(http):
+    return http.calls_by_method.get("messages.batchModify", 0)
+
+def test_refusals(workdir):
+    """Requests that would touch the whole mailbox or cannot be carried out are refused."""
+    print("🧪 Testing Refusals")
+    print("=" * 50)
+
+    _, _, http = install(workdir)
+    results = [
+        check("An empty query is refused", agent.bulk_update_emails("  ").startswith("A search query is required")),
+        check("Unknown actions are refused", agent.bulk_update_emails("in:inbox", "shred").startswith("Unknown action")),
+        check("Label actions need a label", "needs a label name" in agent.bulk_update_emails("in:inbox", "add_label")),
+        check("Unknown labels are reported", "No label named 'Nope'" in agent.bulk_update_emails("in:inbox", "add_label", "Nope")),
+        check("Expired clusters are reported", "has expired" in agent.bulk_update_emails(cluster="c-missing")),
+        check("Nothing was changed", modify_calls(http) == 0),
+    ]
+    return all(results)
+
+def test_dry_run(workdir):
+    """A dry run counts the matches and changes nothing."""
+    print("\n🧪 Testing Dry Run")
+    print("=" * 50)
+
+    _, mailbox, http = install(workdir)
+    inbox = mailbox.search("in:inbox", MAILBOX_SIZE)
+    counted = agent.bulk_update_emails("in:inbox", "trash", dry_run=True)
+    limited = agent.bulk_update_emails("in:inbox", "trash", dry_run=True, max_emails=100)
+    results = [
+        check("The matches are counted", counted == f"{len(inbox)} email(s) match 'in:inbox'. Nothing was changed."),
+        check("The limit is reported", limited.startswith("100 email(s) match") and "stopped at the limit of 100" in limited),
+        check("No message was modified", modify_calls(http) == 0 and labeled(mailbox, inbox, "TRASH") == 0),
+    ]
+    return all(results)
+
+def test_chunks(workdir):
+    """Matches are changed 1000 at a time, and a failed chunk does not stop the others."""
+    print("\n🧪 Testing Chunks")
+    print("=" * 50)
+
+    _, mailbox, http = install(workdir)
+    inbox = mailbox.search("in:inbox", MAILBOX_SIZE)
+    http.planned_errors = {"messages.batchModify": [None, 400]}
+    output = agent.bulk_update_emails("in:inbox", "archive")
+    lines = output.splitlines()
+    results = [
+        check("There are 2400 matches", len(inbox) == 2400),
+        check("One batchModify call is made per 1000 messages", modify_calls(http) == 3 and agent.BULK_CHUNK_SIZE == 1000),
+        check("Progress is reported per chunk", lines[:2] == ["Processed 1000/2400", "Processed 2400/2400"]),
+        check("The failed chunk is reported", lines[2].startswith("Emails 1001-2000 could not be updated")),
+        check("The total counts only what changed", lines[-1] == "Applied 'archive' to 1400 of 2400 email(s)."),
+        check("The other chunks were applied", labeled(mailbox, inbox[:1000] + inbox[2000:], "INBOX") == 0),
+        check("The failed chunk is left as it was", labeled(mailbox, inbox[1000:2000], "INBOX") == 1000),
+    ]
+    return all(results)
+
+def test_mirror(workdir):
+    """Changed messages are relabeled in the mirror and cached results are dropped."""
+    print("\n🧪 Testing Mirror And Cache")
+    print("=" * 50)
+
+    account, mailbox, _ = install(workdir)
+    unread = mailbox.search("is:unread in:inbox", MAILBOX_SIZE)
+    mirrored = list(account.store.get_many(unread))  # the unread messages the full sync kept
+    key = account.result_cache.make_key("is:unread", 5)
+    account.result_cache.put(key, "cached", unread[:5])
+    output = agent.bulk_update_emails("is:unread in:inbox", "mark_read")
+    after = account.store.get_many(mirrored)
+    labeled_output = agent.bulk_update_emails("in:inbox", "add_label", "Receipts", max_emails=10)
+    receipts = account.store.get_many(mailbox.search("in:inbox", 10))
+    handle = account.continuations.put(unread[:3])
+    cluster_output = agent.bulk_update_emails(cluster=handle, action="trash")
+    results = [
+        check("Every match was changed", output.endswith(f"to {len(unread)} of {len(unread)} email(s).")),
+        check("Mirrored messages lose the label", mirrored and not any("UNREAD" in message.label_ids for message in after.values())),
+        check("Cached results are dropped", account.result_cache.get(key) is None),
+        check("Labels are found by name", "to 10 of 10" in labeled_output and all("Label_1" in m.label_ids for m in receipts.values())),
+        check("A cluster handle selects its messages", cluster_output.endswith("to 3 of 3 email(s).") and labeled(mailbox, unread[:3], "TRASH") == 3),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Bulk Update Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = [
+            test_refusals(workdir),
+            test_dry_run(workdir),
+            test_chunks(workdir),
+            test_mirror(workdir),
+        ]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All bulk update tests passed!")
+    else:
+        print("⚠️ Some bulk update tests failed.")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for outgoing messages.
+Checks the messages the builder writes, which files may be attached, and
+how a resumable upload carries on after a dropped connection.
+"""
+
+import sys
+import os
+import email
+import tempfile
+from email import policy
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent import compose
+from email_agent.compose import build_message, encoded_size, message_size, resolve_attachment
+from email_agent.quota import QuotaScheduler
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def parse(handle):
+    return email.message_from_bytes(handle.read(), policy=policy.default)
+
+def test_messages(outbox):
+    """Plain messages have one part; attachments make a multipart/mixed message."""
+    print("🧪 Testing Messages")
+    print("=" * 50)
+
+    with build_message("bob@example.com", "Café plans", "See you at nine") as handle:
+        plain = parse(handle)
+    content = os.urandom(300_000)
+    with open(os.path.join(outbox, "report.pdf"), "wb") as file:
+        file.write(content)
+    with build_message("bob@example.com", "Report", "Attached.", ["report.pdf"], outbox) as handle:
+        size = message_size(handle)
+        raw = handle.read()
+    mixed = email.message_from_bytes(raw, policy=policy.default)
+    attachment = next(mixed.iter_attachments())
+    lines = raw.split(b"\r\n")
+    results = [
+        check("Plain messages are a single text part", plain.get_content_type() == "text/plain"),
+        check("Non-ASCII subjects are encoded", plain["subject"] == "Café plans"),
+        check("The body survives", plain.get_content().strip() == "See you at nine"),
+        check("Attachments make a multipart message", mixed.get_content_type() == "multipart/mixed"),
+        check("The text comes first", mixed.get_body().get_content().strip() == "Attached."),
+        check("The attachment keeps its name and type",
+              attachment.get_filename() == "report.pdf" and attachment.get_content_type() == "application/pdf"),
+        check("The attachment content is intact", attachment.get_content() == content),
+        check("Lines end in CRLF and stay within 78 characters",
+              b"\n" not in raw.replace(b"\r\n", b"") and max(map(len, lines)) <= 78),
+        check("The size check predicts the encoded size",
+              encoded_size(len(content)) < size < encoded_size(len(content)) + 1000),
+    ]
+    return all(results)
+
+def test_attachment_paths(outbox):
+    """Only files inside the outbox can be attached."""
+    print("\n🧪 Testing Attachment Paths")
+    print("=" * 50)
+
+    def refused(path):
+        try:
+            resolve_attachment(path, outbox)
+            return False
+        except ValueError:
+            return True
+
+    outside = os.path.join(os.path.dirname(outbox), "secret.txt")
+    with open(outside, "w") as file:
+        file.write("secret")
+    os.symlink(outside, os.path.join(outbox, "link.txt"))
+    os.makedirs(os.path.join(outbox, "folder"))
+    results = [
+        check("Files in the outbox are found", resolve_attachment("report.pdf", outbox).endswith("report.pdf")),
+        check("Paths that include the outbox are found",
+              resolve_attachment(os.path.join(outbox, "report.pdf"), outbox).endswith("report.pdf")),
+        check("Parent directories are refused", refused("../secret.txt")),
+        check("Absolute paths outside are refused", refused(outside)),
+        check("Symlinks out of the outbox are refused", refused("link.txt")),
+        check("Directories are refused", refused("folder")),
+        check("Missing files are refused", refused("missing.pdf")),
+    ]
+    return all(results)
+
+def test_size_limit(outbox):
+    """Messages over Gmail's limit are refused, and large ones are built on disk."""
+    print("\n🧪 Testing Size Limit")
+    print("=" * 50)
+
+    limit = compose.MAX_MESSAGE_BYTES
+    compose.MAX_MESSAGE_BYTES = 300_000
+    try:
+        build_message("bob@example.com", "Report", "Attached.", ["report.pdf"], outbox)
+        refused = False
+    except ValueError as error:
+        refused = "MB" in str(error)
+    finally:
+        compose.MAX_MESSAGE_BYTES = limit
+    spool = compose.SPOOL_MAX_BYTES
+    compose.SPOOL_MAX_BYTES = 100_000
+    try:
+        with build_message("bob@example.com", "Report", "Attached.", ["report.pdf"], outbox) as handle:
+            spilled = handle._rolled
+    finally:
+        compose.SPOOL_MAX_BYTES = spool
+    results = [
+        check("Oversized messages are refused", refused),
+        check("Large messages spill to disk", spilled),
+        check("Upload chunks are a multiple of 256 KiB", compose.UPLOAD_CHUNK_SIZE % (256 * 1024) == 0),
+    ]
+    return all(results)
+
+class FlakyUpload:
+    """A resumable request whose chunk requests fail a given number of times."""
+
+    resumable = True
+    methodId = "gmail.users.messages.send"
+
+    def __init__(self, chunks, failures):
+        self.chunks = chunks
+        self.failures = list(failures)
+        self.sent = 0
+        self.attempts = 0
+
+    def next_chunk(self):
+        self.attempts += 1
+        if self.failures and self.failures[0] == self.sent:
+            self.failures.pop(0)
+            raise ConnectionResetError("Connection reset by peer")
+        self.sent += 1
+        return (None, {"id": "sent"}) if self.sent == self.chunks else (object(), None)
+
+def test_resumable_upload():
+    """Dropped chunks are resumed, and repeated drops eventually give up."""
+    print("\n🧪 Testing Resumable Upload")
+    print("=" * 50)
+
+    scheduler = QuotaScheduler(units_per_second=1e9, max_retries=2, retry_delay=0.001)
+    upload = FlakyUpload(chunks=4, failures=[1, 1, 3])
+    response = scheduler.execute_upload(upload)
+    stats = scheduler.stats()
+    stubborn = FlakyUpload(chunks=4, failures=[2, 2, 2])
+    try:
+        scheduler.execute_upload(stubborn)
+        gave_up = False
+    except ConnectionResetError:
+        gave_up = True
+    results = [
+        check("The upload completes", response == {"id": "sent"}),
+        check("Each drop costs one retry", upload.attempts == 7 and stats["retries"] == 3),
+        check("The quota is charged once", stats["units_used"] == 100),
+        check("Repeated drops of one chunk give up", gave_up and stubborn.attempts == 5),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Compose Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        outbox = os.path.join(workdir, "outbox")
+        os.makedirs(outbox)
+        passed = [
+            test_messages(outbox),
+            test_attachment_paths(outbox),
+            test_size_limit(outbox),
+            test_resumable_upload(),
+        ]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All compose tests passed!")
+    else:
+        print("⚠️ Some compose tests failed.")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for the near-duplicate clustering behind find_email_clusters.
+Checks text normalization, that templated mail clusters together, that
+unrelated mail does not, and the compact record each cluster is shown as.
+"""
+
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.duplicates import (
+    cluster_signatures,
+    message_shingles,
+    minhash_signatures,
+    near_duplicate_clusters,
+    normalize,
+    shingles,
+)
+from email_agent.message import Message
+from email_agent.tool_output import cluster_record
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def make_message(message_id, sender, subject, snippet, labels=("INBOX",), date=1700000000000):
+    return Message(message_id, None, date, labels, sender, "me@example.com", subject, snippet)
+
+SHOP = "Shop <orders@shop.example>"
+DIGEST = "Digest <digest@news.example>"
+
+def make_mailbox():
+    messages = []
+    for number in range(6):
+        messages.append(make_message(
+            f"order{number}", SHOP, f"Your order #{1040 + number} has shipped",
+            f"Hi Sam, your order #{1040 + number} has shipped and will arrive on "
+            f"{number + 10} May. Track it in your account.",
+            labels=("INBOX", "UNREAD"), date=1700000000000 - number * 86400000,
+        ))
+    for number in range(4):
+        messages.append(make_message(
+            f"digest{number}", DIGEST, f"Weekly digest #{number + 30}",
+            f"This week: {number + 3} new posts, top stories and more from the community.",
+        ))
+    personal = [
+        ("Lunch on Friday", "Shall we try the new place downtown after the review?"),
+        ("Budget review", "Numbers for next year are attached, comments welcome."),
+        ("Flat viewing", "The landlord can show us the flat on Saturday morning."),
+        ("Conference talk", "My proposal on compilers was accepted, slides due soon."),
+    ]
+    for number, (subject, snippet) in enumerate(personal):
+        messages.append(make_message(f"personal{number}", "Alex <alex@example.com>", subject, snippet))
+    return messages
+
+def test_shingles():
+    """Numbers, case and HTML entities do not tell messages apart."""
+    print("🧪 Testing Shingles")
+    print("=" * 50)
+
+    first = make_message("a", SHOP, "Order #1041 shipped", "Arrives &amp; soon")
+    second = make_message("b", SHOP, "ORDER #1187 Shipped", "arrives & soon")
+    results = [
+        check("Numbers are replaced", normalize("Order #1041") == ["order", "0"]),
+        check("Entities are unescaped", normalize("Q&amp;A") == ["q", "a"]),
+        check("Word pairs are shingles", shingles(["a", "b", "c"]) == {"a b", "b c"}),
+        check("A single word is its own shingle", shingles(["hello"], "s:") == {"s:hello"}),
+        check("Templated messages shingle the same", message_shingles(first) == message_shingles(second)),
+        check("The sender address is a shingle", "from:orders@shop.example" in message_shingles(first)),
+    ]
+    return all(results)
+
+def test_clusters():
+    """Templated mail forms one cluster per template; personal mail stays out."""
+    print("\n🧪 Testing Clusters")
+    print("=" * 50)
+
+    messages = make_mailbox()
+    clusters = near_duplicate_clusters(messages)
+    found = [{message.id for message in cluster} for cluster in clusters]
+    results = [
+        check("Two clusters are found", len(clusters) == 2),
+        check("The largest cluster comes first", found[0] == {f"order{number}" for number in range(6)}),
+        check("The digests cluster together", found[1] == {f"digest{number}" for number in range(4)}),
+        check("Clusters keep the given order", [m.id for m in clusters[0]] == [f"order{n}" for n in range(6)]),
+        check("Small clusters are left out", len(near_duplicate_clusters(messages, min_size=5)) == 1),
+        check("Personal mail is not clustered", not any("personal" in id_ for ids in found for id_ in ids)),
+        check("Fewer than two messages give no clusters", near_duplicate_clusters(messages[:1]) == []),
+    ]
+    return all(results)
+
+def test_signatures():
+    """Signatures are reproducible and the threshold decides what joins."""
+    print("\n🧪 Testing Signatures")
+    print("=" * 50)
+
+    sets = [{"a b", "b c", "c d", "d e"}, {"a b", "b c", "c d", "d f"}, {"x y", "y z"}]
+    signatures = minhash_signatures(sets)
+    results = [
+        check("Signatures are reproducible", (signatures == minhash_signatures(sets)).all()),
+        check("Identical sets have identical signatures", (minhash_signatures([sets[0]])[0] == signatures[0]).all()),
+        check("Similar sets join at a low threshold", cluster_signatures(signatures, 0.3) == [[0, 1]]),
+        check("Nothing joins at a threshold of 1", cluster_signatures(signatures, 1.0) == []),
+    ]
+    return all(results)
+
+def test_record():
+    """A cluster is shown by its size, sender, dates and newest message."""
+    print("\n🧪 Testing Cluster Record")
+    print("=" * 50)
+
+    cluster = near_duplicate_clusters(make_mailbox())[0]
+    record = cluster_record("c1", cluster)
+    mixed = cluster_record("c2", cluster[:2] + [make_message("x", DIGEST, "Other", "Other")])
+    results = [
+        check("The handle and size are given", record["cluster"] == "c1" and record["count"] == 6),
+        check("The sender is given", record["from"] == SHOP),
+        check("The newest message is the sample", record["subject"] == "Your order #1040 has shipped"),
+        check("Unread messages are counted", record["unread"] == 6),
+        check("A single sender is not counted", "senders" not in record),
+        check("Several senders are counted", mixed["senders"] == 2 and mixed["from"] == SHOP),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Duplicate Clustering Test")
+    print("=" * 60)
+
+    passed = [test_shingles(), test_clusters(), test_signatures(), test_record()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All duplicate clustering tests passed!")
+    else:
+        print("⚠️ Some duplicate clustering tests failed.")
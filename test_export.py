@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the mailbox export.
+Checks how the checkpoint assigns, finishes and resumes parts, how fetched
+messages become rows, and the part and mbox files that are written.
+"""
+
+import sys
+import os
+import base64
+import gzip
+import json
+import mailbox
+import tempfile
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.export import (
+    ExportCheckpoint,
+    JsonLinesWriter,
+    export_row,
+    resolve_format,
+    write_mbox,
+)
+
+RAW_MESSAGE = (
+    b"From: Alice <alice@example.com>\r\n"
+    b"To: bob@example.com\r\n"
+    b"Subject: Quarterly numbers\r\n"
+    b"Content-Type: text/html; charset=utf-8\r\n"
+    b"\r\n"
+    b"<p>From the <b>team</b>: numbers attached</p>\r\n"
+)
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def test_checkpoint(workdir):
+    """Parts are assigned once, and failed messages move to a new part."""
+    print("🧪 Testing Checkpoint")
+    print("=" * 50)
+
+    path = os.path.join(workdir, "checkpoint.sqlite3")
+    checkpoint = ExportCheckpoint(path)
+    checkpoint.check_settings(query="", format="jsonl")
+    checkpoint.add_page(["m1", "m2", "m3"], "page-2")
+    listed_after_first = checkpoint.get_state("listed")
+    checkpoint.add_page(["m4", "m5", "m3"], None)
+    checkpoint.assign_parts(2)
+    parts = checkpoint.pending_parts()
+    checkpoint.finish_part(0, ["m1"], ["m2"])
+    checkpoint.close()
+
+    resumed = ExportCheckpoint(path)
+    resumed.assign_parts(2)
+    resumed_parts = resumed.pending_parts()
+    try:
+        resumed.check_settings(query="in:inbox", format="jsonl")
+        refused = False
+    except ValueError:
+        refused = True
+    counts = resumed.counts()
+    resumed.close()
+    results = [
+        check("Listing is unfinished until the last page", listed_after_first == "0"),
+        check("Duplicate IDs are listed once", counts == (5, 1)),
+        check("Parts keep the listing order", parts == [(0, ["m1", "m2"]), (1, ["m3", "m4"]), (2, ["m5"])]),
+        check("Unfinished parts are redone and failed messages get a new part",
+              resumed_parts == [(1, ["m3", "m4"]), (2, ["m5"]), (3, ["m2"])]),
+        check("Resuming with other settings is refused", refused),
+    ]
+    return all(results)
+
+def test_rows():
+    """Metadata and raw messages become the same columns."""
+    print("\n🧪 Testing Rows")
+    print("=" * 50)
+
+    metadata = {
+        "id": "m1",
+        "threadId": "t1",
+        "labelIds": ["INBOX"],
+        "snippet": "Hello",
+        "internalDate": "1700000000000",
+        "sizeEstimate": 1234,
+        "payload": {"headers": [{"name": "From", "value": "a@example.com"}, {"name": "Subject", "value": "Hi"}]},
+    }
+    row, raw = export_row(metadata)
+    raw_row, raw_bytes = export_row(
+        {"id": "m2", "raw": base64.urlsafe_b64encode(RAW_MESSAGE).decode().rstrip("=")}
+    )
+    results = [
+        check("Headers are read from the payload", row["sender"] == "a@example.com" and row["subject"] == "Hi"),
+        check("Dates are integers", row["internal_date"] == 1700000000000),
+        check("Metadata rows have no body", row["body"] is None and raw is None),
+        check("Raw messages are parsed", raw_row["sender"] == "Alice <alice@example.com>" and raw_bytes == RAW_MESSAGE),
+        check("HTML bodies are reduced to text", raw_row["body"] == "From the team : numbers attached"),
+    ]
+    return all(results)
+
+def test_files(workdir):
+    """Part files are compressed JSON lines, and mbox files hold the raw messages."""
+    print("\n🧪 Testing Files")
+    print("=" * 50)
+
+    row, _ = export_row({"id": "m1", "raw": base64.urlsafe_b64encode(RAW_MESSAGE).decode()})
+    part_path = os.path.join(workdir, "part-00000.jsonl.gz")
+    JsonLinesWriter().write(part_path, [row])
+    with gzip.open(part_path, "rt", encoding="utf-8") as handle:
+        rows = [json.loads(line) for line in handle]
+    mbox_path = os.path.join(workdir, "part-00000.mbox")
+    write_mbox(mbox_path, [RAW_MESSAGE, RAW_MESSAGE])
+    box = mailbox.mbox(mbox_path)
+    messages = list(box)
+    box.close()
+    results = [
+        check("Rows round-trip", rows == [row]),
+        check("mbox holds every message", len(messages) == 2),
+        check("mbox keeps the body intact", "From the <b>team</b>" in messages[0].get_payload()),
+        check("Without pyarrow, auto falls back to JSON lines", resolve_format("auto") in ("parquet", "jsonl")),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Export Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = [test_checkpoint(workdir), test_rows(), test_files(workdir)]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All export tests passed!")
+    else:
+        print("⚠️ Some export tests failed.")
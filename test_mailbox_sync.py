@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test script for the local mailbox mirror.
+Runs full and incremental syncs against the fake Gmail backend and checks the
+stored floor and completeness, how history changes are applied, the fallback
+when history has expired and which queries the mirror may answer.
+"""
+
+import sys
+import os
+import itertools
+import json
+import tempfile
+
+# Add the project root and the benchmarks directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+
+from email_agent import agent
+from email_agent.accounts import Account
+from email_agent.quota import QuotaScheduler
+from fake_gmail import FakeGmailHttp, FakeMailbox
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+MIRROR_NUMBERS = itertools.count()
+
+def install(workdir, size):
+    """Points the agent at a fake mailbox of ``size`` messages with an empty mirror."""
+    mailbox = FakeMailbox(size, body_size=200)
+    http = FakeGmailHttp(mailbox)
+    scheduler = QuotaScheduler(units_per_second=1e9, max_retries=1, retry_delay=0.001, max_retry_delay=0.002)
+    account = Account("default", None, os.path.join(workdir, f"mirror-{next(MIRROR_NUMBERS)}.sqlite3"), scheduler=scheduler)
+    account.gmail_service = build_from_document(get_static_doc("gmail", "v1"), http=http)
+    agent.default_account = account
+    return account, mailbox, http
+
+def listed(mailbox, limit):
+    """The newest message IDs of the fake mailbox, Spam and Trash included, as a full sync lists them."""
+    return mailbox.search("", limit, include_spam_trash=True)
+
+def date_of(mailbox, message_id):
+    return int(mailbox.messages[message_id]["internalDate"])
+
+def test_full_sync(workdir):
+    """A full sync mirrors the newest messages and records how far back the mirror reaches."""
+    print("🧪 Testing Full Sync")
+    print("=" * 50)
+
+    account, mailbox, _ = install(workdir, 40)
+    agent.full_sync()
+    whole = {
+        "history_id": account.store.get_state("history_id"),
+        "complete": account.store.get_state("complete"),
+        "floor": account.store.get_state("floor"),
+        "labels": json.loads(account.store.get_state("labels")),
+        "mirrored": len(account.store.get_many(listed(mailbox, 40))),
+        "answered": agent.local_search("in:inbox", 5) == mailbox.search("in:inbox", 5),
+    }
+
+    limit = agent.MAILBOX_SYNC_LIMIT
+    agent.MAILBOX_SYNC_LIMIT = 20
+    try:
+        account, mailbox, _ = install(workdir, 40)
+        agent.full_sync()
+    finally:
+        agent.MAILBOX_SYNC_LIMIT = limit
+    newest = listed(mailbox, 20)
+    results = [
+        check("The history ID is stored", whole["history_id"] == str(mailbox.history_id)),
+        check("A mailbox listed to the end is complete", whole["complete"] == "1" and whole["floor"] == "0"),
+        check("Every message is mirrored", whole["mirrored"] == 40),
+        check("User labels are stored by name", whole["labels"]["receipts"] == "Label_1"),
+        check("The mirror answers queries", whole["answered"]),
+        check("A limited sync is not complete", account.store.get_state("complete") == "0"),
+        check("Its floor is the oldest message mirrored", account.store.get_state("floor") == str(date_of(mailbox, newest[-1]))),
+        check("Queries it can fill are answered", agent.local_search("", 10) == newest[:10]),
+        check("Queries reaching below the floor go to Gmail", agent.local_search("", 30) is None),
+    ]
+    return all(results)
+
+def test_fetch_gap(workdir):
+    """Messages that could not be fetched raise the floor above them."""
+    print("\n🧪 Testing Fetch Gap")
+    print("=" * 50)
+
+    account, mailbox, http = install(workdir, 30)
+    message_ids = listed(mailbox, 30)
+    http.unavailable = {message_ids[10]}
+    agent.full_sync()
+    results = [
+        check("The sync is not complete", account.store.get_state("complete") == "0"),
+        check("The floor is just after the newest message before the gap",
+              account.store.get_state("floor") == str(date_of(mailbox, message_ids[9]) + 1)),
+        check("Newer messages are answered locally", agent.local_search("", 5) == message_ids[:5]),
+        check("Queries reaching the gap go to Gmail", agent.local_search("", 15) is None),
+        check("Incremental syncs can carry on", account.store.get_state("history_id") == str(mailbox.history_id)),
+    ]
+    return all(results)
+
+def test_history(workdir):
+    """New, relabeled and deleted messages reach the mirror through the history API."""
+    print("\n🧪 Testing History")
+    print("=" * 50)
+
+    account, mailbox, http = install(workdir, 20)
+    agent.full_sync()
+    old = listed(mailbox, 20)
+    key = account.result_cache.make_key("in:inbox", 5)
+    account.result_cache.put(key, "cached", old[:5])
+    new = mailbox.add_message("New <new@example.com>", "me@example.com", "Hello", "Fresh mail", ("INBOX", "UNREAD"))
+    mailbox.modify_labels([old[0]], added=["STARRED"], removed=["UNREAD"])
+    mailbox.delete_messages([old[1]])
+    agent.sync_mailbox(force=True)
+    mirrored = account.store.get_many([new["id"], old[0], old[1]])
+
+    missing = mailbox.add_message("Late <late@example.com>", "me@example.com", "Later", "More", ("INBOX",))
+    http.unavailable = {missing["id"]}
+    before = account.store.get_state("history_id")
+    agent.sync_mailbox(force=True)
+    kept_back = account.store.get_state("history_id") == before and missing["id"] not in account.store.get_many([missing["id"]])
+    http.unavailable = set()
+    agent.sync_mailbox(force=True)
+    results = [
+        check("New messages are added", new["id"] in mirrored),
+        check("Added labels are applied", "STARRED" in mirrored[old[0]].label_ids),
+        check("Removed labels are applied", "UNREAD" not in mirrored[old[0]].label_ids),
+        check("Deleted messages are removed", old[1] not in mirrored),
+        check("Changes clear cached results", account.result_cache.get(key) is None),
+        check("A failed fetch keeps the old history ID", kept_back),
+        check("The next sync picks the message up", missing["id"] in account.store.get_many([missing["id"]])),
+        check("The history ID then moves on", account.store.get_state("history_id") == str(mailbox.history_id)),
+    ]
+    return all(results)
+
+def test_fallbacks(workdir):
+    """Expired history starts a new full sync; other errors are raised and retried next time."""
+    print("\n🧪 Testing Fallbacks")
+    print("=" * 50)
+
+    account, mailbox, http = install(workdir, 20)
+    agent.sync_mailbox(force=True)
+    account.full_sync_thread.join()
+    first = account.store.get_state("history_id") == str(mailbox.history_id)
+
+    mailbox.expire_history()
+    mailbox.add_message("New <new@example.com>", "me@example.com", "After expiry", "Mail", ("INBOX",))
+    agent.sync_mailbox(force=True)
+    account.full_sync_thread.join()
+    resynced = (
+        account.store.get_state("history_id") == str(mailbox.history_id)
+        and len(account.store.get_many(listed(mailbox, 21))) == 21
+    )
+
+    http.planned_errors = {"history.list": [400]}
+    try:
+        agent.sync_mailbox(force=True)
+        raised = False
+    except HttpError:
+        raised = True
+    http.planned_errors = {"history.list": [400]}
+    answered = agent.sync_and_search("", 5)
+    results = [
+        check("Without a history ID a full sync starts", first),
+        check("Expired history is replaced by a full sync", resynced),
+        check("Other history errors are raised", raised),
+        check("A failed sync is retried on the next call", account.last_sync == 0.0),
+        check("A stale mirror does not answer", answered is None),
+        check("The mirror answers again once synced", agent.sync_and_search("", 5) == listed(mailbox, 5)),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Mailbox Sync Test")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = [
+            test_full_sync(workdir),
+            test_fetch_gap(workdir),
+            test_history(workdir),
+            test_fallbacks(workdir),
+        ]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All mailbox sync tests passed!")
+    else:
+        print("⚠️ Some mailbox sync tests failed.")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact Message record.
+Checks header extraction, lazy body decoding and the mailbox store round trip.
+"""
+
+import sys
+import os
+import base64
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.message import Message
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+RESOURCE = {
+    "id": "m1",
+    "threadId": "t1",
+    "labelIds": ["INBOX", "UNREAD"],
+    "snippet": "See you at noon",
+    "internalDate": "1700000000000",
+    "payload": {
+        "mimeType": "multipart/alternative",
+        "headers": [
+            {"name": "SUBJECT", "value": "Lunch"},
+            {"name": "from", "value": "John <john@example.com>"},
+            {"name": "Subject", "value": "Ignored duplicate"},
+        ],
+        "parts": [
+            {"mimeType": "text/html", "body": {"data": "PGI-aGk8L2I-"}},
+            {
+                "mimeType": "text/plain",
+                "body": {"data": base64.urlsafe_b64encode("Lunch at noon? ☕".encode()).decode().rstrip("=")},
+            },
+        ],
+    },
+}
+
+def test_from_resource():
+    """Headers are matched case-insensitively and missing ones get defaults."""
+    print("🧪 Testing Resource Conversion")
+    print("=" * 50)
+
+    message = Message.from_resource(RESOURCE)
+    results = [
+        check("Subject uses the first matching header", message.subject == "Lunch"),
+        check("Sender is read", message.sender == "John <john@example.com>"),
+        check("Missing recipient defaults to empty", message.recipient == ""),
+        check("Internal date is an integer", message.internal_date == 1700000000000),
+        check("Labels are kept", message.label_ids == ("INBOX", "UNREAD")),
+        check("No body unless asked for", not message.has_body and message.body == ""),
+        check("No per-instance dict", not hasattr(message, "__dict__")),
+    ]
+    return all(results)
+
+def test_lazy_body():
+    """The plain-text body is decoded on first access only."""
+    print("\n🧪 Testing Lazy Body")
+    print("=" * 50)
+
+    message = Message.from_resource(RESOURCE, include_body=True)
+    size = message.text_size()
+    results = [
+        check("Body is held encoded until read", message._body is None and message.has_body),
+        check("Sizing does not decode the body", message._body is None and size > 0),
+        check("Plain-text part is decoded", message.body == "Lunch at noon? ☕"),
+        check("Decoded body replaces the encoded data", message._body_data is None),
+    ]
+
+    html_only = dict(RESOURCE, payload={"mimeType": "text/html", "body": {"data": "PGI-aGk8L2I-"}})
+    message = Message.from_resource(html_only, include_body=True)
+    results.append(check("HTML-only body is left to the caller", not message.has_body))
+    message.body = "hi"
+    results.append(check("Body can be set", message.has_body and message.body == "hi"))
+    return all(results)
+
+def test_record_round_trip():
+    """A message survives conversion to and from a mailbox store row."""
+    print("\n🧪 Testing Store Round Trip")
+    print("=" * 50)
+
+    message = Message.from_resource(RESOURCE)
+    restored = Message.from_record(message.to_record())
+    return check("Record round trip is lossless", restored == message)
+
+if __name__ == "__main__":
+    print("🚀 Message Record Test")
+    print("=" * 60)
+
+    passed = [test_from_resource(), test_lazy_body(), test_record_round_trip()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All message tests passed!")
+    else:
+        print("⚠️ Some message tests failed.")
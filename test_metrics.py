@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for tool and Gmail API instrumentation.
+Checks counters, histograms, the Prometheus output, tool error accounting and
+how spans link a turn to its tool and API calls.
+"""
+
+import sys
+import os
+import asyncio
+import json
+import urllib.request
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent import metrics
+from email_agent.metrics import MetricsRegistry, api_call, instrument_tool, span
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"<HttpError {status}>")
+        self.status = status
+
+def test_registry():
+    """Counters and histograms render in the Prometheus text format."""
+    print("🧪 Testing Registry")
+    print("=" * 50)
+
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls.", ("method",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("method",))
+    calls.inc(method="list")
+    calls.inc(2, method="list")
+    latency.observe(0.02, method="list")
+    latency.observe(3.0, method="list")
+    text = registry.render()
+    results = [
+        check("Counter adds up", calls.value(method="list") == 3),
+        check("Counter is rendered", 'calls_total{method="list"} 3' in text),
+        check("Buckets are cumulative", 'latency_seconds_bucket{method="list",le="0.025"} 1' in text
+              and 'latency_seconds_bucket{method="list",le="5.0"} 2' in text),
+        check("Count and sum are rendered", 'latency_seconds_count{method="list"} 2' in text),
+        check("Types are declared", "# TYPE latency_seconds histogram" in text),
+        check("Same name returns the same metric", registry.counter("calls_total", "Calls.", ("method",)) is calls),
+    ]
+    return all(results)
+
+def test_tools():
+    """Tool calls are counted, and error strings are counted by HTTP status."""
+    print("\n🧪 Testing Tool Instrumentation")
+    print("=" * 50)
+
+    @instrument_tool
+    def lookup(message_id: str):
+        """Looks a message up."""
+        if message_id == "missing":
+            return "An error occurred: <HttpError 404 when requesting ...>"
+        return "found"
+
+    @instrument_tool
+    async def lookup_async(message_id: str):
+        return "found"
+
+    lookup("m1")
+    lookup("missing")
+    asyncio.run(lookup_async("m1"))
+    results = [
+        check("Name and docstring are kept", lookup.__name__ == "lookup" and lookup.__doc__ == "Looks a message up."),
+        check("Successful calls are counted", metrics.tool_calls.value(tool="lookup", outcome="ok") == 1),
+        check("Error strings are counted", metrics.tool_calls.value(tool="lookup", outcome="error") == 1),
+        check("Errors are split by status", metrics.tool_errors.value(tool="lookup", status="404") == 1),
+        check("Async tools are counted", metrics.tool_calls.value(tool="lookup_async", outcome="ok") == 1),
+    ]
+    return all(results)
+
+def test_traces():
+    """API calls are nested under the tool call and turn that made them."""
+    print("\n🧪 Testing Traces")
+    print("=" * 50)
+
+    @instrument_tool
+    def fetch():
+        with api_call("messages.get", units=5) as call:
+            call.received = 120
+        try:
+            with api_call("messages.get", units=5):
+                raise FakeHttpError(503)
+        except FakeHttpError:
+            pass
+        return "done"
+
+    with span("turn", intent="read"):
+        fetch()
+
+    trace = metrics.recent_traces(limit=1)[0]
+    spans = {item["name"]: item for item in trace["spans"]}
+    gets = [item for item in trace["spans"] if item["name"] == "gmail.messages.get"]
+    results = [
+        check("Turn is the root", spans["turn"]["parent_id"] is None),
+        check("Tool is under the turn", spans["tool.fetch"]["parent_id"] == spans["turn"]["span_id"]),
+        check("API calls are under the tool", all(item["parent_id"] == spans["tool.fetch"]["span_id"] for item in gets)),
+        check("Statuses are recorded", [item["attributes"]["status"] for item in gets] == ["200", "503"]),
+        check("Failed calls are counted by status", metrics.api_calls.value(method="messages.get", status="503") == 1),
+        check("Quota units are counted", metrics.quota_units.value(method="messages.get") == 10),
+        check("Bytes are counted", metrics.bytes_received.value(method="messages.get") == 120),
+    ]
+    return all(results)
+
+def test_endpoint():
+    """The local server serves metrics and traces."""
+    print("\n🧪 Testing Endpoint")
+    print("=" * 50)
+
+    server = metrics.start_metrics_server(0)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        text = urllib.request.urlopen(f"{base}/metrics").read().decode()
+        traces = json.loads(urllib.request.urlopen(f"{base}/traces").read())
+    finally:
+        server.shutdown()
+    results = [
+        check("/metrics serves Prometheus text", "# TYPE gmail_api_calls_total counter" in text),
+        check("/traces serves JSON", isinstance(traces, list) and bool(traces)),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Metrics Test")
+    print("=" * 60)
+
+    passed = [test_registry(), test_tools(), test_traces(), test_endpoint()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All metrics tests passed!")
+    else:
+        print("⚠️ Some metrics tests failed.")
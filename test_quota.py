@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for the Gmail quota scheduler.
+Checks which failures are retried, how long the scheduler waits between
+attempts, Retry-After handling and that sends are not repeated after a 5xx.
+"""
+
+import sys
+import os
+import email.utils
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from email_agent.quota import QuotaScheduler, parse_retry_after, quota_cost
+
+RATE_LIMITED = b'{"error": {"code": 403, "errors": [{"reason": "rateLimitExceeded"}]}}'
+FORBIDDEN = b'{"error": {"code": 403, "errors": [{"reason": "insufficientPermissions"}]}}'
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def make_error(status, content=b"{}", retry_after=None):
+    headers = {"status": str(status)}
+    if retry_after is not None:
+        headers["retry-after"] = retry_after
+    return HttpError(httplib2.Response(headers), content)
+
+class FlakyRequest:
+    """A request that fails with the given errors, in order, before it succeeds."""
+
+    def __init__(self, *errors, method_id="gmail.users.messages.list"):
+        self.errors = list(errors)
+        self.methodId = method_id
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"ok": True}
+
+def make_scheduler(max_retries=5):
+    return QuotaScheduler(units_per_second=1e9, max_retries=max_retries, retry_delay=0.001, max_retry_delay=0.002)
+
+def run(scheduler, request, idempotent=True):
+    try:
+        return scheduler.execute(request, idempotent=idempotent)
+    except HttpError as error:
+        return error.resp.status
+
+def test_retries():
+    """Rate limits and server errors are retried until the call succeeds or retries run out."""
+    print("🧪 Testing Retries")
+    print("=" * 50)
+
+    scheduler = make_scheduler(max_retries=3)
+    transient = FlakyRequest(make_error(429), make_error(503), make_error(500))
+    rate_limited = FlakyRequest(make_error(403, RATE_LIMITED))
+    forbidden = FlakyRequest(make_error(403, FORBIDDEN))
+    missing = FlakyRequest(make_error(404))
+    exhausted = FlakyRequest(*[make_error(503) for _ in range(4)])
+    results = [
+        check("429 and 5xx are retried", run(scheduler, transient) == {"ok": True} and transient.calls == 4),
+        check("403 rateLimitExceeded is retried", run(scheduler, rate_limited) == {"ok": True} and rate_limited.calls == 2),
+        check("Other 403s are not retried", run(scheduler, forbidden) == 403 and forbidden.calls == 1),
+        check("404 is not retried", run(scheduler, missing) == 404 and missing.calls == 1),
+        check("The last error is raised once retries run out", run(scheduler, exhausted) == 503 and exhausted.calls == 4),
+        check("Retries are counted", scheduler.stats()["retries"] == 7),
+    ]
+    return all(results)
+
+def test_sends():
+    """A send that failed with a 5xx is not repeated, but a rate-limited one is."""
+    print("\n🧪 Testing Non-Idempotent Calls")
+    print("=" * 50)
+
+    scheduler = make_scheduler()
+    failed = FlakyRequest(make_error(503), method_id="gmail.users.messages.send")
+    limited = FlakyRequest(make_error(429), method_id="gmail.users.messages.send")
+    results = [
+        check("5xx is not retried for sends", run(scheduler, failed, idempotent=False) == 503 and failed.calls == 1),
+        check("429 is retried for sends", run(scheduler, limited, idempotent=False) == {"ok": True} and limited.calls == 2),
+        check("Rate-limit 403s are retried for sends", scheduler.is_retryable(403, RATE_LIMITED, idempotent=False)),
+        check("Sends are charged their quota cost", quota_cost(failed) == 100),
+    ]
+    return all(results)
+
+def test_backoff():
+    """Waits grow exponentially with jitter, and Retry-After takes precedence."""
+    print("\n🧪 Testing Backoff")
+    print("=" * 50)
+
+    scheduler = QuotaScheduler(units_per_second=1e9, retry_delay=1, max_retry_delay=8)
+    first = [scheduler.backoff(0) for _ in range(200)]
+    capped = [scheduler.backoff(10) for _ in range(200)]
+    future = email.utils.formatdate(time.time() + 30, usegmt=True)
+    past = email.utils.formatdate(time.time() - 30, usegmt=True)
+    slow = FlakyRequest(make_error(429, retry_after="0.2"))
+    started = time.monotonic()
+    make_scheduler().execute(slow)
+    waited = time.monotonic() - started
+    results = [
+        check("The first wait is at most the base delay", max(first) <= 1 and min(first) >= 0),
+        check("Waits are jittered", len(set(first)) > 1),
+        check("Waits stop growing at the ceiling", max(capped) <= 8 and max(capped) > 1),
+        check("Retry-After in seconds is honoured", scheduler.backoff(3, "7") == 7.0),
+        check("Retry-After as a date is honoured", 25 < parse_retry_after(future) <= 30),
+        check("A date in the past means no wait", parse_retry_after(past) == 0.0),
+        check("Invalid Retry-After values are ignored", parse_retry_after("soon") is None and parse_retry_after("") is None),
+        check("execute waits as long as Retry-After says", waited >= 0.2 and slow.calls == 2),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Quota Test")
+    print("=" * 60)
+
+    passed = [test_retries(), test_sends(), test_backoff()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All quota tests passed!")
+    else:
+        print("⚠️ Some quota tests failed.")
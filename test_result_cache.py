@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the read_emails result cache.
+Checks hits and misses, TTL expiry, LRU eviction, negative caching and invalidation.
+"""
+
+import sys
+import os
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.result_cache import ResultCache
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def test_hits_and_misses():
+    """Repeated reads of the same (normalized) query are served from the cache."""
+    print("🧪 Testing Cache Hits")
+    print("=" * 50)
+
+    cache = ResultCache(max_entries=10, ttl=60, negative_ttl=60)
+    key = cache.make_key("from:john  subject:Meeting", 5)
+    cache.put(key, "summary", ["m1", "m2"])
+
+    results = [
+        check("Miss for an unknown query", cache.get(cache.make_key("in:inbox", 5)) is None),
+        check("Hit for the same query", cache.get(key) == "summary"),
+        check(
+            "Hit when only case and spacing differ",
+            cache.get(cache.make_key("FROM:john subject:meeting", 5)) == "summary",
+        ),
+        check("Miss for a different count", cache.get(cache.make_key("from:john subject:meeting", 10)) is None),
+        check("Counters are tracked", cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2),
+    ]
+    return all(results)
+
+def test_expiry_and_eviction():
+    """Entries expire after their TTL and the least recently used entry is evicted first."""
+    print("\n🧪 Testing Expiry and Eviction")
+    print("=" * 50)
+
+    cache = ResultCache(max_entries=2, ttl=60)
+    cache.put(("a", 5), "A", ["m1"])
+    cache.put(("b", 5), "B", ["m2"])
+    cache.get(("a", 5))
+    cache.put(("c", 5), "C", ["m3"])
+    results = [
+        check("Least recently used entry is evicted", cache.get(("b", 5)) is None),
+        check("Recently used entry is kept", cache.get(("a", 5)) == "A"),
+    ]
+
+    cache = ResultCache(max_entries=10, ttl=0.2, negative_ttl=0.05)
+    cache.put(("full", 5), "Emails", ["m1"])
+    cache.put(("empty", 5), "No emails")
+    time.sleep(0.1)
+    results.append(check("Negative result expires sooner", cache.get(("empty", 5)) is None))
+    results.append(check("Positive result is still fresh", cache.get(("full", 5)) == "Emails"))
+    time.sleep(0.15)
+    results.append(check("Positive result expires after its TTL", cache.get(("full", 5)) is None))
+    return all(results)
+
+def test_invalidation():
+    """Deleting a message only drops the results that contained it."""
+    print("\n🧪 Testing Invalidation")
+    print("=" * 50)
+
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.put(("a", 5), "A", ["m1", "m2"])
+    cache.put(("b", 5), "B", ["m3"])
+    cache.invalidate(["m2"])
+    results = [
+        check("Entry showing the deleted message is dropped", cache.get(("a", 5)) is None),
+        check("Unrelated entry is kept", cache.get(("b", 5)) == "B"),
+    ]
+    cache.invalidate()
+    results.append(check("Full invalidation clears everything", cache.stats()["size"] == 0))
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Result Cache Test")
+    print("=" * 60)
+
+    passed = [test_hits_and_misses(), test_expiry_and_eviction(), test_invalidation()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All cache tests passed!")
+    else:
+        print("⚠️ Some cache tests failed.")
@@ -41,6 +41,10 @@ def test_intent_analysis():
         ("save this message as draft", "draft"),
         ("draft an email to the client", "draft"),
         
+        # Modify intents
+        ("mark all emails as read", "modify"),
+        ("archive the old messages", "modify"),
+        
         # General intents
         ("help me with email", "general"),
         ("what can you do?", "general"),
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the local search index.
+Checks Gmail query parsing, operator matching, hidden labels and incremental updates.
+"""
+
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.message import Message
+from email_agent.search_index import SearchIndex, parse_date, parse_query
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+DAY = 86400 * 1000
+JAN_10 = parse_date("2024/01/10")
+
+MESSAGES = [
+    Message("m1", None, JAN_10 + 1 * DAY, ["INBOX", "UNREAD"], "John Doe <john.doe@example.com>",
+            "me@example.com", "Meeting tomorrow", "Let's meet at noon"),
+    Message("m2", None, JAN_10 + 2 * DAY, ["INBOX", "Label_7"], "Sarah <sarah@company.com>",
+            "me@example.com", "Quarterly report", "The report is attached"),
+    Message("m3", None, JAN_10 + 3 * DAY, ["SENT"], "me", "john.doe@example.com",
+            "Re: Meeting tomorrow", "Sounds good"),
+    Message("m4", None, JAN_10 + 4 * DAY, ["SPAM"], "Prize <win@spam.example>",
+            "me@example.com", "You won a meeting", "Claim now"),
+]
+
+def search(index, query, limit=10):
+    return index.search(parse_query(query, {"work": "Label_7"}, approximate=True), limit)
+
+def test_operators():
+    """Each supported operator selects the same messages Gmail would."""
+    print("🧪 Testing Operators")
+    print("=" * 50)
+
+    index = SearchIndex()
+    for message in MESSAGES:
+        index.add(message)
+    results = [
+        check("from: by name", search(index, "from:john") == ["m1"]),
+        check("from: by full address", search(index, "from:john.doe@example.com") == ["m1"]),
+        check("from: by domain", search(index, "from:company.com") == ["m2"]),
+        check("to: matches recipients", search(index, "to:john.doe@example.com") == ["m3"]),
+        check("subject: newest first", search(index, "subject:meeting") == ["m3", "m1"]),
+        check("Free text matches snippets", search(index, "attached") == ["m2"]),
+        check("is:unread", search(index, "is:unread") == ["m1"]),
+        check("-is:unread", search(index, "in:inbox -is:unread") == ["m2"]),
+        check("label: by user label name", search(index, "label:work") == ["m2"]),
+        check("after: and before:", search(index, "after:2024/01/12 before:2024/01/14") == ["m3", "m2"]),
+        check("Negated words", search(index, "meeting -from:me") == ["m1"]),
+        check("Spam is hidden by default", "m4" not in search(index, "meeting")),
+        check("in:spam shows spam", search(index, "in:spam") == ["m4"]),
+        check("Limit keeps the newest", search(index, "", limit=2) == ["m3", "m2"]),
+    ]
+    return all(results)
+
+def test_unsupported_queries():
+    """Queries the index cannot evaluate are left to Gmail."""
+    print("\n🧪 Testing Fallback")
+    print("=" * 50)
+
+    unsupported = [
+        "from:john OR from:sarah",
+        "has:attachment",
+        "subject:(meeting report)",
+        '"quarterly report"',
+        "label:unknown-label",
+        "older_than:1y",
+        "attached",
+        "to:john.doe@example.com",
+        "meeting -from:me",
+    ]
+    results = [
+        check(f"Falls back for '{query}'", parse_query(query, {}) is None)
+        for query in unsupported
+    ]
+    return all(results)
+
+def test_incremental_updates():
+    """Adding, relabeling and removing messages is reflected immediately."""
+    print("\n🧪 Testing Incremental Updates")
+    print("=" * 50)
+
+    index = SearchIndex()
+    for message in MESSAGES:
+        index.add(message)
+    index.set_labels("m1", ["INBOX"])
+    results = [check("Relabel is applied", search(index, "is:unread") == [])]
+    index.remove(["m2"])
+    results.append(check("Removed message is gone", search(index, "report") == []))
+    index.add(Message("m5", None, JAN_10 + 5 * DAY, ["INBOX"], "Sarah <sarah@company.com>",
+                      "me", "New report", "Draft v2"))
+    results.append(check("New message is found", search(index, "report") == ["m5"]))
+    results.append(check("Old tokens of a replaced message are dropped", len(index) == 4))
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Search Index Test")
+    print("=" * 60)
+
+    passed = [test_operators(), test_unsupported_queries(), test_incremental_updates()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All search index tests passed!")
+    else:
+        print("⚠️ Some search index tests failed.")
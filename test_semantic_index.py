@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the topic index behind search_emails.
+Checks ranking, word normalization, hidden labels, incremental updates and
+that the mirror keeps the index in step with its changes.
+"""
+
+import sys
+import os
+import tempfile
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent import semantic_index
+from email_agent.mailbox_store import MailboxStore
+from email_agent.message import Message
+from email_agent.semantic_index import SemanticIndex, stem, text_buckets
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def make_message(message_id, subject, snippet, labels=("INBOX",), body=None):
+    return Message(message_id, None, 1700000000000, labels, "Team <team@example.com>",
+                   "me@example.com", subject, snippet, body)
+
+MESSAGES = [
+    make_message("m1", "Q3 travel budget overrun", "We overspent the travel budget by 20%"),
+    make_message("m2", "Lunch on Friday", "Shall we try the new place downtown?"),
+    make_message("m3", "Budget review", "Numbers for next year are attached"),
+    make_message("m4", "Invoices overdue", "Two invoices from the supplier are still unpaid"),
+    make_message("m5", "Win a budget holiday", "Claim your prize now", labels=("SPAM",)),
+]
+
+def ids(results):
+    return [message_id for message_id, _ in results]
+
+def test_ranking():
+    """Messages are ranked by how much of the description they share."""
+    print("🧪 Testing Ranking")
+    print("=" * 50)
+
+    index = SemanticIndex()
+    index.add(MESSAGES)
+    results = index.search("the email about the budget overrun", 10)
+    results = [
+        check("The closest message comes first", ids(results)[0] == "m1"),
+        check("Partial matches follow", ids(results) == ["m1", "m3"]),
+        check("Scores are cosine similarities", 0 < results[-1][1] < results[0][1] <= 1),
+        check("Plural and singular match", ids(index.search("unpaid invoice", 5)) == ["m4"]),
+        check("Endings are stripped", stem("budgets") == "budget" and stem("meeting") == "meet"),
+        check("Stop words are not searched", text_buckets("the of and") == []),
+        check("Unrelated descriptions find nothing", index.search("quantum physics", 5) == []),
+        check("The limit is respected", len(index.search("budget", 1)) == 1),
+    ]
+    return all(results)
+
+def test_updates():
+    """New, relabeled, removed and newly read messages are reflected in searches."""
+    print("\n🧪 Testing Updates")
+    print("=" * 50)
+
+    index = SemanticIndex()
+    index.add(MESSAGES)
+    hidden = "m5" not in ids(index.search("budget holiday prize", 5))
+    index.add([make_message("m6", "Overrun on the office budget", "Facilities went over")])
+    appended = set(ids(index.search("budget overrun", 5))[:2]) == {"m1", "m6"}
+    index.set_labels("m1", ["TRASH"])
+    trashed = "m1" not in ids(index.search("budget overrun", 5))
+    index.set_labels("m1", ["INBOX"])
+    restored = "m1" in ids(index.search("budget overrun", 5))
+    index.add([make_message("m2", "Lunch on Friday", "Shall we", body="Let us discuss the hackathon")])
+    body_found = ids(index.search("hackathon", 5)) == ["m2"] and len(index) == 6
+    index.remove(["m1", "m3", "m4", "m6"])
+    remaining = ids(index.search("budget overrun", 5))
+    results = [
+        check("Spam is not searched", hidden),
+        check("Appended messages are found", appended),
+        check("Trashed messages are hidden", trashed),
+        check("Restored messages come back", restored),
+        check("A body read later is indexed", body_found),
+        check("Removed messages are gone after compaction", remaining == [] and len(index) == 2),
+        check("Survivors are still found", ids(index.search("lunch friday", 5)) == ["m2"]),
+    ]
+    return all(results)
+
+def test_merging():
+    """Searches give the same answer before and after the new rows are merged."""
+    print("\n🧪 Testing Merging")
+    print("=" * 50)
+
+    minimum = semantic_index.MERGE_MIN_TERMS
+    semantic_index.MERGE_MIN_TERMS = 20
+    try:
+        index = SemanticIndex()
+        index.add(MESSAGES[:2])
+        index.add(MESSAGES[2:])
+        merged = ids(index.search("budget", 5))
+        index.add([make_message("m7", "Budget", "Budget")])
+        results = [
+            check("Merged messages are found", set(merged) == {"m1", "m3"}),
+            check("Rows added after a merge rank with the rest", ids(index.search("budget", 5))[0] == "m7"),
+        ]
+    finally:
+        semantic_index.MERGE_MIN_TERMS = minimum
+    return all(results)
+
+def test_mirror():
+    """The mirror builds the index on first use and keeps it in step."""
+    print("\n🧪 Testing Mirror")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = MailboxStore(os.path.join(workdir, "mirror.sqlite3"))
+        store.upsert(MESSAGES)
+        built = ids(store.semantic.search("budget overrun", 1)) == ["m1"]
+        store.update_labels("m1", added=["TRASH"])
+        trashed = "m1" not in ids(store.semantic.search("budget overrun", 5))
+        store.delete(["m3"])
+        store.upsert([make_message("m8", "Supplier invoice", "Invoice attached")])
+        results = [
+            check("The index is built from the mirror", built),
+            check("Label changes reach the index", trashed),
+            check("Deletions reach the index", "m3" not in ids(store.semantic.search("budget", 5))),
+            check("New mail reaches the index", ids(store.semantic.search("invoice", 1)) == ["m8"]),
+        ]
+        store.clear()
+        results.append(check("Clearing the mirror clears the index", len(store.semantic) == 0))
+        store.close()
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Semantic Index Test")
+    print("=" * 60)
+
+    passed = [test_ranking(), test_updates(), test_merging(), test_mirror()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All semantic index tests passed!")
+    else:
+        print("⚠️ Some semantic index tests failed.")
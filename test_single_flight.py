@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for request coalescing.
+Checks that concurrent identical reads share one call, in threads and on an
+event loop, and that calls which do not overlap are made again.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.single_flight import SingleFlight, coalesced_calls
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+class SlowCall:
+    """A Gmail call that takes a while, counting how often it is made."""
+
+    def __init__(self, result=None, error=None, delay=0.1):
+        self.result = result
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def run_async(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+def run_threads(count, target):
+    outcomes = [None] * count
+
+    def run(index):
+        try:
+            outcomes[index] = target()
+        except Exception as error:
+            outcomes[index] = error
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_threads():
+    """Threads asking for the same read while it is in flight share its result."""
+    print("🧪 Testing Threads")
+    print("=" * 50)
+
+    flights = SingleFlight()
+    call = SlowCall(result={"messages": [{"id": "m1"}]})
+    before = coalesced_calls.value(method="messages.list")
+    outcomes = run_threads(8, lambda: flights.do(("GET", "messages?q=x"), "messages.list", call))
+    shared_calls = call.calls
+    other = SlowCall(result={"id": "m2"})
+    flights.do(("GET", "messages/m2"), "messages.get", other)
+    again = flights.do(("GET", "messages?q=x"), "messages.list", call)
+    results = [
+        check("One call is made for eight readers", shared_calls == 1 and flights.coalesced == 7),
+        check("Every reader gets the same result", all(outcome is outcomes[0] for outcome in outcomes)),
+        check("The metric counts coalesced calls by method",
+              coalesced_calls.value(method="messages.list") - before == 7),
+        check("Different keys are not coalesced", other.calls == 1),
+        check("Finished calls are not cached", again == call.result and call.calls == 2),
+    ]
+    return all(results)
+
+def test_errors():
+    """A failed call fails every reader that joined it, and the next reader tries again."""
+    print("\n🧪 Testing Errors")
+    print("=" * 50)
+
+    flights = SingleFlight()
+    failing = SlowCall(error=ConnectionResetError("Connection reset by peer"))
+    outcomes = run_threads(4, lambda: flights.do(("GET", "messages"), "messages.list", failing))
+    flight, leader = flights.join(("GET", "threads/t1"), "threads.get")
+    flights.land(("GET", "threads/t1"), flight, error=KeyboardInterrupt())
+    try:
+        flight.wait()
+        interrupted = False
+    except RuntimeError:
+        interrupted = True
+    retried = flights.do(("GET", "messages"), "messages.list", lambda: "ok")
+    results = [
+        check("The error reaches every reader", all(isinstance(o, ConnectionResetError) for o in outcomes)),
+        check("The failing call is made once", failing.calls == 1),
+        check("Interruptions are not passed to other readers", leader and interrupted),
+        check("The next reader makes a new call", retried == "ok"),
+    ]
+    return all(results)
+
+async def async_readers(flights, call):
+    key = ("GET", "messages/m1")
+    readers = [asyncio.ensure_future(flights.do_async(key, "messages.get", call.run_async)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    readers[0].cancel()
+    outcomes = await asyncio.gather(*readers, return_exceptions=True)
+    return outcomes
+
+def test_event_loop():
+    """Coroutines share one call, and a reader that gives up does not cancel it."""
+    print("\n🧪 Testing Event Loop")
+    print("=" * 50)
+
+    flights = SingleFlight()
+    call = SlowCall(result={"id": "m1"}, delay=0.05)
+    outcomes = asyncio.run(async_readers(flights, call))
+    results = [
+        check("One call is made for five readers", call.calls == 1 and flights.coalesced == 4),
+        check("The cancelled reader stops waiting", isinstance(outcomes[0], asyncio.CancelledError)),
+        check("The other readers still get the result", all(outcome == {"id": "m1"} for outcome in outcomes[1:])),
+        check("Finished calls are forgotten", not flights._tasks),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Single Flight Test")
+    print("=" * 60)
+
+    passed = [test_threads(), test_errors(), test_event_loop()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All single flight tests passed!")
+    else:
+        print("⚠️ Some single flight tests failed.")
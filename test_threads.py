@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for conversation views.
+Checks how quoted history is collapsed, how list results are grouped by
+thread and which messages of a long thread are shown.
+"""
+
+import sys
+import os
+import json
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.message import Message
+from email_agent.threads import collapse_quoted, collapse_quoted_snippet, group_by_thread
+from email_agent.tool_output import fit_messages, fit_thread
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def make_message(number, thread, body=""):
+    return Message(
+        id=f"m{number}",
+        thread_id=thread,
+        internal_date=1700000000000 + number * 60000,
+        label_ids=("INBOX",),
+        sender=f"sender{number % 2}@example.com",
+        subject="Budget",
+        snippet=f"Snippet {number}",
+        body=body,
+    )
+
+def test_quoted_history():
+    """Replies keep only what they added to the conversation."""
+    print("🧪 Testing Quoted History")
+    print("=" * 50)
+
+    gmail_reply = (
+        "Yes, 10% works.\n\n"
+        "On Mon, 4 Mar 2024 at 10:02, Alice <alice@example.com>\n"
+        "wrote:\n"
+        "> Can we cut travel by 10%?\n"
+        ">\n"
+    )
+    outlook_reply = (
+        "Agreed.\n\n"
+        "From: Bob <bob@example.com>\n"
+        "Sent: Monday, March 4, 2024 10:02 AM\n"
+        "Subject: Budget\n\n"
+        "Old text"
+    )
+    inline_reply = "> Can we cut travel?\nYes.\n> And hotels?\nNo."
+    results = [
+        check("Wrapped attributions end the reply", collapse_quoted(gmail_reply) == ("Yes, 10% works.", 4)),
+        check("Outlook headers end the reply", collapse_quoted(outlook_reply)[0] == "Agreed."),
+        check("Original-message separators end the reply",
+              collapse_quoted("Fine.\n-----Original Message-----\nFrom: x")[0] == "Fine."),
+        check("Inline quotes are dropped, answers kept", collapse_quoted(inline_reply) == ("Yes.\nNo.", 2)),
+        check("Ordinary lines starting with On or From: are kept",
+              collapse_quoted("On reflection, no.\nFrom: the whole team")[1] == 0),
+        check("Snippets are cut at the attribution",
+              collapse_quoted_snippet("Sounds good. On Mon, Mar 4, 2024 Alice &lt;a@b.c&gt; wrote: &gt; Can")
+              == "Sounds good."),
+    ]
+    return all(results)
+
+def test_grouping():
+    """List results show one record per thread, with its older matches under it."""
+    print("\n🧪 Testing Grouping")
+    print("=" * 50)
+
+    messages = [make_message(5, "t1"), make_message(4, "t2"), make_message(3, "t1"), make_message(2, None)]
+    threads = group_by_thread(messages)
+    earlier = {thread[0].id: [message.id for message in thread[1:]] for thread in threads}
+    lines, shown = fit_messages([thread[0] for thread in threads], 2000, earlier=earlier)
+    records = [json.loads(line) for line in lines]
+    results = [
+        check("Threads keep the order they first appear in", [len(thread) for thread in threads] == [2, 1, 1]),
+        check("Messages without a thread stand alone", threads[2][0].id == "m2"),
+        check("The newest match leads its thread", records[0]["id"] == "m5" and records[0]["thread"] == "t1"),
+        check("Older matches are listed under it", records[0]["earlier"] == ["m3"]),
+        check("Single matches have no earlier list", "earlier" not in records[1] and shown == 3),
+    ]
+    return all(results)
+
+def test_thread_budget():
+    """Long threads show their newest messages, oldest first."""
+    print("\n🧪 Testing Thread Budget")
+    print("=" * 50)
+
+    entries = [(make_message(number, "t1"), "x" * 1000, 3) for number in range(20)]
+    lines, shown = fit_thread(entries, 1000)
+    records = [json.loads(line) for line in lines]
+    short_lines, short_shown = fit_thread(entries[:2], 1000)
+    results = [
+        check("Older messages are left out first", 0 < shown < 20 and records[-1]["id"] == "m19"),
+        check("Messages stay in conversation order", [r["id"] for r in records] == [f"m{n}" for n in range(20 - shown, 20)]),
+        check("The budget is respected", sum(len(line) + 1 for line in lines) <= 1000 * 4),
+        check("Quoted line counts are shown", records[0]["quoted"] == 3),
+        check("Short threads are shown whole", short_shown == 2 and json.loads(short_lines[0])["text"] == "x" * 1000),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Thread Test")
+    print("=" * 60)
+
+    passed = [test_quoted_history(), test_grouping(), test_thread_budget()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All thread tests passed!")
+    else:
+        print("⚠️ Some thread tests failed.")
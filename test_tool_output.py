@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for budgeted tool output.
+Checks the compact records, how bodies share the token budget, which messages
+are held back and how continuation handles behave.
+"""
+
+import sys
+import os
+import json
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_agent.message import Message
+from email_agent.tool_output import (
+    CHARS_PER_TOKEN,
+    MIN_BODY_CHARS,
+    ContinuationStore,
+    estimate_tokens,
+    fit_messages,
+    message_record,
+    share_budget,
+)
+
+def check(description, condition):
+    status = "✅" if condition else "❌"
+    print(f"{status} {description}")
+    return condition
+
+def make_message(number, body=""):
+    return Message(
+        id=f"m{number}",
+        thread_id=f"t{number}",
+        internal_date=1700000000000 + number,
+        label_ids=("INBOX", "UNREAD") if number % 2 else ("INBOX",),
+        sender=f"sender{number}@example.com",
+        recipient="me@example.com",
+        subject=f"Subject {number}",
+        snippet=f"Snippet {number}",
+        body=body,
+    )
+
+def test_records():
+    """Records are short, compact JSON lines."""
+    print("🧪 Testing Records")
+    print("=" * 50)
+
+    record = message_record(make_message(1))
+    lines, shown = fit_messages([make_message(1)], 2000)
+    results = [
+        check("Date is shown in UTC", record["date"] == "2023-11-14 22:13"),
+        check("Unread is flagged", record.get("unread") is True),
+        check("Body is left out unless asked for", "body" not in record),
+        check("Lines are valid JSON", json.loads(lines[0])["id"] == "m1" and shown == 1),
+        check("Lines are compact", ", " not in lines[0] and '": ' not in lines[0]),
+        check("Tokens are estimated from characters", estimate_tokens("x" * 9) == 3),
+    ]
+    return all(results)
+
+def test_budget():
+    """Messages beyond the budget are held back whole."""
+    print("\n🧪 Testing Budget")
+    print("=" * 50)
+
+    messages = [make_message(number) for number in range(100)]
+    lines, shown = fit_messages(messages, 500)
+    tiny_lines, tiny_shown = fit_messages(messages, 1)
+    results = [
+        check("Only some messages fit", 0 < shown < 100 and len(lines) == shown),
+        check("Lines stay within the budget", len("\n".join(lines)) <= 500 * CHARS_PER_TOKEN),
+        check("The newest messages are kept", json.loads(lines[0])["id"] == "m0"),
+        check("One message is always shown", tiny_shown == 1 and len(tiny_lines) == 1),
+    ]
+    return all(results)
+
+def test_bodies():
+    """Long bodies are shortened before messages are held back."""
+    print("\n🧪 Testing Bodies")
+    print("=" * 50)
+
+    short = make_message(1, body="short body")
+    long = make_message(2, body="x" * 20000)
+    lines, shown = fit_messages([short, long], 1000, include_body=True)
+    records = [json.loads(line) for line in lines]
+    many = [make_message(number, body="y" * 5000) for number in range(50)]
+    many_lines, many_shown = fit_messages(many, 1000, include_body=True)
+    many_bodies = [json.loads(line)["body"] for line in many_lines]
+    results = [
+        check("Budget is shared evenly", share_budget(100, [10, 500, 500]) == [10, 45, 45]),
+        check("Short bodies are kept whole", records[0]["body"] == "short body"),
+        check("Long bodies are marked as truncated", shown == 2 and records[1]["body"].endswith("[truncated]")),
+        check("Bodies fill the budget", len("\n".join(lines)) > 3000),
+        check("Messages are held back before bodies get too short",
+              many_shown < 50 and all(len(body) >= MIN_BODY_CHARS for body in many_bodies)),
+        check("Held-back output stays within the budget", len("\n".join(many_lines)) <= 1000 * CHARS_PER_TOKEN),
+    ]
+    return all(results)
+
+def test_continuations():
+    """Handles return the held-back IDs until they expire."""
+    print("\n🧪 Testing Continuations")
+    print("=" * 50)
+
+    store = ContinuationStore(max_entries=2, ttl=0.2)
+    handle = store.put(["m3", "m4"], include_body=True)
+    first = store.get(handle)
+    second = store.get(handle)
+    other = store.put(["m5"])
+    store.put(["m6"])
+    store.put(["m7"])
+    evicted = store.get(other)
+    time.sleep(0.25)
+    results = [
+        check("Handle returns the IDs and body flag", first == (["m3", "m4"], True)),
+        check("Handle can be used again", second == first),
+        check("Oldest handles are evicted", evicted is None),
+        check("Handles expire", store.get(handle) is None),
+        check("Unknown handles return None", store.get("nope") is None),
+    ]
+    return all(results)
+
+if __name__ == "__main__":
+    print("🚀 Tool Output Test")
+    print("=" * 60)
+
+    passed = [test_records(), test_budget(), test_bodies(), test_continuations()]
+
+    print("\n" + "=" * 60)
+    if all(passed):
+        print("🎉 All tool output tests passed!")
+    else:
+        print("⚠️ Some tool output tests failed.")